@@ -1,9 +1,18 @@
 # analyzer.py
 
-import json
-import re
+import os
+from typing import Any, Dict, List, Optional
 
 import llm_client  # Para usar el cliente LLM
+import prompt_budget
+import response_parser
+from models import BatchSourceAnalysisLLM, SourceAnalysisLLM
+
+# === Configuración del análisis por lotes ===
+ANALYZER_LOTE_MAX_FUENTES = int(os.getenv("ANALYZER_LOTE_MAX_FUENTES", "5")) # Fuentes por llamada al LLM
+ANALYZER_LOTE_MAX_TOKENS = int(os.getenv("ANALYZER_LOTE_MAX_TOKENS", "12000")) # Presupuesto de tokens del prompt por lote
+ANALYZER_LOTE_TOKENS_POR_FUENTE = int(os.getenv("ANALYZER_LOTE_TOKENS_POR_FUENTE", "1000")) # Texto de cada fuente en el lote
+ANALYZER_MAX_TOKENS_TEXTO = int(os.getenv("ANALYZER_MAX_TOKENS_TEXTO", "2000")) # Texto de la fuente en el análisis individual
 
 # Importar aquí el prompt por defecto si está hardcodeado en este archivo
 DEFAULT_ANALYZER_PROMPT_TEMPLATE = """
@@ -30,57 +39,160 @@ def analyze_with_gemini(tema: str, text: str):
     """
     Analiza el contenido con Gemini usando el cliente LLM y un prompt específico.
     Usa la plantilla de prompt hardcodeada definida en este archivo.
+    Retorna el dict de análisis, o None si no se pudo analizar (error del LLM tras reintentos o respuesta inválida):
+    la fuente se descarta en lugar de guardarse con un score inventado.
     """
     # === Definición del prompt específico para la tarea de análisis ===
     # Usar la plantilla HARDCODEADA DEFINIDA AQUI
     # Formatear con el tema y el texto recibidos
-    prompt = DEFAULT_ANALYZER_PROMPT_TEMPLATE.format(tema=tema, text=text[:8000]) # Limitar texto pasado a la IA
+    # Limitar el texto pasado a la IA por tokens, conservando las frases más informativas
+    prompt = DEFAULT_ANALYZER_PROMPT_TEMPLATE.format(tema=tema, text=prompt_budget.recortar_texto(text, tema, ANALYZER_MAX_TOKENS_TEXTO))
 
 
     try:
-        # ... (código existente para llamar a llm_client.generate_raw_content) ...
-        response_text = llm_client.generate_raw_content(prompt)
-
-        # ... (código existente para extraer y parsear JSON, limpiar) ...
-        json_str_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-
-        if json_str_match:
-            json_str = json_str_match.group()
-            # Limpieza de caracteres de control
-            regex_control_chars = r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F\u2028\u2029]'
-            cleaned_json_str = re.sub(regex_control_chars, '', json_str)
-
-            # Usar json.loads (o json5 si está configurado como fallback en este archivo)
-            try:
-                 # Si json5 está configurado como fallback en este archivo, usarlo aquí
-                 # from your_module import JSON_PARSER # Si JSON_PARSER se define centralmente
-                 # if JSON_PARSER == 'json5':
-                 #     import json5
-                 #     generated_data = json5.loads(cleaned_json_str)
-                 # else:
-                 #     generated_data = json.loads(cleaned_json_str)
-                 # Para simplificar, usamos json.loads. Si falla, el try/except de abajo lo captura.
-                 generated_data = json.loads(cleaned_json_str)
-
-            except json.JSONDecodeError as e:
-                 print(f"❌ Analyzer: Error al parsear JSON: {str(e)}")
-                 if 'cleaned_json_str' in locals():
-                      print(f"Cadena intentando parsear:\n{cleaned_json_str[:500]}...")
-                 return None # Fallo crítico de parseo
+        # Salida estructurada: Gemini devuelve JSON conforme a SourceAnalysisLLM
+        # Prioridad de fondo: el análisis de fuentes cede el turno a copilot y generación
+        response_text = llm_client.generate_raw_content(
+            prompt, response_schema=response_parser.esquema_gemini(SourceAnalysisLLM), prioridad=llm_client.PRIORIDAD_FONDO
+        )
+
+        # Extraer, validar (y reparar con el LLM solo si hace falta) el JSON de la respuesta
+        generated_data = response_parser.parsear_respuesta(response_text, SourceAnalysisLLM, prioridad=llm_client.PRIORIDAD_FONDO)
 
+        if generated_data is not None:
             # Retornamos el diccionario de análisis
             return generated_data
 
         else:
             print(f"⚠️ Analyzer: Gemini no retornó estructura JSON esperada para tema '{tema}'. Inicio respuesta: {response_text[:200]}...")
-            # Retornar un diccionario de error que el scraper pueda manejar
-            return {"score": 1, "reason": "Error de análisis IA", "tags": []}
+            return None
+
+    except llm_client.LLMError as e:
+        # Error ya clasificado por llm_client (cuota, transitorio tras reintentos, seguridad, circuito abierto...)
+        print(f"❌ Analyzer: Gemini no disponible para analizar la fuente ({e.tipo}): {str(e)}")
+        return None
 
     except Exception as e:
-        # Capturamos cualquier excepción
+        # Capturamos cualquier otra excepción
         print(f"❌ Analyzer: Error general en Gemini: {str(e)}")
-        # Retornar un diccionario de error
-        return {"score": 1, "reason": "Error general IA", "tags": []}
+        return None
+
+
+DEFAULT_ANALYZER_BATCH_PROMPT_TEMPLATE = """
+Evalúa cada uno de los {num_articulos} artículos siguientes sobre '{tema}' y devuelve SOLO un array JSON válido
+con un objeto por artículo. Cada objeto debe tener:
+- "indice": el número N de la cabecera [ARTÍCULO N] del artículo evaluado
+- "score": 1-10 (1=irrelevante, 10=excelente)
+- "reason": Explicación concisa
+- "resumen": Resumen breve (máx. 100 caracteres)
+- "tags": 3-5 palabras clave relevantes
+
+Criterios:
+1. Relevancia: ¿Aborda directamente "{tema}"?
+2. Autoridad: ¿Fuente confiable/citada?
+3. Actualidad: ¿Menciona fechas recientes (2024-2025)?
+4. Utilidad: ¿Contiene datos/ejemplos concretos?
 
+Evalúa cada artículo de forma independiente.
+
+{articulos}
+""" # HARDCODEADO AQUI
 
 
+def _dividir_en_lotes(textos: List[str]) -> List[List[int]]:
+    """
+    Agrupa los índices de los textos (ya recortados) en lotes que respetan
+    ANALYZER_LOTE_MAX_FUENTES y ANALYZER_LOTE_MAX_TOKENS (estimados con llm_client.estimar_tokens).
+    """
+    presupuesto = ANALYZER_LOTE_MAX_TOKENS - llm_client.estimar_tokens(DEFAULT_ANALYZER_BATCH_PROMPT_TEMPLATE)
+    lotes, lote_actual, tokens_lote = [], [], 0
+    for indice, texto in enumerate(textos):
+        tokens = llm_client.estimar_tokens(texto)
+        if lote_actual and (len(lote_actual) >= ANALYZER_LOTE_MAX_FUENTES or tokens_lote + tokens > presupuesto):
+            lotes.append(lote_actual)
+            lote_actual, tokens_lote = [], 0
+        lote_actual.append(indice)
+        tokens_lote += tokens
+    if lote_actual:
+        lotes.append(lote_actual)
+    return lotes
+
+
+def _parsear_respuesta_lote(response_text: str, num_articulos: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Extrae y valida el array JSON de la respuesta de un lote (ver response_parser).
+    Retorna {indice_en_lote: analisis} solo con las entradas válidas (conformes a BatchSourceAnalysisLLM e índice en rango).
+    """
+    items = response_parser.parsear_respuesta(response_text, BatchSourceAnalysisLLM, lista=True, prioridad=llm_client.PRIORIDAD_FONDO)
+    if not items:
+        return {}
+
+    resultados = {}
+    for item in items:
+        indice = item.pop('indice')
+        if 1 <= indice <= num_articulos:
+            resultados[indice - 1] = item
+    return resultados
+
+
+def analyze_batch_with_gemini(tema: str, texts: List[str], estadisticas: Optional[Dict[str, int]] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Analiza varias fuentes con una sola llamada al LLM por lote.
+    Los textos se recortan a ANALYZER_LOTE_TOKENS_POR_FUENTE (ver prompt_budget.recortar_texto)
+    y se agrupan según el presupuesto de tokens.
+    Si un lote no se puede parsear (o le faltan entradas), esas fuentes se analizan una a una
+    con analyze_with_gemini.
+
+    Args:
+        tema (str): Tema contra el que se evalúan las fuentes.
+        texts (List[str]): Texto extraído de cada fuente.
+        estadisticas (dict, opcional): Si se proporciona, se incrementa 'llamadas_llm' con las llamadas realizadas.
+
+    Returns:
+        list: Un análisis (dict con score, reason, resumen, tags) o None por cada texto, en el mismo orden.
+    """
+    resultados: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    truncados = [prompt_budget.recortar_texto(text, tema, ANALYZER_LOTE_TOKENS_POR_FUENTE) for text in texts]
+    llamadas = 0
+
+    for lote in _dividir_en_lotes(truncados):
+        if len(lote) == 1:
+            resultados[lote[0]] = analyze_with_gemini(tema, texts[lote[0]])
+            llamadas += 1
+            continue
+
+        articulos = "\n\n".join(
+            f"[ARTÍCULO {posicion}]\n{truncados[indice]}" for posicion, indice in enumerate(lote, start=1)
+        )
+        prompt = DEFAULT_ANALYZER_BATCH_PROMPT_TEMPLATE.format(tema=tema, num_articulos=len(lote), articulos=articulos)
+        analisis_lote = {}
+        servicio_no_disponible = False
+        try:
+            response_text = llm_client.generate_raw_content(
+                prompt, response_schema=response_parser.esquema_gemini(BatchSourceAnalysisLLM, lista=True),
+                prioridad=llm_client.PRIORIDAD_FONDO
+            )
+            llamadas += 1
+            analisis_lote = _parsear_respuesta_lote(response_text, len(lote))
+        except (llm_client.LLMQuotaError, llm_client.LLMTransientError, llm_client.LLMCircuitOpenError) as e:
+            # Tras los reintentos de llm_client: analizar una a una solo multiplicaría las llamadas fallidas
+            llamadas += 1
+            servicio_no_disponible = True
+            print(f"❌ Analyzer: Gemini no disponible para el lote de {len(lote)} ({e.tipo}). Se descartan sus fuentes.")
+        except Exception as e:
+            print(f"❌ Analyzer: Error general en Gemini (lote de {len(lote)}): {str(e)}")
+
+        if servicio_no_disponible:
+            continue
+        print(f"🧠 Analyzer: Lote de {len(lote)} fuentes analizado en una llamada ({len(analisis_lote)} respuestas válidas).")
+        for posicion, indice in enumerate(lote):
+            if posicion in analisis_lote:
+                resultados[indice] = analisis_lote[posicion]
+            else:
+                # Fallback: análisis individual de las fuentes que el lote no resolvió
+                resultados[indice] = analyze_with_gemini(tema, texts[indice])
+                llamadas += 1
+
+    if estadisticas is not None:
+        estadisticas['llamadas_llm'] = estadisticas.get('llamadas_llm', 0) + llamadas
+    return resultados
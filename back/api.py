@@ -12,17 +12,26 @@ from typing import (  # Importar Dict y Any para type hinting de diccionarios
 import copilot  # <-- Importar el módulo copilot
 # Importar los módulos de lógica de negocio/herramientas
 import database
+import driver_pool
+import fetch_cache
+import http_client
+import llm_cache
+import llm_limiter
+import llm_resilience
 # Importar mock_publisher para la generación de previsualización HTML
 import mock_publisher
 import pipeline
+import task_queue
 # Importar web_tools para verificar API keys (opcional en startup)
 import web_tools
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 # Importar los modelos Pydantic necesarios (incluyendo los de articulos generados y config)
 from models import (  # Modelos para articulos generados; SourceArticleSummary, SectionListResponse, ChatRequestModel, ChatResponseModel, ConfigDB, ConfigUpdateRequestModel # Estos para otros endpoints futuros
-    ConfigBase, GeneratedArticleDB, GeneratedArticleSummary,
-    GeneratedArticleUpdate, GenerateRequestModel)
+    ConfigBase, GenerateBatchRequestModel, GeneratedArticleDB,
+    GeneratedArticleSummary, GeneratedArticleUpdate, GenerateRequestModel,
+    GenerationBatchStatus, GenerationTaskDB)
 # Importar Field de Pydantic si no está ya importado globalmente
 from pydantic import Field  # Si Field no estaba importado al inicio
 from starlette.concurrency import run_in_threadpool
@@ -60,6 +69,10 @@ def startup_event():
         print(f"❌ API Startup: Error al inicializar la base de datos: {str(e)}")
         # Considerar logging o manejo de errores al inicio
 
+    # El pool de Selenium (fallback de redirecciones) pertenece al proceso de la API.
+    # No arranca navegadores hasta que se necesitan.
+    driver_pool.get_pool()
+
     print("--- API Startup: Completo ---")
 
     # Opcional: Verificar claves de API al inicio si son criticas para el pipeline
@@ -69,6 +82,29 @@ def startup_event():
     # Verificar Gemini key (si llm_client o analyzer tienen una forma de verificarla sin llamar a la API)
 
 
+# === Evento de Apagado: Liberar recursos compartidos ===
+@app.on_event("shutdown")
+def shutdown_event():
+    """Cierra el pool de Selenium, las conexiones HTTP compartidas y el pool de conexiones SQLite."""
+    print("--- API Shutdown: Liberando recursos compartidos ---")
+    driver_pool.close_pool()
+    http_client.close()
+    database.close_connections()
+
+
+# === Cola de generación: workers en el event loop de la API ===
+@app.on_event("startup")
+async def startup_task_queue():
+    """Arranca los workers que ejecutan las tareas de generación encoladas (ver task_queue.py)."""
+    task_queue.iniciar_workers()
+
+
+@app.on_event("shutdown")
+async def shutdown_task_queue():
+    """Detiene los workers; las tareas en curso vuelven a 'pendiente' para el siguiente arranque."""
+    await task_queue.detener_workers()
+
+
 # === MODELO DE RESPUESTA ESPECÍFICO PARA GET /articles/{id} ===
 # Define este modelo *dentro* de api.py (o en models.py si quieres, pero aquí es más local)
 # Este modelo hereda de GeneratedArticleDB y añade el campo 'suggestions'.
@@ -119,11 +155,12 @@ async def get_theme_config(tema: str):
 
 
 # --- Endpoint de Generación ---
-@app.post("/generate", status_code=status.HTTP_202_ACCEPTED) # Usar 202 Accepted si es asíncrono
+@app.post("/generate", status_code=status.HTTP_202_ACCEPTED) # 202 Accepted: la generación se ejecuta en segundo plano
 async def generate_article(generate_request: GenerateRequestModel):
     """
-    Dispara el pipeline completo de generación de contenido para un tema.
+    Encola la generación de contenido para un tema y responde al momento con el ID de la tarea.
     Recibe todos los parámetros de configuración desde la UI.
+    Un worker de task_queue ejecuta el pipeline; el progreso se consulta en GET /tasks/{task_id}.
     """
     tema = generate_request.tema
     print(f"➡️ API: Recibida solicitud de generación para tema '{tema}'. Parámetros recibidos:")
@@ -141,18 +178,116 @@ async def generate_article(generate_request: GenerateRequestModel):
     # ... similar check for Gemini ...
 
 
-    # --- Ejecutar el pipeline ---
-    # Asegurarse de que pipeline está importado globalmente
-    article_id = await pipeline.run_full_generation_pipeline(generate_request)
+    # --- Encolar la tarea (el pipeline lo ejecuta un worker) ---
+    task_id = await run_in_threadpool(task_queue.encolar_generacion, generate_request)
 
-    if article_id is not None:
-        print(f"✅ API: Generación completada para tema '{tema}'. Artículo ID: {article_id}")
-        return {"message": "Generación completada exitosamente", "article_id": article_id}
-    else:
-        # Si el pipeline retorna None, indica un fallo interno (ya se imprimieron errores en consola)
-        print(f"❌ API: Fallo en el pipeline de generación para tema '{tema}'.")
-        # El pipeline debe imprimir los detalles del error.
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Fallo en el pipeline de generación.")
+    if task_id is None:
+        print(f"❌ API: No se pudo encolar la generación para tema '{tema}'.")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo encolar la generación.")
+
+    return {"message": "Generación encolada", "task_id": task_id}
+
+
+# --- Endpoint de estado de una tarea de generación ---
+@app.get("/tasks/{task_id}", response_model=GenerationTaskDB)
+async def get_generation_task(task_id: int):
+    """
+    Obtiene el estado de una tarea de generación: 'pendiente', 'en_progreso', 'completado' (con articulo_generado_id)
+    o 'error' (con mensaje_error).
+    """
+    tarea = await run_in_threadpool(database.get_tarea, task_id)
+    if not tarea:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Tarea ID {task_id} no encontrada.")
+    return tarea
+
+
+# --- Endpoint para reintentar una tarea fallida ---
+@app.post("/tasks/{task_id}/retry", status_code=status.HTTP_202_ACCEPTED)
+async def retry_generation_task(task_id: int):
+    """
+    Vuelve a encolar una tarea en estado 'error'. El pipeline retoma desde la última etapa completada
+    (checkpoints), sin repetir el scraping ni el análisis de fuentes ya hechos.
+    """
+    reencolada = await run_in_threadpool(task_queue.reintentar_tarea, task_id)
+    if reencolada is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Tarea ID {task_id} no encontrada.")
+    if not reencolada:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"La tarea ID {task_id} no está en estado 'error'.")
+    return {"message": "Tarea reencolada", "task_id": task_id}
+
+
+# --- Endpoints de Generación por lotes (calendario de temas) ---
+def _solicitud_desde_config(tema: str) -> GenerateRequestModel:
+    """GenerateRequestModel de un tema con su configuración guardada (los campos que falten usan los defaults)."""
+    config = database.get_config(tema)
+    campos = {k: config[k] for k in GenerateRequestModel.model_fields if config.get(k) is not None}
+    campos['tema'] = tema
+    return GenerateRequestModel(**campos)
+
+
+@app.post("/generate/batch", status_code=status.HTTP_202_ACCEPTED)
+async def generate_batch(batch_request: GenerateBatchRequestModel):
+    """
+    Encola la generación de varios temas (o de todos los configurados) como un lote y responde con su lote_id.
+    Cada tema usa su configuración guardada. Los temas se ejecutan con la concurrencia de los workers de la cola
+    (TAREAS_WORKERS / `python -m pipeline worker`), no todos a la vez; las URLs candidatas que comparten varios
+    temas en curso a la vez se descargan una sola vez (cada tema las analiza y puntúa por su cuenta). El progreso se consulta en GET /generate/batch/{lote_id}.
+    """
+    temas = list(batch_request.temas)
+    if batch_request.todos_los_temas:
+        temas += [tema for tema in await run_in_threadpool(database.get_available_temas_secciones) if tema != 'Defecto']
+    # Quitar vacíos y repetidos conservando el orden
+    temas_unicos = {}
+    for tema in temas:
+        if tema.strip():
+            temas_unicos.setdefault(tema.strip().lower(), tema.strip())
+    temas = list(temas_unicos.values())
+    if not temas:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No hay temas que generar.")
+
+    print(f"➡️ API: Recibida solicitud de generación por lotes para {len(temas)} temas.")
+    try:
+        solicitudes = await run_in_threadpool(lambda: [_solicitud_desde_config(tema) for tema in temas])
+    except ValueError as e:
+        # Configuración guardada inválida para GenerateRequestModel
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    lote_id, task_ids = await run_in_threadpool(task_queue.encolar_lote, solicitudes)
+    if lote_id is None:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo encolar el lote.")
+    return {"message": f"Lote encolado con {len(task_ids)} temas", "lote_id": lote_id, "task_ids": task_ids}
+
+
+@app.get("/generate/batch/{lote_id}", response_model=GenerationBatchStatus)
+async def get_generation_batch(lote_id: str):
+    """Progreso de un lote: número de tareas por estado y el estado de cada tema."""
+    estado = await run_in_threadpool(task_queue.estado_lote, lote_id)
+    if not estado:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Lote '{lote_id}' no encontrado.")
+    return estado
+
+
+# --- Endpoint de Generación en streaming (Server-Sent Events) ---
+@app.post("/generate/stream")
+async def generate_article_stream(generate_request: GenerateRequestModel):
+    """
+    Igual que /generate, pero emite el progreso como Server-Sent Events (text/event-stream):
+    etapas del pipeline, el borrador del artículo (title, meta_description, tags, body) a medida que
+    lo genera la IA, y un evento final 'completado' (con article_id) o 'error'.
+    """
+    tema = generate_request.tema
+    print(f"➡️ API: Recibida solicitud de generación en streaming para tema '{tema}'.")
+
+    async def eventos_sse():
+        async for evento in pipeline.run_full_generation_pipeline_stream(generate_request):
+            tipo = evento.pop('tipo')
+            yield f"event: {tipo}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        eventos_sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # === ENDPOINTS PARA GESTIÓN DE ARTÍCULOS (PARA EL CANVAS) ===
@@ -231,6 +366,17 @@ async def health_check():
     # Podrías añadir aquí checks a la DB u otros servicios
     return {"status": "ok"}
 
+# --- Endpoint de Estadísticas de Rendimiento (cachés, etc.) ---
+@app.get("/stats")
+async def get_stats():
+    """Retorna contadores de rendimiento del proceso (p. ej. tasa de acierto de las cachés de descargas y del LLM)."""
+    return {
+        "fetch_cache": fetch_cache.estadisticas(),
+        "llm_cache": llm_cache.estadisticas(),
+        "llm_resiliencia": llm_resilience.estadisticas(),
+        "llm_limitador": llm_limiter.estadisticas(),
+    }
+
 # === NUEVO ENDPOINT: Generar Sugerencias para un Artículo ===
 @app.post("/articles/{article_id}/generate-suggestions") # Usar POST para disparar una accion
 async def generate_suggestions_for_article(article_id: int):
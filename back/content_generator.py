@@ -1,14 +1,19 @@
 # content_generator.py
 # Módulo principal para la generación (inicial) y ejecución de prompts externos (reescritura).
-import json
-import re
+import os
 from typing import Any, Dict, List, Optional  # Importar List para type hinting
 
 import database  # Usado por funciones de Database, aunque no directamente en las funciones principales aquí
-import json5
 import llm_client  # Para llamar a Gemini
 import mock_publisher  # Usado por el pipeline o pruebas, no directamente en las funciones principales aquí
+import prompt_budget
+import response_parser
 import web_tools  # Usado por scraper, no directamente en las funciones principales aquí
+from models import GeneratedArticleLLM
+
+# Presupuesto (tokens estimados) para el texto de TODAS las fuentes en el prompt de generación.
+# Se reparte entre las fuentes según su score (ver prompt_budget.ajustar_fuentes).
+GENERADOR_MAX_TOKENS_FUENTES = int(os.getenv("GENERADOR_MAX_TOKENS_FUENTES", "24000"))
 
 # Importar aquí los prompts por defecto si están hardcodeados en este archivo
 DEFAULT_GENERATOR_PROMPT_TEMPLATE = """
@@ -53,23 +58,9 @@ Produce **SOLO** el objeto JSON. No añadas texto explicativo antes ni después
 """
 
 
-def generate_seo_content(
-    topic: str,
-    sources_with_content: list, # Lista de diccionarios con 'full_content', 'score', etc.
-    longitud: int,
-    tono: str,
-    modification_prompt: Optional[str] = None # Prompt de modificación opcional
-):
-    """
-    Genera un artículo de blog optimizado para SEO (generación inicial),
-    O regenera/reescribe un artículo (si modification_prompt es dado).
-    Siempre espera una respuesta JSON.
-    """
-    print(f"\n✍️ Generator: Generando/Regenerando contenido para '{topic}'")
-    print(f"   (Modo: {'Regeneración' if modification_prompt else 'Generación Inicial'})")
-    print(f"   (Config Recibida: Longitud={longitud} palabras, Tono='{tono}')")
-
-
+def _build_generation_prompt(topic: str, sources_with_content: list, longitud: int, tono: str,
+                             modification_prompt: Optional[str] = None) -> Optional[str]:
+    """Construye el prompt de generación/regeneración. Retorna None si no hay fuentes utilizables."""
     # === PASO 1: Construir el Prompt Base (Usando la plantilla hardcodeada y fuentes/parámetros) ===
     if not sources_with_content:
         print(f"❌ Generator: No se proporcionaron fuentes con contenido para generar/regenerar contenido sobre '{topic}'.")
@@ -78,8 +69,10 @@ def generate_seo_content(
     source_contents = []
     loaded_source_count = 0
 
-    for i, source_data in enumerate(sources_with_content):
-        content = source_data.get('full_content')
+    # Recortar el texto de las fuentes al presupuesto de tokens (más presupuesto a mayor score)
+    budgeted_contents = prompt_budget.ajustar_fuentes(sources_with_content, topic, GENERADOR_MAX_TOKENS_FUENTES)
+
+    for i, (source_data, content) in enumerate(zip(sources_with_content, budgeted_contents)):
         if content:
             source_contents.append(f"### Fuente {i+1}: {source_data.get('titulo', source_data.get('url', 'N/A'))}\n\n{content}\n\n---\n\n")
             loaded_source_count += 1
@@ -93,7 +86,7 @@ def generate_seo_content(
     # Construir el prompt final usando la plantilla HARDCODEADA
     # Formatear con los parámetros recibidos Y el prompt de modificación (o "")
     try:
-        generation_prompt = DEFAULT_GENERATOR_PROMPT_TEMPLATE.format(
+        return DEFAULT_GENERATOR_PROMPT_TEMPLATE.format(
             topic=topic,
             sources_text=sources_text,
             loaded_source_count=loaded_source_count,
@@ -108,50 +101,106 @@ def generate_seo_content(
          return None
 
 
+def _parse_generated_article(raw_response_text: str, topic: str,
+                             prioridad: int = llm_client.PRIORIDAD_NORMAL) -> Optional[Dict[str, Any]]:
+    """Extrae y valida (GeneratedArticleLLM) el JSON del artículo de la respuesta completa de la IA. Retorna None si no es válido."""
+    # Extracción tolerante + validación; una llamada de reparación solo si el JSON no es válido
+    generated_data = response_parser.parsear_respuesta(raw_response_text, GeneratedArticleLLM, prioridad=prioridad)
+    if generated_data is None:
+        print(f"❌ Generator: La respuesta de la IA NO contenía un objeto JSON válido.")
+        print(f"Respuesta cruda recibida:\n{raw_response_text[:500]}...")
+        return None
+    return _finalize_generated_article(generated_data, topic)
+
+
+def _finalize_generated_article(generated_data: Dict[str, Any], topic: str) -> Dict[str, Any]:
+    """Añade el tema al artículo ya validado."""
+    print("✅ Generator: Contenido generado/regenerado y parseado JSON.")
+    # Añadir metadata adicional (tema)
+    generated_data['tema'] = topic
+    # score_fuentes_promedio no se calcula aquí.
+    return generated_data # Retorna el diccionario validado (si es JSON completo)
+
+
+def generate_seo_content(
+    topic: str,
+    sources_with_content: list, # Lista de diccionarios con 'full_content', 'score', etc.
+    longitud: int,
+    tono: str,
+    modification_prompt: Optional[str] = None, # Prompt de modificación opcional
+    prioridad: int = llm_client.PRIORIDAD_NORMAL # PRIORIDAD_INTERACTIVA cuando lo pide el copilot
+):
+    """
+    Genera un artículo de blog optimizado para SEO (generación inicial),
+    O regenera/reescribe un artículo (si modification_prompt es dado).
+    Siempre espera una respuesta JSON.
+    """
+    print(f"\n✍️ Generator: Generando/Regenerando contenido para '{topic}'")
+    print(f"   (Modo: {'Regeneración' if modification_prompt else 'Generación Inicial'})")
+    print(f"   (Config Recibida: Longitud={longitud} palabras, Tono='{tono}')")
+
+    generation_prompt = _build_generation_prompt(topic, sources_with_content, longitud, tono, modification_prompt)
+    if not generation_prompt:
+        return None
+
     # === PASO 4: Llamar a la IA y Parsear la Respuesta (Siempre JSON esperado) ===
+    raw_response_text = ""
     try:
         print("🧠 Generator: Solicitando respuesta a Gemini...")
-        raw_response_text = llm_client.generate_raw_content(generation_prompt) # Síncrona, NO usar await aquí
-
-        # === Lógica de parseo JSON ===
-        json_match = re.search(r'\{.*\}', raw_response_text, re.DOTALL)
-
-        if json_match:
-            json_str = json_match.group(0)
-            json_str = json_str.replace('```json', '').replace('```', '').strip()
-            regex_control_chars = r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F\u2028\u2029]'
-            cleaned_json_str = re.sub(regex_control_chars, '', json_str)
-
-            try:
-                 generated_data = json.loads(cleaned_json_str)
-            except json.JSONDecodeError as e:
-                 print(f"❌ Generator: Error al parsear JSON: {str(e)}")
-                 if 'cleaned_json_str' in locals(): print(f"Cadena intentando parsear:\n{cleaned_json_str[:500]}...")
-                 return None # Fallo crítico de parseo
-
-            required_keys = ['title', 'meta_description', 'tags', 'body']
-            if not all(key in generated_data for key in required_keys):
-                 print(f"❌ Generator: Estructura JSON incompleta. Faltan claves.")
-                 print(f"Datos parseados:\n{generated_data}")
-                 return None
-
-            print("✅ Generator: Contenido generado/regenerado y parseado JSON.")
-            # Añadir metadata adicional (tema)
-            generated_data['tema'] = topic
-            # score_fuentes_promedio no se calcula aquí.
-
-            return generated_data # Retorna el diccionario validado (si es JSON completo)
-
-        else:
-            print(f"❌ Generator: La respuesta de la IA NO contenía un objeto JSON válido.")
-            print(f"Respuesta cruda recibida:\n{raw_response_text[:500]}...")
-            return None
+        # Sin caché: una nueva generación/regeneración debe producir una respuesta nueva
+        raw_response_text = llm_client.generate_raw_content(
+            generation_prompt, use_cache=False, response_schema=response_parser.esquema_gemini(GeneratedArticleLLM),
+            prioridad=prioridad
+        ) # Síncrona, NO usar await aquí
+        return _parse_generated_article(raw_response_text, topic, prioridad)
 
     except Exception as e:
         print(f"❌ Generator: Error general al generar/regenerar contenido: {str(e)}")
         if raw_response_text: print(f"Respuesta cruda (parcial):\n{raw_response_text[:500]}...")
         return None
 
+
+async def agenerate_seo_content_stream(
+    topic: str,
+    sources_with_content: list,
+    longitud: int,
+    tono: str,
+    modification_prompt: Optional[str] = None
+):
+    """
+    Versión en streaming de generate_seo_content (async generator).
+    Emite los eventos de response_parser.StreamingJSONParser a medida que Gemini produce el JSON
+    ({'campo', 'delta'} / {'campo', 'item'} / {'campo', 'valor'}) y, al final, {'articulo': dict o None}
+    con el artículo validado (igual que el retorno de generate_seo_content).
+    """
+    print(f"\n✍️ Generator: Generando contenido en streaming para '{topic}'")
+    generation_prompt = _build_generation_prompt(topic, sources_with_content, longitud, tono, modification_prompt)
+    if not generation_prompt:
+        yield {'articulo': None}
+        return
+
+    parser = response_parser.StreamingJSONParser()
+    raw_chunks = []
+    try:
+        async for chunk in llm_client.agenerate_raw_content_stream(
+            generation_prompt, response_schema=response_parser.esquema_gemini(GeneratedArticleLLM)
+        ):
+            raw_chunks.append(chunk)
+            for evento in parser.feed(chunk):
+                yield evento
+    except Exception as e:
+        print(f"❌ Generator: Error general durante la generación en streaming: {str(e)}")
+        yield {'articulo': None}
+        return
+
+    validated_data = response_parser.validar(parser.resultado, GeneratedArticleLLM) if parser.terminado else None
+    if validated_data is not None:
+        generated_data = _finalize_generated_article(validated_data, topic)
+    else:
+        # El parser incremental no vio un objeto completo y válido: parseo tolerante (y reparación) sobre el texto entero
+        generated_data = _parse_generated_article("".join(raw_chunks), topic)
+    yield {'articulo': generated_data}
+
 # === FUNCIÓN: Ejecutar un Prompt Externo (para tareas que no necesitan JSON) ===
 # Esta función SE MANTIENE SEPARADA. La usará copilot para tareas que NO necesitan generar JSON completo.
 # Por ejemplo: generar solo sugerencias (texto plano), o reescribir solo un fragmento si no quieres regenerar todo el JSON.
@@ -171,7 +220,7 @@ def execute_external_prompt(prompt: str) -> str:
 
     try:
         # Llamar a Gemini usando llm_client (síncrono)
-        ai_response = llm_client.generate_raw_content(prompt) # Síncrona, NO usar await aquí
+        ai_response = llm_client.generate_raw_content(prompt, use_cache=False) # Síncrona, NO usar await aquí (sin caché: reescrituras)
 
         print("✅ Generator: Prompt externo ejecutado. Respuesta recibida.")
         # Limpiar la respuesta si es necesario (ej. quitar bloques de código markdown)
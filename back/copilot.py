@@ -7,6 +7,7 @@ from typing import Any, Dict, List, Optional  # Importar List para type hinting
 import content_generator
 import database
 import llm_client
+import web_tools
 
 DEFAULT_COPILOT_SUGGESTIONS_PROMPT_TEMPLATE = """
 Eres SEO-Copilot, un asistente de IA experto en SEO y creación de contenido. Tu tarea es analizar el artículo proporcionado y listar DIRECTAMENTE SUGERENCIAS de mejora.
@@ -129,7 +130,7 @@ def generate_article_suggestions(article_data: dict) -> str:
         )
 
         # Llamar a Gemini usando llm_client (síncrono)
-        ai_response = llm_client.generate_raw_content(copilot_prompt)
+        ai_response = llm_client.generate_raw_content(copilot_prompt, prioridad=llm_client.PRIORIDAD_INTERACTIVA) # El usuario espera en el Canvas
 
         print("✅ Copilot: Sugerencias generadas por Gemini.")
         ai_response = ai_response.replace('```text', '').replace('```', '').strip()
@@ -205,9 +206,16 @@ def regenerate_article_content(article_id: int, instruction: str, current_body_t
 
     # === 1b. OBTENER LAS FUENTES ORIGINALES USADAS PARA ESTE ARTÍCULO ===
     # ¡Este es el paso clave! Usamos la función de database.py
-    # Asumimos que database.get_sources_used_by_article retorna lista de dicts CON 'full_content'.
+    # El texto de las fuentes se guarda comprimido en la DB al scrapear (tabla articulos_contenido),
+    # así que la regeneración no necesita red. Solo las fuentes antiguas sin texto guardado
+    # se vuelven a descargar (pasando por la caché de descargas).
     print(f"🧠 Copilot: Obteniendo fuentes usadas para artículo ID {article_id}...")
-    original_sources_used = database.get_sources_used_by_article(article_id)
+    original_sources_used = database.get_sources_used_by_article(article_id, incluir_contenido=True)
+    for source in original_sources_used:
+        if not source.get('full_content') and source.get('url'):
+            print(f"🌐 Copilot: Fuente ID {source.get('id')} sin texto guardado. Descargando {source['url'][:60]}...")
+            source['full_content'] = web_tools.fetch_and_extract_content(source['url'])
+    original_sources_used = [source for source in original_sources_used if source.get('full_content')]
 
     if not original_sources_used:
         print(f"⚠️ Copilot: No se encontraron fuentes usadas registradas para artículo ID {article_id} O no tienen full_content. Regeneración podría ser menos precisa o fallar.")
@@ -241,7 +249,8 @@ def regenerate_article_content(article_id: int, instruction: str, current_body_t
         original_sources_used, # <-- PASAR LAS FUENTES USADAS AQUÍ
         longitud=longitud_original, # Longitud original
         tono=tono_original, # Tono original
-        modification_prompt=modification_prompt_text # Pasar el prompt de modificación
+        modification_prompt=modification_prompt_text, # Pasar el prompt de modificación
+        prioridad=llm_client.PRIORIDAD_INTERACTIVA # Pasa por delante del análisis de fuentes en segundo plano
     )
     # ====================================
 
@@ -4,15 +4,229 @@
 
 import json
 import os
+import queue
 import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Any, Dict, List, Optional  # Importar para type hinting
 
 # Define la ruta a tu archivo de esquema SQL
 # ASEGÚRATE DE QUE ESTA RUTA ES CORRECTA PARA TU SISTEMA
 SCHEMA_FILE_PATH = "C:\\Users\\oscar\\Desktop\\proyectospy\\auto-seo\\schema.sql" # <-- ¡VERIFICA Y AJUSTA ESTA RUTA!
+if not os.path.exists(SCHEMA_FILE_PATH): # Fallback: schema.sql en la raíz del repositorio
+    SCHEMA_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schema.sql")
 DB_FILE_PATH = "seo_autopilot.db"
 
+# === Gestión de conexiones ===
+# Pool acotado de conexiones ya configuradas (en lugar de abrir/cerrar una por función o una por hilo):
+# los hilos que llaman a la DB son de vida corta (pools del scraper, asyncio.to_thread, run_in_threadpool),
+# así que las conexiones se prestan y se devuelven con `with conexion() as conn:` en vez de atarse al hilo.
+# Se evita el coste de connect + PRAGMAs, se aprovecha la caché de sentencias preparadas de sqlite3
+# (cached_statements) y close_connections() cierra todas las conexiones al apagar. La DB usa WAL
+# para que las lecturas de la API no se bloqueen detrás de las escrituras del pipeline.
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384")) # 16 MB de caché de páginas por conexión
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024))) # 128 MB mapeados en memoria
+SQLITE_BUSY_TIMEOUT_SEG = float(os.getenv("SQLITE_BUSY_TIMEOUT_SEG", "10"))
+SQLITE_CACHED_STATEMENTS = 256
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "16")) # Conexiones abiertas como máximo por proceso
+SQLITE_POOL_ESPERA_SEG = float(os.getenv("SQLITE_POOL_ESPERA_SEG", "30")) # Espera máxima por una conexión libre
+
+
+def _nueva_conexion() -> sqlite3.Connection:
+    """Abre una conexión a DB_FILE_PATH con los PRAGMAs de rendimiento aplicados."""
+    # check_same_thread=False: la conexión pasa de un hilo a otro a través del pool (nunca la usan dos a la vez)
+    conn = sqlite3.connect(DB_FILE_PATH, timeout=SQLITE_BUSY_TIMEOUT_SEG, cached_statements=SQLITE_CACHED_STATEMENTS,
+                           check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL") # Persistente en el archivo; lectores y escritor concurrentes
+    conn.execute("PRAGMA synchronous=NORMAL") # Seguro con WAL y con muchos menos fsyncs que FULL
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}") # Negativo = tamaño en KiB
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+class _PoolConexiones:
+    """
+    Hasta `tamano` conexiones a una misma ruta, creadas bajo demanda y reutilizadas (LIFO, la más caliente).
+    tomar() espera si todas están prestadas; cerrar() cierra las libres y las prestadas al devolverse.
+    """
+
+    def __init__(self, tamano: int):
+        self.tamano = max(1, tamano)
+        self._libres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._creadas = 0
+        self._cerrado = False
+
+    def tomar(self, espera_seg: float) -> sqlite3.Connection:
+        """Presta una conexión libre o crea otra si hay cupo; si no, espera hasta espera_seg."""
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            crear = self._creadas < self.tamano
+            if crear:
+                self._creadas += 1
+        if crear:
+            try:
+                return _nueva_conexion()
+            except Exception:
+                with self._lock:
+                    self._creadas -= 1
+                raise
+        try:
+            return self._libres.get(timeout=espera_seg)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"Ninguna conexión libre en el pool tras {espera_seg:.0f}s ({self.tamano} en uso).")
+
+    def devolver(self, conn: sqlite3.Connection):
+        """Devuelve una conexión prestada (se cierra si el pool ya se cerró)."""
+        if conn.in_transaction: # Transacción que el llamador no cerró: no debe verla el siguiente
+            conn.rollback()
+        if self._cerrado:
+            self._descartar(conn)
+        else:
+            self._libres.put(conn)
+
+    def _descartar(self, conn: sqlite3.Connection):
+        """Cierra una conexión y libera su cupo."""
+        with self._lock:
+            self._creadas -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def cerrar(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse."""
+        self._cerrado = True
+        while True:
+            try:
+                self._descartar(self._libres.get_nowait())
+            except queue.Empty:
+                break
+
+
+_pools: Dict[str, _PoolConexiones] = {} # Por ruta, por si DB_FILE_PATH cambia (p. ej. pruebas)
+_pools_lock = threading.Lock()
+_prestamos_hilo = threading.local() # Conexión que el hilo actual tiene prestada (para llamadas anidadas)
+
+
+@contextmanager
+def conexion():
+    """
+    Presta una conexión del pool a DB_FILE_PATH y la devuelve al salir del bloque (`with conexion() as conn:`).
+    Las llamadas anidadas del mismo hilo reutilizan la conexión ya prestada, así un hilo nunca
+    espera por una segunda conexión. NO cerrar la conexión: vuelve al pool para la siguiente llamada.
+    """
+    prestada = getattr(_prestamos_hilo, 'conexion', None)
+    if prestada is not None and prestada[0] == DB_FILE_PATH:
+        yield prestada[1]
+        return
+    with _pools_lock:
+        pool = _pools.get(DB_FILE_PATH)
+        if pool is None:
+            pool = _pools[DB_FILE_PATH] = _PoolConexiones(SQLITE_POOL_SIZE)
+    conn = pool.tomar(SQLITE_POOL_ESPERA_SEG)
+    _prestamos_hilo.conexion = (DB_FILE_PATH, conn)
+    try:
+        yield conn
+    finally:
+        _prestamos_hilo.conexion = None
+        pool.devolver(conn)
+
+
+def close_connections():
+    """Cierra todas las conexiones del proceso (p. ej. al apagar la API o al terminar un worker)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.cerrar()
+
+
+# === Migraciones gestionadas ===
+# schema.sql crea las tablas base (versión 0). Cada cambio posterior del esquema se añade
+# AL FINAL de MIGRATIONS con la siguiente versión; nunca se editan migraciones ya publicadas.
+# La versión aplicada se guarda en PRAGMA user_version del propio archivo de la DB.
+MIGRATIONS = [
+    (1, "Índices para los listados de artículos generados e imágenes", [
+        # Cubren get_all_generated_articles (todas las combinaciones de filtros) sin tocar la tabla
+        # ni ordenar en un B-tree temporal: igualdad en los filtros + fecha_generacion ya ordenada.
+        "CREATE INDEX IF NOT EXISTS idx_ag_tema_estado_fecha ON articulos_generados "
+        "(tema, estado, fecha_generacion DESC, titulo, score_fuentes_promedio)",
+        "CREATE INDEX IF NOT EXISTS idx_ag_tema_fecha ON articulos_generados "
+        "(tema, fecha_generacion DESC, estado, titulo, score_fuentes_promedio)",
+        "CREATE INDEX IF NOT EXISTS idx_ag_estado_fecha ON articulos_generados "
+        "(estado, fecha_generacion DESC, tema, titulo, score_fuentes_promedio)",
+        "CREATE INDEX IF NOT EXISTS idx_ag_fecha ON articulos_generados "
+        "(fecha_generacion DESC, tema, estado, titulo, score_fuentes_promedio)",
+        # get_generated_article_by_id carga las imágenes de un artículo
+        "CREATE INDEX IF NOT EXISTS idx_imagenes_articulo ON imagenes_generadas (articulo_generado_id)",
+        # Actualizar estadísticas del planificador
+        "ANALYZE",
+    ]),
+    (2, "Umbral del prefiltro local de fuentes en la configuración", [
+        "ALTER TABLE configuracion ADD COLUMN min_score_prefiltro INTEGER DEFAULT 3",
+    ]),
+    (3, "Cola de tareas de generación: parámetros, intentos y lease del worker", [
+        "ALTER TABLE generacion_tareas ADD COLUMN parametros TEXT",
+        "ALTER TABLE generacion_tareas ADD COLUMN intentos INTEGER DEFAULT 0",
+        "ALTER TABLE generacion_tareas ADD COLUMN worker_id TEXT",
+        "ALTER TABLE generacion_tareas ADD COLUMN lease_hasta REAL",
+        # reclamar_tarea busca la tarea pendiente más antigua (o una con el lease caducado)
+        "CREATE INDEX IF NOT EXISTS idx_tareas_estado ON generacion_tareas (estado, id)",
+    ]),
+    (4, "Checkpoints de las etapas del pipeline por tarea", [
+        "CREATE TABLE IF NOT EXISTS tareas_checkpoints ("
+        "tarea_id INTEGER NOT NULL, etapa TEXT NOT NULL, datos BLOB NOT NULL, fecha TEXT DEFAULT CURRENT_TIMESTAMP, "
+        "PRIMARY KEY (tarea_id, etapa), FOREIGN KEY (tarea_id) REFERENCES generacion_tareas(id)) WITHOUT ROWID",
+    ]),
+    (5, "Lotes de generación (POST /generate/batch)", [
+        "ALTER TABLE generacion_tareas ADD COLUMN lote_id TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_tareas_lote ON generacion_tareas (lote_id, id)",
+    ]),
+    (6, "Score y resumen de cada fuente según el tema del artículo que la usa", [
+        # La fila de 'articulos' es única por URL; una URL que usan varios temas se puntúa para cada uno
+        "ALTER TABLE articulos_generados_fuentes ADD COLUMN score INTEGER",
+        "ALTER TABLE articulos_generados_fuentes ADD COLUMN resumen TEXT",
+    ]),
+]
+
+
+def aplicar_migraciones(conn: sqlite3.Connection) -> int:
+    """
+    Aplica en orden las migraciones con versión mayor que PRAGMA user_version.
+    Cada migración se ejecuta en su propia transacción junto con la actualización de user_version.
+    Retorna la versión final del esquema.
+    """
+    version_actual = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, descripcion, sentencias in MIGRATIONS:
+        if version <= version_actual:
+            continue
+        print(f"🔧 Aplicando migración {version}: {descripcion}")
+        try:
+            conn.execute("BEGIN")
+            for sentencia in sentencias:
+                try:
+                    conn.execute(sentencia)
+                except sqlite3.OperationalError as e:
+                    # ADD COLUMN sobre una DB creada con un schema.sql que ya incluye la columna
+                    if "duplicate column name" not in str(e):
+                        raise
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            version_actual = version
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error en la migración {version}: {str(e)}")
+            raise
+    return version_actual
+
 
 def inicializar_db():
     """
@@ -20,7 +234,8 @@ def inicializar_db():
     ejecutando el script SQL desde SCHEMA_FILE_PATH si no existen.
     """
     print(f"--- Intentando inicializar DB: {DB_FILE_PATH} ---")
-    conn = sqlite3.connect(DB_FILE_PATH)
+    # Conexión propia (no una del pool): el script de esquema cambia PRAGMAs de la conexión
+    conn = _nueva_conexion()
     cursor = conn.cursor()
     sql_script = ""
     try:
@@ -44,11 +259,14 @@ def inicializar_db():
         else:
              print("⏩ Saltando ejecución del script SQL porque estaba vacío o no se encontró el archivo.")
 
+        version = aplicar_migraciones(conn)
+        print(f"✅ Esquema en la versión {version}.")
+
         print(f"✅ Base de datos {DB_FILE_PATH} inicializada/verificada usando {SCHEMA_FILE_PATH}.")
 
         # Opcional: Verificaciones básicas de tablas clave para confirmar que existen
         try:
-            table_checks = ['articulos', 'configuracion', 'articulos_generados', 'imagenes_generadas', 'tags', 'articulos_fuente_tags', 'generacion_tareas']
+            table_checks = ['articulos', 'articulos_contenido', 'configuracion', 'articulos_generados', 'imagenes_generadas', 'tags', 'articulos_fuente_tags', 'generacion_tareas']
             for table_name in table_checks:
                 cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
                 if cursor.fetchone(): print(f"✅ Tabla '{table_name}' verificada. EXISTE.")
@@ -57,23 +275,20 @@ def inicializar_db():
             # Opcional: Insertar una configuración de ejemplo "Defecto" si la tabla config está vacía
             # Requiere la función save_config más abajo.
             try:
-                 # Usa una nueva conexión o asegúrate de que el cursor está listo
-                 conn_check = sqlite3.connect(DB_FILE_PATH)
-                 cursor_check = conn_check.cursor()
+                 cursor_check = conn.cursor()
                  cursor_check.execute("SELECT COUNT(*) FROM configuracion")
                  if cursor_check.fetchone()[0] == 0:
                       print("⚠️ Tabla 'configuracion' vacía. Insertando configuración de ejemplo 'Defecto'.")
                       # Definir una config de ejemplo con el tema "Defecto" usando valores típicos/defaults
                       example_default_config = {
                            'tema': 'Defecto',
-                           'min_score_fuente': 5, 'num_fuentes_scraper': 10, 'num_resultados_scraper': 5,
+                           'min_score_fuente': 5, 'min_score_prefiltro': 3, 'num_fuentes_scraper': 10, 'num_resultados_scraper': 5,
                            'min_score_generador': 7, 'num_fuentes_generador': 3,
                            'longitud_texto': 1500, 'tono_texto': 'neutral', 'num_imagenes_buscar': 2,
                            # Prompts no están en la DB por ahora
                            # 'prompt_analyzer_template': None, 'prompt_generator_template': None, 'prompt_copilot_template': None
                       }
                       save_config(example_default_config) # Llama a la función save_config para insertar
-                 conn_check.close() # Cierra la conexión de check
 
             except sqlite3.OperationalError:
                  # Si la tabla config no existe, esta verificación fallará
@@ -97,211 +312,310 @@ def inicializar_db():
         print("--- Fin inicialización DB ---")
 
 
+# === Compresión del contenido de las fuentes (tabla articulos_contenido) ===
+
+def _comprimir_texto(texto: str) -> bytes:
+    """Comprime un texto (UTF-8) con zlib para guardarlo como BLOB."""
+    return zlib.compress(texto.encode('utf-8'), 6)
+
+
+def _descomprimir_texto(blob: Optional[bytes]) -> Optional[str]:
+    """Descomprime un BLOB guardado con _comprimir_texto. Retorna None si no hay BLOB."""
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode('utf-8')
+
+
 # === Funciones Esenciales para el Flujo de Generación y Guardado ===
 
 def url_existe(url: str) -> bool:
     """Verifica si una URL ya existe en la base de datos (tabla articulos)."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('SELECT 1 FROM articulos WHERE url = ?', (url,))
-        return cursor.fetchone() is not None
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Error SQL en url_existe: {str(e)}. ¿Existe la tabla 'articulos'?")
-        return False
-    except Exception as e:
-        print(f"Error en url_existe: {str(e)}")
-        return False
-    finally:
-        conn.close()
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT 1 FROM articulos WHERE url = ?', (url,))
+            return cursor.fetchone() is not None
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en url_existe: {str(e)}. ¿Existe la tabla 'articulos'?")
+            return False
+        except Exception as e:
+            print(f"Error en url_existe: {str(e)}")
+            return False
 
 def guardar_articulo(articulo: Dict[str, Any]) -> Optional[int]:
     """Guarda un artículo fuente en la tabla 'articulos'. Retorna el ID asignado o existente."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Intentar insertar la fuente. IGNORE si ya existe (basado en URL UNIQUE).
-        # La base de datos usará los defaults SQL para los campos no proporcionados si no hay conflicto de UNIQUE.
-        cursor.execute('''
-            INSERT OR IGNORE INTO articulos
-            (titulo, url, score, resumen, fuente, fecha_publicacion_fuente, fecha_scraping, usada_para_generar)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
-        ''', (
-            articulo.get('titulo', ''), # .get() con default string por seguridad
-            articulo['url'], # Asumimos que url SIEMPRE viene y es la clave
-            articulo.get('score'), # Score puede ser None si el analisis fallo totalmente
-            articulo.get('resumen', ''),
-            articulo.get('fuente', ''),
-            articulo.get('fecha_publicacion_fuente'), # Puede ser None, DB usara default o NULL
-            articulo.get('usada_para_generar', 0) # Usar 0 si no viene
-        ))
-        # Obtener el ID asignado a la fila insertada (si la inserción fue exitosa)
-        articulo_id = cursor.lastrowid
-
-        # Si lastrowid es 0, la inserción fue IGNORADA porque la URL ya existía.
-        # Necesitamos consultar la DB para obtener el ID del artículo existente.
-        if not articulo_id:
-             # Buscar el ID del artículo existente por su URL
-             cursor.execute('SELECT id FROM articulos WHERE url = ?', (articulo['url'],))
-             articulo_id_row = cursor.fetchone()
-             if articulo_id_row:
-                  articulo_id = articulo_id_row[0] # Obtener el ID de la fila existente
-                  # print(f"⚠️ Fuente {articulo['url'][:60]}... ya existía. Usando ID {articulo_id}.") # Debugging opcional
-             else:
-                  # Esto NO DEBERÍA PASAR si url_existe() funciona o si INSERT OR IGNORE tuvo éxito pero lastrowid fue 0 por alguna razon.
-                  print(f"❌ Error: Falló al obtener ID para URL {articulo['url']} después de INSERT OR IGNORE.")
-                  conn.rollback() # Asegurarse de que la transacción se revierte si algo salió muy mal
-                  return None # Retornar None si no se puede obtener el ID
-
-
-        # === Lógica de tags (comentada para la versión mínima) ===
-        # Si necesitas tags para fuentes, DESCOMENTA esta sección y asegúrate de que
-        # las tablas 'tags' y 'articulos_fuente_tags' existen en schema.sql.
-        # tag_table_name = 'articulos_fuente_tags'
-        # try:
-        #     for tag in articulo.get('tags', []):
-        #         tag = tag.strip()
-        #         if not tag: continue # Skip empty tags
-        #         # Insert tag into tags table (ignore if already exists)
-        #         cursor.execute('INSERT OR IGNORE INTO tags (tag) VALUES (?)', (tag,))
-        #         # Get the ID of the tag (either newly inserted or existing)
-        #         cursor.execute('SELECT id FROM tags WHERE tag = ?', (tag,))
-        #         tag_id_row = cursor.fetchone()
-        #         if tag_id_row:
-        #             tag_id = tag_id_row[0]
-        #             # Link article and tag in the join table (ignore if link already exists)
-        #             cursor.execute(f'INSERT OR IGNORE INTO {tag_table_name} (articulo_fuente_id, tag_id) VALUES (?, ?)', (articulo_id, tag_id))
-        #         else:
-        #              print(f"⚠️ Could not find ID for tag '{tag}' after insertion attempt in guardar_articulo.")
-        # except Exception as e:
-        #      print(f"Error in tags/relationships section for article ID {articulo_id}: {str(e)}")
-        #      # Do not re-raise, just print warning
-        #      pass # Continue processing even if tag linking fails
-
-
-        conn.commit() # Commit final si todo lo anterior fue bien (o si la inserción/obtención ID fue bien)
-        return articulo_id # Retorna el ID del artículo fuente guardado o existente
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Intentar insertar la fuente. IGNORE si ya existe (basado en URL UNIQUE).
+            # La base de datos usará los defaults SQL para los campos no proporcionados si no hay conflicto de UNIQUE.
+            cursor.execute('''
+                INSERT OR IGNORE INTO articulos
+                (titulo, url, score, resumen, fuente, fecha_publicacion_fuente, fecha_scraping, usada_para_generar)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+            ''', (
+                articulo.get('titulo', ''), # .get() con default string por seguridad
+                articulo['url'], # Asumimos que url SIEMPRE viene y es la clave
+                articulo.get('score'), # Score puede ser None si el analisis fallo totalmente
+                articulo.get('resumen', ''),
+                articulo.get('fuente', ''),
+                articulo.get('fecha_publicacion_fuente'), # Puede ser None, DB usara default o NULL
+                articulo.get('usada_para_generar', 0) # Usar 0 si no viene
+            ))
+            # Obtener el ID asignado a la fila insertada (si la inserción fue exitosa)
+            articulo_id = cursor.lastrowid
+
+            # Si lastrowid es 0, la inserción fue IGNORADA porque la URL ya existía.
+            # Necesitamos consultar la DB para obtener el ID del artículo existente.
+            if not articulo_id:
+                 # Buscar el ID del artículo existente por su URL
+                 cursor.execute('SELECT id FROM articulos WHERE url = ?', (articulo['url'],))
+                 articulo_id_row = cursor.fetchone()
+                 if articulo_id_row:
+                      articulo_id = articulo_id_row[0] # Obtener el ID de la fila existente
+                      # print(f"⚠️ Fuente {articulo['url'][:60]}... ya existía. Usando ID {articulo_id}.") # Debugging opcional
+                 else:
+                      # Esto NO DEBERÍA PASAR si url_existe() funciona o si INSERT OR IGNORE tuvo éxito pero lastrowid fue 0 por alguna razon.
+                      print(f"❌ Error: Falló al obtener ID para URL {articulo['url']} después de INSERT OR IGNORE.")
+                      conn.rollback() # Asegurarse de que la transacción se revierte si algo salió muy mal
+                      return None # Retornar None si no se puede obtener el ID
+
+
+            # === Guardar el texto completo de la fuente (comprimido) para poder regenerar sin red ===
+            full_content = articulo.get('full_content')
+            if full_content:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO articulos_contenido (articulo_id, contenido, longitud)
+                    VALUES (?, ?, ?)
+                ''', (articulo_id, _comprimir_texto(full_content), len(full_content)))
+
+            # === Lógica de tags (comentada para la versión mínima) ===
+            # Si necesitas tags para fuentes, DESCOMENTA esta sección y asegúrate de que
+            # las tablas 'tags' y 'articulos_fuente_tags' existen en schema.sql.
+            # tag_table_name = 'articulos_fuente_tags'
+            # try:
+            #     for tag in articulo.get('tags', []):
+            #         tag = tag.strip()
+            #         if not tag: continue # Skip empty tags
+            #         # Insert tag into tags table (ignore if already exists)
+            #         cursor.execute('INSERT OR IGNORE INTO tags (tag) VALUES (?)', (tag,))
+            #         # Get the ID of the tag (either newly inserted or existing)
+            #         cursor.execute('SELECT id FROM tags WHERE tag = ?', (tag,))
+            #         tag_id_row = cursor.fetchone()
+            #         if tag_id_row:
+            #             tag_id = tag_id_row[0]
+            #             # Link article and tag in the join table (ignore if link already exists)
+            #             cursor.execute(f'INSERT OR IGNORE INTO {tag_table_name} (articulo_fuente_id, tag_id) VALUES (?, ?)', (articulo_id, tag_id))
+            #         else:
+            #              print(f"⚠️ Could not find ID for tag '{tag}' after insertion attempt in guardar_articulo.")
+            # except Exception as e:
+            #      print(f"Error in tags/relationships section for article ID {articulo_id}: {str(e)}")
+            #      # Do not re-raise, just print warning
+            #      pass # Continue processing even if tag linking fails
+
+
+            conn.commit() # Commit final si todo lo anterior fue bien (o si la inserción/obtención ID fue bien)
+            return articulo_id # Retorna el ID del artículo fuente guardado o existente
 
-    except Exception as e:
-        print(f"❌ Error general al guardar artículo fuente {articulo.get('url', 'N/A')}: {str(e)}")
-        conn.rollback() # Rollback en caso de cualquier otra excepción
-        raise # Re-lanzar la excepción para que el llamador (scraper) la maneje
-    finally:
-        conn.close()
+        except Exception as e:
+            print(f"❌ Error general al guardar artículo fuente {articulo.get('url', 'N/A')}: {str(e)}")
+            conn.rollback() # Rollback en caso de cualquier otra excepción
+            raise # Re-lanzar la excepción para que el llamador (scraper) la maneje
 
 
 def mark_source_used(source_article_id: int):
     """Marca un artículo fuente como usado para generar contenido."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor() # CORREGIDO: Usar conn.cursor()
-    try:
-        cursor.execute('''
-            UPDATE articulos
-            SET usada_para_generar = 1
-            WHERE id = ?
-        ''', (source_article_id,))
-        conn.commit()
-        # print(f"✅ Fuente ID {source_article_id} marcada como usada.") # Debugging opcional
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Error SQL en mark_source_used: {str(e)}. ¿Existe la tabla 'articulos' y la columna 'usada_para_generar'?")
-        conn.rollback()
-    except Exception as e:
-        print(f"❌ Error en mark_source_used ID {source_article_id}: {str(e)}")
-        conn.rollback()
-    finally:
-        conn.close()
+    with conexion() as conn:
+        cursor = conn.cursor() # CORREGIDO: Usar conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE articulos
+                SET usada_para_generar = 1
+                WHERE id = ?
+            ''', (source_article_id,))
+            conn.commit()
+            # print(f"✅ Fuente ID {source_article_id} marcada como usada.") # Debugging opcional
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en mark_source_used: {str(e)}. ¿Existe la tabla 'articulos' y la columna 'usada_para_generar'?")
+            conn.rollback()
+        except Exception as e:
+            print(f"❌ Error en mark_source_used ID {source_article_id}: {str(e)}")
+            conn.rollback()
 
 def save_generated_article(article_data: Dict[str, Any]) -> Optional[int]:
     """Guarda un artículo generado en la tabla articulos_generados. Retorna el ID asignado."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Convertir la lista de tags a string JSON para guardarla
-        tags_list = article_data.get('tags', [])
-        if not isinstance(tags_list, list):
-             print(f"⚠️ save_generated_article recibió 'tags' que no es lista: {type(tags_list)}. Guardando como cadena vacía.")
-             tags_list = [] # Asegurar que es una lista para json.dumps
-        tags_str = json.dumps(tags_list) # json.dumps() convierte lista a string JSON
-
-
-        tema = article_data.get('tema', 'Desconocido')
-        if not tema: # Asegurar que el tema no está vacío
-             print("⚠️ save_generated_article: El campo 'tema' está vacío. Usando 'Desconocido'.")
-             tema = 'Desconocido'
-
-        # Insertar una nueva fila en articulos_generados.
-        # La base de datos usará los defaults SQL para campos no proporcionados si no hay conflicto.
-        cursor.execute('''
-            INSERT INTO articulos_generados
-            (tema, titulo, meta_description, body, tags, fecha_publicacion_destino, estado, score_fuentes_promedio, fecha_generacion)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (
-            tema, # Usar el tema (seccion)
-            article_data.get('title', 'Sin título'),
-            article_data.get('meta_description', ''),
-            article_data.get('body', ''),
-            tags_str, # Guardar el JSON de tags (string)
-            article_data.get('fecha_publicacion_destino'), # Puede ser None, DB usara default o NULL
-            article_data.get('estado', 'generado'), # Usar 'generado' si no se especifica
-            article_data.get('score_fuentes_promedio') # Score promedio puede ser None
-        ))
-        article_id = cursor.lastrowid # Obtener el ID asignado a la nueva fila
-
-        conn.commit() # Commit si la inserción fue exitosa
-        print(f"✅ Artículo generado '{article_data.get('title', 'N/A')[:50] + '...'}' guardado con ID {article_id}.")
-        return article_id # Retornar el ID del artículo generado guardado
-
-    except sqlite3.OperationalError as e:
-         print(f"⚠️ Error SQL en save_generated_article: {str(e)}. ¿Existe la tabla 'articulos_generados' y sus columnas?")
-         conn.rollback() # Rollback en caso de error SQL
-         raise # Re-lanzar
-    except Exception as e:
-        print(f"❌ Error general al guardar artículo generado '{article_data.get('title', 'N/A')}': {str(e)}")
-        conn.rollback() # Rollback en caso de cualquier otra excepción
-        raise # Re-lanzar
-    finally:
-        conn.close() # Cerrar la conexión
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Convertir la lista de tags a string JSON para guardarla
+            tags_list = article_data.get('tags', [])
+            if not isinstance(tags_list, list):
+                 print(f"⚠️ save_generated_article recibió 'tags' que no es lista: {type(tags_list)}. Guardando como cadena vacía.")
+                 tags_list = [] # Asegurar que es una lista para json.dumps
+            tags_str = json.dumps(tags_list) # json.dumps() convierte lista a string JSON
+
+
+            tema = article_data.get('tema', 'Desconocido')
+            if not tema: # Asegurar que el tema no está vacío
+                 print("⚠️ save_generated_article: El campo 'tema' está vacío. Usando 'Desconocido'.")
+                 tema = 'Desconocido'
+
+            # Insertar una nueva fila en articulos_generados.
+            # La base de datos usará los defaults SQL para campos no proporcionados si no hay conflicto.
+            cursor.execute('''
+                INSERT INTO articulos_generados
+                (tema, titulo, meta_description, body, tags, fecha_publicacion_destino, estado, score_fuentes_promedio, fecha_generacion)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (
+                tema, # Usar el tema (seccion)
+                article_data.get('title', 'Sin título'),
+                article_data.get('meta_description', ''),
+                article_data.get('body', ''),
+                tags_str, # Guardar el JSON de tags (string)
+                article_data.get('fecha_publicacion_destino'), # Puede ser None, DB usara default o NULL
+                article_data.get('estado', 'generado'), # Usar 'generado' si no se especifica
+                article_data.get('score_fuentes_promedio') # Score promedio puede ser None
+            ))
+            article_id = cursor.lastrowid # Obtener el ID asignado a la nueva fila
+
+            conn.commit() # Commit si la inserción fue exitosa
+            print(f"✅ Artículo generado '{article_data.get('title', 'N/A')[:50] + '...'}' guardado con ID {article_id}.")
+            return article_id # Retornar el ID del artículo generado guardado
+
+        except sqlite3.OperationalError as e:
+             print(f"⚠️ Error SQL en save_generated_article: {str(e)}. ¿Existe la tabla 'articulos_generados' y sus columnas?")
+             conn.rollback() # Rollback en caso de error SQL
+             raise # Re-lanzar
+        except Exception as e:
+            print(f"❌ Error general al guardar artículo generado '{article_data.get('title', 'N/A')}': {str(e)}")
+            conn.rollback() # Rollback en caso de cualquier otra excepción
+            raise # Re-lanzar
 
 
 def save_image_metadata(image_data: Dict[str, Any]):
     """Guarda la metadata de una imagen asociada a un artículo generado."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Asegurarse de que 'articulo_generado_id' está presente y es un número
-        # Pydantic en la API debe validar esto antes de llegar aquí, pero doble check.
-        articulo_generado_id = image_data.get('articulo_generado_id')
-        if not isinstance(articulo_generado_id, int):
-             print(f"⚠️ save_image_metadata: ID de artículo generado inválido o faltante: {articulo_generado_id}. No se guardará la imagen.")
-             # Podrías loguear los datos completos de image_data para depurar si es necesario
-             # print(f"   Image data: {image_data}")
-             return # No guardar si no hay ID válido
-
-
-        cursor.execute('''
-            INSERT INTO imagenes_generadas
-            (articulo_generado_id, url, alt_text, caption, licencia, autor)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            articulo_generado_id, # Usar el ID validado
-            image_data.get('url', ''),
-            image_data.get('alt_text', ''),
-            image_data.get('caption', ''),
-            image_data.get('licencia', 'Desconocida'),
-            image_data.get('autor', 'Desconocido')
-        ))
-        conn.commit() # Commit si la inserción fue exitosa
-        # print(f"✅ Metadata de imagen guardada para articulo generado ID {articulo_generado_id}") # Debugging opcional
-    except sqlite3.OperationalError as e:
-         print(f"⚠️ Error SQL en save_image_metadata: {str(e)}. ¿Existe la tabla 'imagenes_generadas' y sus columnas?")
-         conn.rollback() # Rollback en caso de error SQL
-         # No re-lanzar, un fallo al guardar una imagen no debería detener todo
-    except Exception as e:
-        print(f"❌ Error general al guardar metadata de imagen para articulo generado ID {articulo_generado_id or 'N/A'}: {str(e)}")
-        conn.rollback() # Rollback en caso de cualquier otra excepción
-        # No re-lanzar
-    finally:
-        conn.close() # Cerrar la conexión
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Asegurarse de que 'articulo_generado_id' está presente y es un número
+            # Pydantic en la API debe validar esto antes de llegar aquí, pero doble check.
+            articulo_generado_id = image_data.get('articulo_generado_id')
+            if not isinstance(articulo_generado_id, int):
+                 print(f"⚠️ save_image_metadata: ID de artículo generado inválido o faltante: {articulo_generado_id}. No se guardará la imagen.")
+                 # Podrías loguear los datos completos de image_data para depurar si es necesario
+                 # print(f"   Image data: {image_data}")
+                 return # No guardar si no hay ID válido
+
+
+            cursor.execute('''
+                INSERT INTO imagenes_generadas
+                (articulo_generado_id, url, alt_text, caption, licencia, autor)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                articulo_generado_id, # Usar el ID validado
+                image_data.get('url', ''),
+                image_data.get('alt_text', ''),
+                image_data.get('caption', ''),
+                image_data.get('licencia', 'Desconocida'),
+                image_data.get('autor', 'Desconocido')
+            ))
+            conn.commit() # Commit si la inserción fue exitosa
+            # print(f"✅ Metadata de imagen guardada para articulo generado ID {articulo_generado_id}") # Debugging opcional
+        except sqlite3.OperationalError as e:
+             print(f"⚠️ Error SQL en save_image_metadata: {str(e)}. ¿Existe la tabla 'imagenes_generadas' y sus columnas?")
+             conn.rollback() # Rollback en caso de error SQL
+             # No re-lanzar, un fallo al guardar una imagen no debería detener todo
+        except Exception as e:
+            print(f"❌ Error general al guardar metadata de imagen para articulo generado ID {articulo_generado_id or 'N/A'}: {str(e)}")
+            conn.rollback() # Rollback en caso de cualquier otra excepción
+            # No re-lanzar
+
+
+def save_generation_result(article_data: Dict[str, Any], source_article_ids: List[int], images_metadata: Optional[List[Dict[str, Any]]] = None,
+                           puntuaciones_fuentes: Optional[Dict[int, Dict[str, Any]]] = None) -> Optional[int]:
+    """
+    Unidad de trabajo del pipeline: guarda en UNA sola transacción (un solo commit)
+    el artículo generado, sus enlaces a las fuentes usadas (articulos_generados_fuentes),
+    el marcado de esas fuentes como usadas (usada_para_generar) y la metadata de sus imágenes.
+
+    Args:
+        article_data (dict): Datos del artículo generado (title, meta_description, body, tags, tema...).
+        source_article_ids (List[int]): IDs (tabla articulos) de las fuentes usadas.
+        images_metadata (List[dict], opcional): Metadata de imágenes (formato de web_tools.find_free_images).
+        puntuaciones_fuentes (dict, opcional): {ID de fuente: {'score', 'resumen'}} del análisis hecho para el tema
+            de este artículo. Se guardan en el enlace (la fila de 'articulos' conserva el del primer tema que la guardó)
+            y, si article_data no trae score_fuentes_promedio, se calcula con estos scores.
+
+    Returns:
+        Optional[int]: ID del artículo generado, o None si la transacción falla (no se guarda nada).
+    """
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            tags_list = article_data.get('tags', [])
+            if not isinstance(tags_list, list):
+                 print(f"⚠️ save_generation_result recibió 'tags' que no es lista: {type(tags_list)}. Guardando lista vacía.")
+                 tags_list = []
+            tema = article_data.get('tema') or 'Desconocido'
+            puntuaciones_fuentes = puntuaciones_fuentes or {}
+            score_promedio = article_data.get('score_fuentes_promedio')
+            if score_promedio is None:
+                scores = [p.get('score') for p in puntuaciones_fuentes.values() if isinstance(p.get('score'), (int, float))]
+                score_promedio = round(sum(scores) / len(scores), 2) if scores else None
+
+            cursor.execute('''
+                INSERT INTO articulos_generados
+                (tema, titulo, meta_description, body, tags, fecha_publicacion_destino, estado, score_fuentes_promedio, fecha_generacion)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (
+                tema,
+                article_data.get('title', 'Sin título'),
+                article_data.get('meta_description', ''),
+                article_data.get('body', ''),
+                json.dumps(tags_list),
+                article_data.get('fecha_publicacion_destino'),
+                article_data.get('estado', 'generado'),
+                score_promedio
+            ))
+            article_id = cursor.lastrowid
+
+            source_ids = [source_id for source_id in source_article_ids if source_id is not None]
+            if source_ids:
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO articulos_generados_fuentes (articulo_generado_id, articulo_fuente_id, score, resumen)
+                    VALUES (?, ?, ?, ?)
+                ''', [(article_id, source_id, puntuaciones_fuentes.get(source_id, {}).get('score'),
+                       puntuaciones_fuentes.get(source_id, {}).get('resumen')) for source_id in source_ids])
+                cursor.executemany('UPDATE articulos SET usada_para_generar = 1 WHERE id = ?', [(source_id,) for source_id in source_ids])
+
+            if images_metadata:
+                # web_tools.find_free_images usa 'author'/'license'; la tabla usa 'autor'/'licencia'
+                cursor.executemany('''
+                    INSERT INTO imagenes_generadas
+                    (articulo_generado_id, url, alt_text, caption, licencia, autor)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(
+                    article_id,
+                    img.get('url', ''),
+                    img.get('alt_text', ''),
+                    img.get('caption', ''),
+                    img.get('licencia') or img.get('license') or 'Desconocida',
+                    img.get('autor') or img.get('author') or 'Desconocido'
+                ) for img in images_metadata if img.get('url')])
+
+            conn.commit() # Único commit para artículo + fuentes + imágenes
+            print(f"✅ Artículo generado '{article_data.get('title', 'N/A')[:50]}...' guardado con ID {article_id} "
+                  f"({len(source_ids)} fuentes, {len(images_metadata or [])} imágenes) en una transacción.")
+            return article_id
+
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en save_generation_result: {str(e)}. ¿Existen las tablas 'articulos_generados', 'articulos_generados_fuentes' e 'imagenes_generadas'?")
+            conn.rollback()
+            return None
+        except Exception as e:
+            print(f"❌ Error general en save_generation_result para '{article_data.get('title', 'N/A')}': {str(e)}")
+            conn.rollback()
+            return None
 
 
 # === Funciones para la tabla configuracion (para cargar/guardar) ===
@@ -313,32 +627,30 @@ def get_config(tema: str) -> Optional[Dict[str, Any]]:
     o un diccionario vacío {} si no.
     Maneja errores de DB retornando también {}.
     """
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute('SELECT * FROM configuracion WHERE tema = ?', (tema,))
-        row = cursor.fetchone()
-
-        if row:
-            col_names = [description[0] for description in cursor.description]
-            config_dict = dict(zip(col_names, row))
-            print(f"✅ Configuración encontrada para tema '{tema}'.")
-            # Retorna el diccionario tal cual lo lee de la DB (incluyendo ID y fechas)
-            # La API (Pydantic ConfigBase) se encargará de filtrar los campos que necesita.
-            return config_dict
-        else:
-            print(f"⚠️ No se encontró configuración guardada para tema '{tema}'.")
-            return {} # Retornar diccionario vacío si no se encuentra
-
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Error SQL en get_config: {str(e)}. ¿Existe la tabla 'configuracion'?")
-        return {} # Retornar diccionario vacío en caso de error
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT * FROM configuracion WHERE tema = ?', (tema,))
+            row = cursor.fetchone()
+
+            if row:
+                col_names = [description[0] for description in cursor.description]
+                config_dict = dict(zip(col_names, row))
+                print(f"✅ Configuración encontrada para tema '{tema}'.")
+                # Retorna el diccionario tal cual lo lee de la DB (incluyendo ID y fechas)
+                # La API (Pydantic ConfigBase) se encargará de filtrar los campos que necesita.
+                return config_dict
+            else:
+                print(f"⚠️ No se encontró configuración guardada para tema '{tema}'.")
+                return {} # Retornar diccionario vacío si no se encuentra
+
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en get_config: {str(e)}. ¿Existe la tabla 'configuracion'?")
+            return {} # Retornar diccionario vacío en caso de error
 
-    except Exception as e:
-        print(f"❌ Error en get_config para tema '{tema}': {str(e)}")
-        return {} # Retornar diccionario vacío en caso de otro error
-    finally:
-        conn.close()
+        except Exception as e:
+            print(f"❌ Error en get_config para tema '{tema}': {str(e)}")
+            return {} # Retornar diccionario vacío en caso de otro error
 
 def save_config(config_dict: Dict[str, Any]) -> bool:
     """
@@ -350,49 +662,307 @@ def save_config(config_dict: Dict[str, Any]) -> bool:
         print("❌ Error: config_dict debe incluir un 'tema' para guardar la configuración y no puede estar vacío.")
         return False
 
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Usamos INSERT OR REPLACE INTO. SQLite se encarga de los defaults para campos no proporcionados.
-        # Construir la query dinámicamente con solo los campos presentes en config_dict + tema
-        # No necesitamos una lista hardcodeada de valid_fields aquí, solo asegurarnos que el 'tema' viene.
-
-        # Preparar los campos y valores presentes en el diccionario de entrada
-        # Excluir campos que no deben ser insertados/reemplazados por cliente (como id, fechas DB)
-        fields_to_process = [k for k in config_dict.keys() if k not in ['id', 'fecha_creacion', 'fecha_actualizacion']]
-        values_to_process = [config_dict[k] for k in fields_to_process]
-
-        # El tema es esencial, debe estar en la lista de campos y valores
-        if 'tema' not in fields_to_process:
-             print("❌ Error: El campo 'tema' no está presente en el diccionario después de excluir campos DB.")
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Usamos INSERT OR REPLACE INTO. SQLite se encarga de los defaults para campos no proporcionados.
+            # Construir la query dinámicamente con solo los campos presentes en config_dict + tema
+            # No necesitamos una lista hardcodeada de valid_fields aquí, solo asegurarnos que el 'tema' viene.
+
+            # Preparar los campos y valores presentes en el diccionario de entrada
+            # Excluir campos que no deben ser insertados/reemplazados por cliente (como id, fechas DB)
+            fields_to_process = [k for k in config_dict.keys() if k not in ['id', 'fecha_creacion', 'fecha_actualizacion']]
+            values_to_process = [config_dict[k] for k in fields_to_process]
+
+            # El tema es esencial, debe estar en la lista de campos y valores
+            if 'tema' not in fields_to_process:
+                 print("❌ Error: El campo 'tema' no está presente en el diccionario después de excluir campos DB.")
+                 return False
+
+            # Crear placeholders y nombres de campos para la query
+            placeholders = ', '.join(['?'] * len(fields_to_process))
+            field_names = ', '.join(fields_to_process)
+
+            # Usamos INSERT OR REPLACE INTO
+            # Esto sobrescribirá la fila si ya existe un tema idéntico.
+            query = f'''
+                INSERT OR REPLACE INTO configuracion ({field_names})
+                VALUES ({placeholders})
+            '''
+            cursor.execute(query, values_to_process)
+
+            conn.commit() # Commit si la operación fue exitosa
+            print(f"✅ Configuración guardada para tema '{config_dict['tema']}'.")
+            return True
+
+        except sqlite3.OperationalError as e:
+             print(f"⚠️ Error SQL en save_config: {str(e)}")
+             conn.rollback() # Rollback en caso de error SQL
              return False
+        except Exception as e:
+            print(f"❌ Error al guardar configuración para tema '{config_dict.get('tema', 'N/A')}': {str(e)}")
+            conn.rollback() # Rollback en caso de cualquier otra excepción
+            return False
+
+
+# === Funciones para la tabla generacion_tareas (cola de generación, ver task_queue.py) ===
+# Un worker "reclama" una tarea con un lease (lease_hasta, epoch en segundos) que renueva mientras trabaja.
+# Si el worker muere, el lease caduca y otro worker vuelve a reclamar la tarea (hasta max_intentos).
+
+# Columnas de una tarea expuestas a la API (sin los parámetros ni el lease)
+_COLUMNAS_TAREA = ('id, tema, estado, configuracion_id, articulo_generado_id, mensaje_error, intentos, lote_id, '
+                   'fecha_solicitud, fecha_actualizacion, fecha_finalizacion')
+
+
+def crear_tarea_generacion(tema: str, parametros: Dict[str, Any], lote_id: Optional[str] = None) -> Optional[int]:
+    """Inserta una tarea 'pendiente' con los parámetros de la solicitud (JSON). Retorna su ID."""
+    with conexion() as conn:
+        try:
+            cursor = conn.execute(
+                'INSERT INTO generacion_tareas (tema, estado, parametros, lote_id) VALUES (?, ?, ?, ?)',
+                (tema, 'pendiente', json.dumps(parametros, ensure_ascii=False), lote_id)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        except Exception as e:
+            print(f"❌ Error al crear la tarea de generación para tema '{tema}': {str(e)}")
+            conn.rollback()
+            return None
+
+
+def crear_lote_tareas(lote_id: str, solicitudes: List[Dict[str, Any]]) -> List[int]:
+    """
+    Inserta en una sola transacción una tarea 'pendiente' por solicitud (dict con 'tema'), todas con lote_id.
+    Retorna los IDs en el mismo orden (lista vacía si la transacción falla).
+    """
+    with conexion() as conn:
+        try:
+            ids = [
+                conn.execute(
+                    'INSERT INTO generacion_tareas (tema, estado, parametros, lote_id) VALUES (?, ?, ?, ?)',
+                    (solicitud['tema'], 'pendiente', json.dumps(solicitud, ensure_ascii=False), lote_id)
+                ).lastrowid
+                for solicitud in solicitudes
+            ]
+            conn.commit()
+            return ids
+        except Exception as e:
+            print(f"❌ Error al crear el lote de tareas {lote_id}: {str(e)}")
+            conn.rollback()
+            return []
+
+
+def reclamar_tarea(worker_id: str, lease_seg: float, max_intentos: int) -> Optional[Dict[str, Any]]:
+    """
+    Reclama la tarea más antigua disponible (pendiente, o en progreso con el lease caducado)
+    y la marca 'en_progreso' a nombre de worker_id hasta ahora + lease_seg.
+    Las tareas con el lease caducado que ya agotaron max_intentos se marcan 'error'.
+    Retorna {'id', 'tema', 'parametros' (dict), 'intentos'} o None si no hay tareas.
+    """
+    with conexion() as conn:
+        ahora = time.time()
+        try:
+            # BEGIN IMMEDIATE: toma el lock de escritura antes de leer, así dos workers no reclaman la misma tarea
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('''
+                UPDATE generacion_tareas
+                SET estado = 'error', mensaje_error = ?, worker_id = NULL, lease_hasta = NULL,
+                    fecha_actualizacion = CURRENT_TIMESTAMP, fecha_finalizacion = CURRENT_TIMESTAMP
+                WHERE estado = 'en_progreso' AND lease_hasta < ? AND intentos >= ?
+            ''', (f"La tarea se interrumpió {max_intentos} veces sin terminar.", ahora, max_intentos))
+            fila = conn.execute('''
+                UPDATE generacion_tareas
+                SET estado = 'en_progreso', worker_id = ?, lease_hasta = ?, intentos = intentos + 1,
+                    fecha_actualizacion = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM generacion_tareas
+                    WHERE estado = 'pendiente' OR (estado = 'en_progreso' AND lease_hasta < ?)
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING id, tema, parametros, intentos
+            ''', (worker_id, ahora + lease_seg, ahora)).fetchone()
+            conn.commit()
+        except Exception as e:
+            print(f"❌ Error al reclamar tarea de generación ({worker_id}): {str(e)}")
+            conn.rollback()
+            return None
+
+        if fila is None:
+            return None
+        tarea_id, tema, parametros, intentos = fila
+        return {'id': tarea_id, 'tema': tema, 'parametros': json.loads(parametros) if parametros else {'tema': tema}, 'intentos': intentos}
+
+
+def renovar_lease(tarea_id: int, worker_id: str, lease_seg: float) -> bool:
+    """Extiende el lease de una tarea en progreso. Retorna False si el worker ya no la tiene reclamada."""
+    with conexion() as conn:
+        try:
+            cursor = conn.execute(
+                "UPDATE generacion_tareas SET lease_hasta = ? WHERE id = ? AND worker_id = ? AND estado = 'en_progreso'",
+                (time.time() + lease_seg, tarea_id, worker_id)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+        except Exception as e:
+            print(f"❌ Error al renovar el lease de la tarea ID {tarea_id}: {str(e)}")
+            conn.rollback()
+            return False
+
+
+def finalizar_tarea(tarea_id: int, worker_id: str, estado: str, articulo_generado_id: Optional[int] = None,
+                    mensaje_error: Optional[str] = None) -> bool:
+    """
+    Cierra una tarea reclamada por worker_id con estado 'completado' o 'error'.
+    Retorna False si la tarea ya no pertenece a ese worker (su lease caducó y la reclamó otro).
+    """
+    with conexion() as conn:
+        try:
+            cursor = conn.execute('''
+                UPDATE generacion_tareas
+                SET estado = ?, articulo_generado_id = ?, mensaje_error = ?, worker_id = NULL, lease_hasta = NULL,
+                    fecha_actualizacion = CURRENT_TIMESTAMP, fecha_finalizacion = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker_id = ?
+            ''', (estado, articulo_generado_id, mensaje_error, tarea_id, worker_id))
+            conn.commit()
+            return cursor.rowcount == 1
+        except Exception as e:
+            print(f"❌ Error al finalizar la tarea ID {tarea_id}: {str(e)}")
+            conn.rollback()
+            return False
+
+
+def liberar_tarea(tarea_id: int, worker_id: str) -> bool:
+    """Devuelve a 'pendiente' una tarea reclamada sin gastar el intento (p. ej. al apagar la API)."""
+    with conexion() as conn:
+        try:
+            cursor = conn.execute('''
+                UPDATE generacion_tareas
+                SET estado = 'pendiente', worker_id = NULL, lease_hasta = NULL, intentos = MAX(intentos - 1, 0),
+                    fecha_actualizacion = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker_id = ? AND estado = 'en_progreso'
+            ''', (tarea_id, worker_id))
+            conn.commit()
+            return cursor.rowcount == 1
+        except Exception as e:
+            print(f"❌ Error al liberar la tarea ID {tarea_id}: {str(e)}")
+            conn.rollback()
+            return False
+
+
+def reintentar_tarea(tarea_id: int) -> Optional[bool]:
+    """
+    Vuelve a poner en cola una tarea en 'error' (con los intentos a cero).
+    Retorna True si se reencoló, False si existe pero no está en 'error' y None si no existe.
+    """
+    with conexion() as conn:
+        try:
+            cursor = conn.execute('''
+                UPDATE generacion_tareas
+                SET estado = 'pendiente', intentos = 0, mensaje_error = NULL, fecha_finalizacion = NULL,
+                    fecha_actualizacion = CURRENT_TIMESTAMP
+                WHERE id = ? AND estado = 'error'
+            ''', (tarea_id,))
+            conn.commit()
+            if cursor.rowcount == 1:
+                return True
+            existe = conn.execute('SELECT 1 FROM generacion_tareas WHERE id = ?', (tarea_id,)).fetchone()
+            return False if existe else None
+        except Exception as e:
+            print(f"❌ Error al reintentar la tarea ID {tarea_id}: {str(e)}")
+            conn.rollback()
+            return False
+
+
+def get_tarea(tarea_id: int) -> Optional[Dict[str, Any]]:
+    """Obtiene una tarea de generación por ID (sin los parámetros ni el lease). Retorna None si no existe."""
+    with conexion() as conn:
+        try:
+            cursor = conn.execute(f'SELECT {_COLUMNAS_TAREA} FROM generacion_tareas WHERE id = ?', (tarea_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return dict(zip([description[0] for description in cursor.description], row))
+        except Exception as e:
+            print(f"❌ Error en get_tarea ID {tarea_id}: {str(e)}")
+            return None
+
+
+def get_tareas_lote(lote_id: str) -> List[Dict[str, Any]]:
+    """Obtiene las tareas de un lote en orden de creación (lista vacía si no existe)."""
+    with conexion() as conn:
+        try:
+            cursor = conn.execute(f'SELECT {_COLUMNAS_TAREA} FROM generacion_tareas WHERE lote_id = ? ORDER BY id', (lote_id,))
+            col_names = [description[0] for description in cursor.description]
+            return [dict(zip(col_names, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"❌ Error en get_tareas_lote '{lote_id}': {str(e)}")
+            return []
 
-        # Crear placeholders y nombres de campos para la query
-        placeholders = ', '.join(['?'] * len(fields_to_process))
-        field_names = ', '.join(fields_to_process)
-
-        # Usamos INSERT OR REPLACE INTO
-        # Esto sobrescribirá la fila si ya existe un tema idéntico.
-        query = f'''
-            INSERT OR REPLACE INTO configuracion ({field_names})
-            VALUES ({placeholders})
-        '''
-        cursor.execute(query, values_to_process)
-
-        conn.commit() # Commit si la operación fue exitosa
-        print(f"✅ Configuración guardada para tema '{config_dict['tema']}'.")
-        return True
-
-    except sqlite3.OperationalError as e:
-         print(f"⚠️ Error SQL en save_config: {str(e)}")
-         conn.rollback() # Rollback en caso de error SQL
-         return False
-    except Exception as e:
-        print(f"❌ Error al guardar configuración para tema '{config_dict.get('tema', 'N/A')}': {str(e)}")
-        conn.rollback() # Rollback en caso de cualquier otra excepción
-        return False
-    finally:
-        conn.close() # Cerrar la conexión
+
+# === Checkpoints de las etapas del pipeline (tabla tareas_checkpoints) ===
+# La salida de cada etapa completada (fuentes, artículo, imágenes...) se guarda como JSON comprimido
+# contra el ID de la tarea; al reintentar o reanudar la tarea, el pipeline parte de la última etapa completada.
+
+def guardar_checkpoint(tarea_id: int, etapa: str, datos: Any) -> bool:
+    """Guarda (o reemplaza) la salida de una etapa de la tarea. Retorna True si se guardó."""
+    with conexion() as conn:
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO tareas_checkpoints (tarea_id, etapa, datos, fecha) VALUES (?, ?, ?, CURRENT_TIMESTAMP)',
+                (tarea_id, etapa, _comprimir_texto(json.dumps(datos, ensure_ascii=False, default=str)))
+            )
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"❌ Error al guardar el checkpoint '{etapa}' de la tarea ID {tarea_id}: {str(e)}")
+            conn.rollback()
+            return False
+
+
+def cargar_checkpoints(tarea_id: int) -> Dict[str, Any]:
+    """Retorna {etapa: datos} con las etapas ya completadas de la tarea ({} si no hay o hay error)."""
+    with conexion() as conn:
+        try:
+            filas = conn.execute('SELECT etapa, datos FROM tareas_checkpoints WHERE tarea_id = ?', (tarea_id,)).fetchall()
+            return {etapa: json.loads(_descomprimir_texto(datos)) for etapa, datos in filas}
+        except Exception as e:
+            print(f"❌ Error al cargar los checkpoints de la tarea ID {tarea_id}: {str(e)}")
+            return {}
+
+
+def borrar_checkpoints(tarea_id: int):
+    """Elimina los checkpoints de una tarea (al completarse ya no hacen falta)."""
+    with conexion() as conn:
+        try:
+            conn.execute('DELETE FROM tareas_checkpoints WHERE tarea_id = ?', (tarea_id,))
+            conn.commit()
+        except Exception as e:
+            print(f"❌ Error al borrar los checkpoints de la tarea ID {tarea_id}: {str(e)}")
+            conn.rollback()
+
+
+def purgar_checkpoints_antiguos(dias: float) -> int:
+    """
+    Elimina los checkpoints de las tareas en 'error' que terminaron hace más de `dias` días
+    (ya nadie las va a reintentar) y los de tareas que ya no existen. Retorna cuántos se borraron.
+    """
+    with conexion() as conn:
+        try:
+            cursor = conn.execute('''
+                DELETE FROM tareas_checkpoints
+                WHERE tarea_id IN (
+                    SELECT id FROM generacion_tareas
+                    WHERE estado = 'error'
+                      AND COALESCE(fecha_finalizacion, fecha_actualizacion) < datetime('now', ?)
+                )
+                OR tarea_id NOT IN (SELECT id FROM generacion_tareas)
+            ''', (f"-{dias} days",))
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            print(f"❌ Error al purgar los checkpoints antiguos: {str(e)}")
+            conn.rollback()
+            return 0
 
 
 # === Funciones para obtener datos de artículos generados para la UI (Canvas, Lista) ===
@@ -403,172 +973,170 @@ def save_config(config_dict: Dict[str, Any]) -> bool:
 # - Actualizar 1 artículo: update_generated_article(article_id, updated_data: Dict[str, Any]) -> bool
 
 
-def get_all_generated_articles(tema: Optional[str] = None, estado: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
-    """Obtiene artículos generados, opcionalmente filtrados por tema/sección o estado."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Seleccionar solo los campos necesarios para la lista
-        query = 'SELECT id, tema, titulo, fecha_generacion, estado, score_fuentes_promedio FROM articulos_generados WHERE 1=1'
-        params = []
+def _consulta_articulos_generados(tema: Optional[str], estado: Optional[str], limit: int):
+    """SQL y parámetros del listado de artículos generados (compartido con las pruebas de planes de consulta)."""
+    # Seleccionar solo los campos necesarios para la lista (todos incluidos en los índices idx_ag_*)
+    query = 'SELECT id, tema, titulo, fecha_generacion, estado, score_fuentes_promedio FROM articulos_generados WHERE 1=1'
+    params = []
 
-        if tema: # Filtrar por tema (seccion)
-            query += ' AND tema = ?'
-            params.append(tema)
-        if estado:
-            query += ' AND estado = ?'
-            params.append(estado)
+    if tema: # Filtrar por tema (seccion)
+        query += ' AND tema = ?'
+        params.append(tema)
+    if estado:
+        query += ' AND estado = ?'
+        params.append(estado)
 
-        query += ' ORDER BY fecha_generacion DESC LIMIT ?'
-        params.append(limit)
+    query += ' ORDER BY fecha_generacion DESC LIMIT ?'
+    params.append(limit)
+    return query, params
 
 
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        col_names = [description[0] for description in cursor.description]
-        results = [dict(zip(col_names, row)) for row in rows] # Crear lista de diccionarios
+def get_all_generated_articles(tema: Optional[str] = None, estado: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """Obtiene artículos generados, opcionalmente filtrados por tema/sección o estado."""
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            query, params = _consulta_articulos_generados(tema, estado, limit)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            col_names = [description[0] for description in cursor.description]
+            results = [dict(zip(col_names, row)) for row in rows] # Crear lista de diccionarios
 
-        print(f"📚 Encontrados {len(results)} artículos generados (Filtros: Tema/Seccion={tema}, Estado={estado}).")
-        return results
+            print(f"📚 Encontrados {len(results)} artículos generados (Filtros: Tema/Seccion={tema}, Estado={estado}).")
+            return results
 
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Error SQL en get_all_generated_articles: {str(e)}. ¿Existe la tabla 'articulos_generados'?")
-        return []
-    except Exception as e:
-        print(f"❌ Error en get_all_generated_articles: {str(e)}")
-        return []
-    finally:
-        conn.close()
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en get_all_generated_articles: {str(e)}. ¿Existe la tabla 'articulos_generados'?")
+            return []
+        except Exception as e:
+            print(f"❌ Error en get_all_generated_articles: {str(e)}")
+            return []
 
 
 def get_generated_article_by_id(article_id: int) -> Optional[Dict[str, Any]]:
     """Obtiene los detalles completos de un artículo generado por su ID, incluyendo metadata de imágenes asociadas."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Obtener datos del artículo principal (seleccionar todos los campos con *)
-        cursor.execute('SELECT * FROM articulos_generados WHERE id = ?', (article_id,))
-        article_row = cursor.fetchone()
-
-        if not article_row:
-            print(f"⚠️ Artículo generado con ID {article_id} no encontrado.")
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Obtener datos del artículo principal (seleccionar todos los campos con *)
+            cursor.execute('SELECT * FROM articulos_generados WHERE id = ?', (article_id,))
+            article_row = cursor.fetchone()
+
+            if not article_row:
+                print(f"⚠️ Artículo generado con ID {article_id} no encontrado.")
+                return None
+
+            article_col_names = [description[0] for description in cursor.description]
+            article_data = dict(zip(article_col_names, article_row))
+
+            # Convertir tags de string JSON a lista
+            # Asegúrate de que la columna 'tags' existe en articulos_generados y es TEXT (JSON)
+            if 'tags' in article_data and isinstance(article_data['tags'], str): # Verificar que es un string para parsear
+                 try:
+                      article_data['tags'] = json.loads(article_data['tags'])
+                 except json.JSONDecodeError:
+                      print(f"⚠️ Error al parsear tags JSON para artículo ID {article_id}. Tags raw: {article_data['tags']}")
+                      article_data['tags'] = [] # Default a lista vacía si falla el parseo
+            elif 'tags' not in article_data or article_data['tags'] is None:
+                 article_data['tags'] = [] # Asegurar que el campo existe y es lista si no viene o es NULL
+
+
+            # Obtener metadata de imágenes asociadas
+            # === CORRECCIÓN: Añadir 'articulo_generado_id' a la lista de columnas seleccionadas ===
+            cursor.execute('SELECT id, articulo_generado_id, url, alt_text, caption, licencia, autor FROM imagenes_generadas WHERE articulo_generado_id = ?', (article_id,))
+            # =====================================================================================
+            image_rows = cursor.fetchall()
+            image_col_names = [description[0] for description in cursor.description]
+            images_data = [dict(zip(image_col_names, row)) for row in image_rows] # Crear lista de diccionarios
+
+            article_data['imagenes'] = images_data # Añadir la lista de imágenes al diccionario del artículo
+
+            # === Añadir image_url y image_caption directamente al artículo si hay imágenes ===
+            if images_data:
+                # Tomar la URL y el caption de la primera imagen encontrada
+                article_data['image_url'] = images_data[0].get('url')
+                article_data['image_caption'] = images_data[0].get('caption')
+            else:
+                article_data['image_url'] = None
+                article_data['image_caption'] = None
+            # ===============================================================================
+
+            print(f"✅ Artículo generado ID {article_id} y {len(images_data)} imágenes asociadas cargados.")
+            return article_data
+
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en get_generated_article_by_id: {str(e)}. ¿Existen las tablas 'articulos_generados' e 'imagenes_generadas' y sus columnas?")
+            return None
+        except Exception as e:
+            print(f"❌ Error en get_generated_article_by_id para ID {article_id}: {str(e)}")
             return None
-
-        article_col_names = [description[0] for description in cursor.description]
-        article_data = dict(zip(article_col_names, article_row))
-
-        # Convertir tags de string JSON a lista
-        # Asegúrate de que la columna 'tags' existe en articulos_generados y es TEXT (JSON)
-        if 'tags' in article_data and isinstance(article_data['tags'], str): # Verificar que es un string para parsear
-             try:
-                  article_data['tags'] = json.loads(article_data['tags'])
-             except json.JSONDecodeError:
-                  print(f"⚠️ Error al parsear tags JSON para artículo ID {article_id}. Tags raw: {article_data['tags']}")
-                  article_data['tags'] = [] # Default a lista vacía si falla el parseo
-        elif 'tags' not in article_data or article_data['tags'] is None:
-             article_data['tags'] = [] # Asegurar que el campo existe y es lista si no viene o es NULL
-
-
-        # Obtener metadata de imágenes asociadas
-        # === CORRECCIÓN: Añadir 'articulo_generado_id' a la lista de columnas seleccionadas ===
-        cursor.execute('SELECT id, articulo_generado_id, url, alt_text, caption, licencia, autor FROM imagenes_generadas WHERE articulo_generado_id = ?', (article_id,))
-        # =====================================================================================
-        image_rows = cursor.fetchall()
-        image_col_names = [description[0] for description in cursor.description]
-        images_data = [dict(zip(image_col_names, row)) for row in image_rows] # Crear lista de diccionarios
-
-        article_data['imagenes'] = images_data # Añadir la lista de imágenes al diccionario del artículo
-
-        # === Añadir image_url y image_caption directamente al artículo si hay imágenes ===
-        if images_data:
-            # Tomar la URL y el caption de la primera imagen encontrada
-            article_data['image_url'] = images_data[0].get('url')
-            article_data['image_caption'] = images_data[0].get('caption')
-        else:
-            article_data['image_url'] = None
-            article_data['image_caption'] = None
-        # ===============================================================================
-
-        print(f"✅ Artículo generado ID {article_id} y {len(images_data)} imágenes asociadas cargados.")
-        return article_data
-
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Error SQL en get_generated_article_by_id: {str(e)}. ¿Existen las tablas 'articulos_generados' e 'imagenes_generadas' y sus columnas?")
-        return None
-    except Exception as e:
-        print(f"❌ Error en get_generated_article_by_id para ID {article_id}: {str(e)}")
-        return None
-    finally:
-        conn.close()
 
 
 def update_generated_article(article_id: int, updated_data: Dict[str, Any]) -> bool:
     """Actualiza campos de un artículo generado por su ID."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Define qué campos de `articulos_generados` pueden ser actualizados desde la UI/API
-        # Asegúrate de que esta lista coincide con los campos en tu tabla articulos_generados
-        allowed_fields = ['titulo', 'meta_description', 'body', 'tags', 'estado', 'fecha_publicacion_destino'] # Añadidos más campos comunes si se quieren editar
-
-        set_clauses = []
-        params = []
-        filtered_updated_data = {}
-
-        for field, value in updated_data.items():
-             if field in allowed_fields:
-                  if field == 'tags':
-                       # Si el campo es 'tags' y el valor es una lista, convertir a JSON string
-                       if isinstance(value, list):
-                            filtered_updated_data[field] = json.dumps(value)
-                       elif value is None:
-                             filtered_updated_data[field] = json.dumps([]) # Guardar lista vacía si es None
-                       # Si es string o otro tipo, Pydantic ya validó, guardar tal cual o convertir si necesario
-                       # Asumimos que Pydantic (GeneratedArticleUpdate) valida esto.
-                  else:
-                       filtered_updated_data[field] = value # Otros campos permitidos
-
-        if not filtered_updated_data:
-            print(f"⚠️ No hay campos válidos en updated_data para actualizar artículo ID {article_id}.")
-            return False # Nada que actualizar
-
-        for field, value in filtered_updated_data.items():
-            set_clauses.append(f"{field} = ?")
-            params.append(value)
-
-        # Opcional: Actualizar fecha de actualización de la fila si la columna existe
-        # set_clauses.append("fecha_actualizacion = CURRENT_TIMESTAMP") # Asumiendo que existe en schema.sql de articulos_generados
-
-        params.append(article_id) # Añadir el ID para la cláusula WHERE
-
-        query = f'''
-            UPDATE articulos_generados
-            SET {', '.join(set_clauses)}
-            WHERE id = ?
-        '''
-
-        cursor.execute(query, params)
-
-        # Verificar si se actualizó alguna fila
-        if cursor.rowcount == 0:
-             print(f"⚠️ Artículo generado con ID {article_id} no encontrado para actualizar.")
-             conn.rollback() # Rollback si el UPDATE no afectó ninguna fila
-             return False # No se actualizó nada
-
-        conn.commit() # Commit si la operación fue exitosa
-        print(f"✅ Artículo generado ID {article_id} actualizado.")
-        return True
-
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Error SQL en update_generated_article: {str(e)}. ¿Existe la tabla 'articulos_generados' y sus columnas?")
-        conn.rollback() # Rollback en caso de error SQL
-        return False # No re-lanzar, retornar False
-    except Exception as e:
-        print(f"❌ Error general al actualizar artículo generado ID {article_id}: {str(e)}")
-        conn.rollback() # Rollback en caso de cualquier otra excepción
-        return False # No re-lanzar
-    finally:
-        conn.close() # Cerrar la conexión
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Define qué campos de `articulos_generados` pueden ser actualizados desde la UI/API
+            # Asegúrate de que esta lista coincide con los campos en tu tabla articulos_generados
+            allowed_fields = ['titulo', 'meta_description', 'body', 'tags', 'estado', 'fecha_publicacion_destino'] # Añadidos más campos comunes si se quieren editar
+
+            set_clauses = []
+            params = []
+            filtered_updated_data = {}
+
+            for field, value in updated_data.items():
+                 if field in allowed_fields:
+                      if field == 'tags':
+                           # Si el campo es 'tags' y el valor es una lista, convertir a JSON string
+                           if isinstance(value, list):
+                                filtered_updated_data[field] = json.dumps(value)
+                           elif value is None:
+                                 filtered_updated_data[field] = json.dumps([]) # Guardar lista vacía si es None
+                           # Si es string o otro tipo, Pydantic ya validó, guardar tal cual o convertir si necesario
+                           # Asumimos que Pydantic (GeneratedArticleUpdate) valida esto.
+                      else:
+                           filtered_updated_data[field] = value # Otros campos permitidos
+
+            if not filtered_updated_data:
+                print(f"⚠️ No hay campos válidos en updated_data para actualizar artículo ID {article_id}.")
+                return False # Nada que actualizar
+
+            for field, value in filtered_updated_data.items():
+                set_clauses.append(f"{field} = ?")
+                params.append(value)
+
+            # Opcional: Actualizar fecha de actualización de la fila si la columna existe
+            # set_clauses.append("fecha_actualizacion = CURRENT_TIMESTAMP") # Asumiendo que existe en schema.sql de articulos_generados
+
+            params.append(article_id) # Añadir el ID para la cláusula WHERE
+
+            query = f'''
+                UPDATE articulos_generados
+                SET {', '.join(set_clauses)}
+                WHERE id = ?
+            '''
+
+            cursor.execute(query, params)
+
+            # Verificar si se actualizó alguna fila
+            if cursor.rowcount == 0:
+                 print(f"⚠️ Artículo generado con ID {article_id} no encontrado para actualizar.")
+                 conn.rollback() # Rollback si el UPDATE no afectó ninguna fila
+                 return False # No se actualizó nada
+
+            conn.commit() # Commit si la operación fue exitosa
+            print(f"✅ Artículo generado ID {article_id} actualizado.")
+            return True
+
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en update_generated_article: {str(e)}. ¿Existe la tabla 'articulos_generados' y sus columnas?")
+            conn.rollback() # Rollback en caso de error SQL
+            return False # No re-lanzar, retornar False
+        except Exception as e:
+            print(f"❌ Error general al actualizar artículo generado ID {article_id}: {str(e)}")
+            conn.rollback() # Rollback en caso de cualquier otra excepción
+            return False # No re-lanzar
 
 
 # === Funciones para obtener datos de fuentes para la UI (Admin) ===
@@ -582,22 +1150,20 @@ def update_generated_article(article_id: int, updated_data: Dict[str, Any]) -> b
 # Implementar esta función si se necesita listar secciones en la UI
 def get_available_temas_secciones() -> List[str]:
     """Obtiene una lista de todos los temas/secciones que tienen configuración guardada."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Seleccionar solo la columna tema
-        cursor.execute('SELECT DISTINCT tema FROM configuracion ORDER BY tema')
-        rows = cursor.fetchall()
-        # Retorna una lista de strings de tema
-        return [row[0] for row in rows]
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Error SQL en get_available_temas_secciones: {str(e)}. ¿Existe la tabla 'configuracion'?")
-        return []
-    except Exception as e:
-        print(f"❌ Error en get_available_temas_secciones: {str(e)}")
-        return []
-    finally:
-        conn.close()
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Seleccionar solo la columna tema
+            cursor.execute('SELECT DISTINCT tema FROM configuracion ORDER BY tema')
+            rows = cursor.fetchall()
+            # Retorna una lista de strings de tema
+            return [row[0] for row in rows]
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en get_available_temas_secciones: {str(e)}. ¿Existe la tabla 'configuracion'?")
+            return []
+        except Exception as e:
+            print(f"❌ Error en get_available_temas_secciones: {str(e)}")
+            return []
 
 
 def save_article_generated_sources(article_generated_id: int, source_article_ids: List[int]) -> bool:
@@ -615,63 +1181,89 @@ def save_article_generated_sources(article_generated_id: int, source_article_ids
         print(f"⚠️ save_article_generated_sources: No hay IDs de fuentes para guardar para artículo generado ID {article_generated_id}.")
         return True # No hay error si no hay nada que guardar
 
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Construir la lista de tuplas para la inserción masiva
-        relations_to_insert = [(article_generated_id, source_id) for source_id in source_article_ids]
-
-        # Usamos INSERT OR IGNORE INTO en caso de que la relación ya exista (aunque no debería si el ID de generado es nuevo)
-        cursor.executemany('''
-            INSERT OR IGNORE INTO articulos_generados_fuentes (articulo_generado_id, articulo_fuente_id)
-            VALUES (?, ?)
-        ''', relations_to_insert)
-
-        conn.commit()
-        print(f"✅ Guardadas {cursor.rowcount} relaciones entre artículo generado ID {article_generated_id} y fuentes.")
-        return True
-
-    except sqlite3.OperationalError as e:
-         print(f"⚠️ Error SQL en save_article_generated_sources: {str(e)}. ¿Existe la tabla 'articulos_generados_fuentes'?")
-         conn.rollback()
-         return False
-    except Exception as e:
-        print(f"❌ Error general al guardar relaciones de fuentes para artículo generado ID {article_generated_id}: {str(e)}")
-        conn.rollback()
-        return False
-    finally:
-        conn.close()
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Construir la lista de tuplas para la inserción masiva
+            relations_to_insert = [(article_generated_id, source_id) for source_id in source_article_ids]
+
+            # Usamos INSERT OR IGNORE INTO en caso de que la relación ya exista (aunque no debería si el ID de generado es nuevo)
+            cursor.executemany('''
+                INSERT OR IGNORE INTO articulos_generados_fuentes (articulo_generado_id, articulo_fuente_id)
+                VALUES (?, ?)
+            ''', relations_to_insert)
+
+            conn.commit()
+            print(f"✅ Guardadas {cursor.rowcount} relaciones entre artículo generado ID {article_generated_id} y fuentes.")
+            return True
+
+        except sqlite3.OperationalError as e:
+             print(f"⚠️ Error SQL en save_article_generated_sources: {str(e)}. ¿Existe la tabla 'articulos_generados_fuentes'?")
+             conn.rollback()
+             return False
+        except Exception as e:
+            print(f"❌ Error general al guardar relaciones de fuentes para artículo generado ID {article_generated_id}: {str(e)}")
+            conn.rollback()
+            return False
 
 
-def get_sources_used_by_article(article_generated_id: int) -> List[Dict[str, Any]]:
+def get_sources_used_by_article(article_generated_id: int, incluir_contenido: bool = False) -> List[Dict[str, Any]]:
     """
     Obtiene los detalles de las fuentes (desde la tabla articulos) usadas para un artículo generado.
+    Si incluir_contenido es True, añade 'full_content' (descomprimido desde articulos_contenido,
+    None si la fuente no tiene texto guardado). Por defecto no se carga el texto.
     """
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-    try:
-        # Unir articulos_generados_fuentes con articulos para obtener los detalles de las fuentes
-        query = '''
-            SELECT
-                a.id, a.titulo, a.url, a.score, a.resumen, a.fuente, a.fecha_publicacion_fuente,
-                a.fecha_scraping, a.usada_para_generar
-            FROM articulos a
-            JOIN articulos_generados_fuentes agf ON a.id = agf.articulo_fuente_id
-            WHERE agf.articulo_generado_id = ?
-        '''
-        cursor.execute(query, (article_generated_id,))
-        rows = cursor.fetchall()
-        col_names = [description[0] for description in cursor.description]
-        results = [dict(zip(col_names, row)) for row in rows] # Crear lista de diccionarios
-
-        print(f"📚 Encontradas {len(results)} fuentes usadas para artículo generado ID {article_generated_id}.")
-        return results
-
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Error SQL en get_sources_used_by_article: {str(e)}. ¿Existen las tablas 'articulos' y 'articulos_generados_fuentes'?")
-        return []
-    except Exception as e:
-        print(f"❌ Error en get_sources_used_by_article para artículo generado ID {article_generated_id}: {str(e)}")
-        return []
-    finally:
-        conn.close()
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Unir articulos_generados_fuentes con articulos para obtener los detalles de las fuentes.
+            # El score y el resumen son los del tema de este artículo (guardados en el enlace) si los hay
+            query = '''
+                SELECT
+                    a.id, a.titulo, a.url, COALESCE(agf.score, a.score) AS score, COALESCE(agf.resumen, a.resumen) AS resumen,
+                    a.fuente, a.fecha_publicacion_fuente, a.fecha_scraping, a.usada_para_generar
+                FROM articulos a
+                JOIN articulos_generados_fuentes agf ON a.id = agf.articulo_fuente_id
+                WHERE agf.articulo_generado_id = ?
+            '''
+            cursor.execute(query, (article_generated_id,))
+            rows = cursor.fetchall()
+            col_names = [description[0] for description in cursor.description]
+            results = [dict(zip(col_names, row)) for row in rows] # Crear lista de diccionarios
+
+            if incluir_contenido and results:
+                contenidos = get_sources_content([source['id'] for source in results])
+                for source in results:
+                    source['full_content'] = contenidos.get(source['id'])
+
+            print(f"📚 Encontradas {len(results)} fuentes usadas para artículo generado ID {article_generated_id}.")
+            return results
+
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en get_sources_used_by_article: {str(e)}. ¿Existen las tablas 'articulos' y 'articulos_generados_fuentes'?")
+            return []
+        except Exception as e:
+            print(f"❌ Error en get_sources_used_by_article para artículo generado ID {article_generated_id}: {str(e)}")
+            return []
+
+
+def get_sources_content(source_article_ids: List[int]) -> Dict[int, str]:
+    """
+    Carga (y descomprime) el texto completo guardado de varias fuentes.
+    Retorna un dict {id_fuente: full_content}; las fuentes sin texto guardado no aparecen.
+    """
+    if not source_article_ids:
+        return {}
+
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            placeholders = ', '.join(['?'] * len(source_article_ids))
+            cursor.execute(f'SELECT articulo_id, contenido FROM articulos_contenido WHERE articulo_id IN ({placeholders})', list(source_article_ids))
+            return {articulo_id: _descomprimir_texto(contenido) for articulo_id, contenido in cursor.fetchall()}
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Error SQL en get_sources_content: {str(e)}. ¿Existe la tabla 'articulos_contenido'?")
+            return {}
+        except Exception as e:
+            print(f"❌ Error en get_sources_content: {str(e)}")
+            return {}
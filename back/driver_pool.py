@@ -0,0 +1,202 @@
+# driver_pool.py
+# Pool de drivers de Selenium de larga duración, propiedad del proceso de la API.
+# Se usa SOLO para el fallback de redirecciones que requieren JavaScript (ver web_tools.resolve_redirect_url).
+# Los drivers se crean bajo demanda, se reutilizan entre ejecuciones del pipeline y se reciclan
+# tras N páginas, por antigüedad o si la memoria del navegador crece demasiado.
+# La memoria es el RSS de todo el árbol de procesos del driver (chromedriver + Chrome con sus
+# renderers y el proceso GPU), medido con psutil.
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import web_tools
+
+try:
+    import psutil
+except ImportError: # Sin psutil no se mide la memoria: se recicla solo por páginas y antigüedad
+    psutil = None
+
+# === Configuración del pool (variables de entorno) ===
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+DRIVER_POOL_MAX_PAGINAS = int(os.getenv("DRIVER_POOL_MAX_PAGINAS", "50")) # Reciclar tras N páginas
+DRIVER_POOL_MAX_MEMORIA_MB = int(os.getenv("DRIVER_POOL_MAX_MEMORIA_MB", "1024")) # RSS máximo del navegador (árbol de procesos) antes de reciclar
+DRIVER_POOL_MAX_EDAD_SEG = int(os.getenv("DRIVER_POOL_MAX_EDAD_SEG", "1800")) # Reciclar drivers con más de 30 min
+DRIVER_POOL_TIMEOUT_CHECKOUT = float(os.getenv("DRIVER_POOL_TIMEOUT_CHECKOUT", "30"))
+
+
+class SeleniumDriverPool:
+    """
+    Pool acotado de drivers de Selenium con semántica checkout/checkin.
+    Seguro para uso concurrente desde varios hilos (varias ejecuciones del pipeline a la vez).
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_paginas=DRIVER_POOL_MAX_PAGINAS,
+                 max_memoria_mb=DRIVER_POOL_MAX_MEMORIA_MB, max_edad_seg=DRIVER_POOL_MAX_EDAD_SEG):
+        self.size = max(1, size)
+        self.max_paginas = max_paginas
+        self.max_memoria_mb = max_memoria_mb
+        self.max_edad_seg = max_edad_seg
+        self._libres = queue.LifoQueue() # LIFO: reutilizar el driver más "caliente"
+        self._cupos = threading.BoundedSemaphore(self.size) # Limita drivers vivos (libres + prestados)
+        self._lock = threading.Lock()
+        self._vivos = []
+        self._cerrado = False
+
+    # --- Ciclo de vida de un driver ---
+
+    def _crear(self):
+        """Arranca un nuevo navegador. Retorna la entrada del pool o None si falla."""
+        driver = web_tools.setup_driver()
+        if not driver:
+            return None
+        entrada = {'driver': driver, 'paginas': 0, 'creado': time.monotonic()}
+        with self._lock:
+            self._vivos.append(entrada)
+        print(f"🌐 DriverPool: Nuevo driver de Selenium creado ({len(self._vivos)}/{self.size}).")
+        return entrada
+
+    def _destruir(self, entrada, motivo=""):
+        """Cierra el navegador de una entrada y la elimina del registro de drivers vivos."""
+        with self._lock:
+            if entrada in self._vivos:
+                self._vivos.remove(entrada)
+        try:
+            entrada['driver'].quit()
+        except Exception as e:
+            print(f"⚠️ DriverPool: Error al cerrar driver: {str(e)}")
+        if motivo:
+            print(f"♻️ DriverPool: Driver reciclado ({motivo}).")
+
+    def _esta_sano(self, entrada):
+        """Health check: el navegador responde a un script trivial."""
+        try:
+            return entrada['driver'].execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _memoria_mb(self, entrada):
+        """
+        RSS total (MB) del proceso de chromedriver y todos sus descendientes (Chrome, renderers, GPU).
+        None si no se puede medir (sin psutil o sin PID del servicio).
+        """
+        if psutil is None:
+            return None
+        try:
+            proceso = psutil.Process(entrada['driver'].service.process.pid)
+            procesos = [proceso] + proceso.children(recursive=True)
+        except Exception:
+            return None
+        total = 0
+        for p in procesos:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error: # El proceso terminó entre children() y memory_info()
+                pass
+        return total / (1024 * 1024)
+
+    def _motivo_reciclaje(self, entrada):
+        """Retorna el motivo por el que la entrada debe reciclarse, o None si puede seguir en el pool."""
+        if entrada['paginas'] >= self.max_paginas:
+            return f"{entrada['paginas']} páginas"
+        if time.monotonic() - entrada['creado'] >= self.max_edad_seg:
+            return "antigüedad"
+        memoria = self._memoria_mb(entrada)
+        if memoria is not None and memoria >= self.max_memoria_mb:
+            return f"memoria {memoria:.0f} MB"
+        return None
+
+    # --- API pública ---
+
+    def checkout(self, timeout=DRIVER_POOL_TIMEOUT_CHECKOUT):
+        """
+        Presta un driver del pool (creándolo si hace falta y hay cupo).
+        Retorna la entrada del pool (dict con 'driver') o None si no hay driver disponible.
+        La entrada DEBE devolverse con checkin().
+        """
+        if self._cerrado:
+            return None
+        if not self._cupos.acquire(timeout=timeout):
+            print("⚠️ DriverPool: Timeout esperando un driver libre.")
+            return None
+        try:
+            while True:
+                try:
+                    entrada = self._libres.get_nowait()
+                except queue.Empty:
+                    entrada = self._crear()
+                    if entrada is None:
+                        self._cupos.release()
+                    return entrada
+                if self._esta_sano(entrada):
+                    return entrada
+                self._destruir(entrada, "no respondía al health check")
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def checkin(self, entrada, descartar=False):
+        """Devuelve un driver al pool. Si está marcado para descartar o debe reciclarse, se cierra."""
+        if entrada is None:
+            return
+        try:
+            entrada['paginas'] += 1
+            motivo = "descartado por el llamador" if descartar else self._motivo_reciclaje(entrada)
+            if motivo or self._cerrado:
+                self._destruir(entrada, motivo)
+            else:
+                self._libres.put(entrada)
+        finally:
+            self._cupos.release()
+
+    @contextmanager
+    def driver(self, timeout=DRIVER_POOL_TIMEOUT_CHECKOUT):
+        """
+        Context manager: `with pool.driver() as driver:`. driver puede ser None si no hay ninguno disponible.
+        Si el bloque lanza una excepción, el driver se descarta en lugar de volver al pool.
+        """
+        entrada = self.checkout(timeout=timeout)
+        try:
+            yield entrada['driver'] if entrada else None
+        except Exception:
+            self.checkin(entrada, descartar=True)
+            entrada = None
+            raise
+        finally:
+            if entrada is not None:
+                self.checkin(entrada)
+
+    def close(self):
+        """Cierra todos los drivers (libres y, al devolverse, los prestados)."""
+        self._cerrado = True
+        while True:
+            try:
+                self._destruir(self._libres.get_nowait())
+            except queue.Empty:
+                break
+        print("✅ DriverPool: Pool de drivers cerrado.")
+
+
+# === Pool compartido del proceso ===
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retorna el pool compartido del proceso, creándolo (sin arrancar navegadores) si no existe."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._cerrado:
+            _pool = SeleniumDriverPool()
+        return _pool
+
+
+def close_pool():
+    """Cierra el pool compartido del proceso (p. ej. al apagar la API)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,184 @@
+# fetch_cache.py
+# Caché en disco de páginas descargadas (HTML crudo + texto extraído), indexada por URL final.
+# - Cuerpos comprimidos con zlib en un archivo SQLite propio (separado de la DB principal).
+# - Entradas "frescas" se sirven sin red; las más antiguas se revalidan con GET condicional
+#   (If-None-Match / If-Modified-Since) usando el ETag / Last-Modified guardados.
+# - Expulsión por TTL y por tamaño total (LRU por último acceso).
+# - Contadores de aciertos/fallos para medir la tasa de acierto.
+
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+import sqlite_cache
+
+# === Configuración (variables de entorno) ===
+FETCH_CACHE_DB_PATH = os.getenv("FETCH_CACHE_DB", "fetch_cache.db")
+FETCH_CACHE_HABILITADA = os.getenv("FETCH_CACHE_HABILITADA", "1") == "1"
+FETCH_CACHE_FRESCO_SEG = int(os.getenv("FETCH_CACHE_FRESCO_SEG", str(6 * 3600))) # Servir sin revalidar durante 6 h
+FETCH_CACHE_TTL_SEG = int(os.getenv("FETCH_CACHE_TTL_SEG", str(7 * 24 * 3600))) # Expulsar entradas no validadas en 7 días
+FETCH_CACHE_MAX_MB = int(os.getenv("FETCH_CACHE_MAX_MB", "200")) # Tamaño máximo (comprimido) de la caché
+FETCH_CACHE_EXPULSAR_CADA = 50 # Ejecutar la expulsión cada N escrituras
+
+_stats = {'aciertos': 0, 'revalidadas': 0, 'fallos': 0, 'guardadas': 0, 'expulsadas': 0}
+
+_cache = sqlite_cache.CacheSQLite(
+    "FetchCache", lambda: FETCH_CACHE_DB_PATH, "paginas", '''
+        CREATE TABLE IF NOT EXISTS paginas (
+            clave TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            html BLOB, -- HTML crudo comprimido (zlib)
+            texto BLOB, -- Texto extraído comprimido (zlib); NULL si la página no tenía contenido útil
+            tamano INTEGER NOT NULL DEFAULT 0, -- Bytes comprimidos (html + texto)
+            fecha_descarga REAL NOT NULL,
+            fecha_validacion REAL NOT NULL,
+            ultimo_acceso REAL NOT NULL
+        )
+    ''', columna_ttl="fecha_validacion", expulsar_cada=FETCH_CACHE_EXPULSAR_CADA)
+
+
+def _clave(url: str) -> str:
+    """Clave de la caché: hash SHA-256 de la URL final."""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _comprimir(datos) -> Optional[bytes]:
+    if datos is None:
+        return None
+    if isinstance(datos, str):
+        datos = datos.encode('utf-8')
+    return zlib.compress(datos, 6)
+
+
+def _descomprimir(blob: Optional[bytes]) -> Optional[bytes]:
+    return zlib.decompress(blob) if blob is not None else None
+
+
+def obtener(url: str) -> Optional[Dict[str, Any]]:
+    """
+    Busca una URL en la caché.
+    Retorna None si no existe (o la caché está deshabilitada); si existe, un dict con
+    'texto' (str o None), 'etag', 'last_modified' y 'fresca' (True si puede servirse sin revalidar).
+    El HTML crudo no se descomprime aquí; usar obtener_html() si se necesita.
+    """
+    if not FETCH_CACHE_HABILITADA:
+        return None
+    ahora = time.time()
+    try:
+        with _cache.lock:
+            conn = _cache.conexion()
+            row = conn.execute(
+                'SELECT texto, etag, last_modified, fecha_validacion FROM paginas WHERE clave = ?',
+                (_clave(url),)
+            ).fetchone()
+            if row is None:
+                _stats['fallos'] += 1
+                return None
+            conn.execute('UPDATE paginas SET ultimo_acceso = ? WHERE clave = ?', (ahora, _clave(url)))
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"⚠️ FetchCache: Error leyendo caché para {url[:60]}...: {str(e)}")
+        return None
+
+    texto_blob, etag, last_modified, fecha_validacion = row
+    fresca = (ahora - fecha_validacion) < FETCH_CACHE_FRESCO_SEG
+    if fresca:
+        with _cache.lock:
+            _stats['aciertos'] += 1
+    texto = _descomprimir(texto_blob)
+    return {
+        'texto': texto.decode('utf-8') if texto is not None else None,
+        'etag': etag,
+        'last_modified': last_modified,
+        'fresca': fresca,
+    }
+
+
+def obtener_html(url: str) -> Optional[bytes]:
+    """Retorna el HTML crudo (descomprimido) guardado para una URL, o None."""
+    if not FETCH_CACHE_HABILITADA:
+        return None
+    with _cache.lock:
+        row = _cache.conexion().execute('SELECT html FROM paginas WHERE clave = ?', (_clave(url),)).fetchone()
+    return _descomprimir(row[0]) if row else None
+
+
+def cabeceras_condicionales(entrada: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Cabeceras para un GET condicional a partir de una entrada de la caché."""
+    headers = {}
+    if entrada:
+        if entrada.get('etag'):
+            headers['If-None-Match'] = entrada['etag']
+        if entrada.get('last_modified'):
+            headers['If-Modified-Since'] = entrada['last_modified']
+    return headers
+
+
+def marcar_revalidada(url: str):
+    """Registra que el servidor respondió 304 Not Modified: la entrada vuelve a estar fresca."""
+    if not FETCH_CACHE_HABILITADA:
+        return
+    ahora = time.time()
+    try:
+        with _cache.lock:
+            conn = _cache.conexion()
+            conn.execute('UPDATE paginas SET fecha_validacion = ?, ultimo_acceso = ? WHERE clave = ?', (ahora, ahora, _clave(url)))
+            conn.commit()
+            _stats['revalidadas'] += 1
+    except sqlite3.Error as e:
+        print(f"⚠️ FetchCache: Error al revalidar {url[:60]}...: {str(e)}")
+
+
+def guardar(url: str, html, texto: Optional[str], etag: Optional[str] = None, last_modified: Optional[str] = None):
+    """Guarda (o reemplaza) la página descargada y su texto extraído, comprimidos."""
+    if not FETCH_CACHE_HABILITADA:
+        return
+    html_blob = _comprimir(html)
+    texto_blob = _comprimir(texto)
+    tamano = len(html_blob or b'') + len(texto_blob or b'')
+    ahora = time.time()
+    try:
+        with _cache.lock:
+            conn = _cache.conexion()
+            conn.execute('''
+                INSERT OR REPLACE INTO paginas
+                (clave, url, etag, last_modified, html, texto, tamano, fecha_descarga, fecha_validacion, ultimo_acceso)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (_clave(url), url, etag, last_modified, html_blob, texto_blob, tamano, ahora, ahora, ahora))
+            conn.commit()
+            _stats['guardadas'] += 1
+            debe_expulsar = _cache.registrar_escritura()
+    except sqlite3.Error as e:
+        print(f"⚠️ FetchCache: Error guardando {url[:60]}...: {str(e)}")
+        return
+    if debe_expulsar:
+        expulsar()
+
+
+def expulsar():
+    """Elimina entradas caducadas (TTL) y, si la caché supera FETCH_CACHE_MAX_MB, las menos usadas recientemente."""
+    if not FETCH_CACHE_HABILITADA:
+        return
+    expulsadas = _cache.expulsar(FETCH_CACHE_TTL_SEG, FETCH_CACHE_MAX_MB)
+    with _cache.lock:
+        _stats['expulsadas'] += expulsadas
+
+
+def estadisticas() -> Dict[str, Any]:
+    """Contadores del proceso y tasa de acierto (aciertos + revalidadas sobre el total de consultas)."""
+    with _cache.lock:
+        stats = dict(_stats)
+    consultas = stats['aciertos'] + stats['revalidadas'] + stats['fallos']
+    stats['tasa_acierto'] = round((stats['aciertos'] + stats['revalidadas']) / consultas, 3) if consultas else 0.0
+    return stats
+
+
+def registrar_fallo():
+    """Cuenta como fallo una entrada no fresca que hubo que descargar de nuevo completa."""
+    with _cache.lock:
+        _stats['fallos'] += 1
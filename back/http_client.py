@@ -0,0 +1,115 @@
+# http_client.py
+# Capa HTTP compartida para todas las descargas salientes (búsqueda DDG, fuentes, Unsplash).
+# Una única sesión de requests con pool de conexiones por host y keep-alive,
+# timeouts configurables, reintentos con backoff para 429/5xx y un límite
+# de conexiones concurrentes por host. Usable desde código síncrono y asíncrono.
+
+import asyncio
+import os
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# === Configuración (variables de entorno) ===
+HTTP_TIMEOUT_CONEXION = float(os.getenv("HTTP_TIMEOUT_CONEXION", "5"))
+HTTP_TIMEOUT_LECTURA = float(os.getenv("HTTP_TIMEOUT_LECTURA", "15"))
+HTTP_MAX_REINTENTOS = int(os.getenv("HTTP_MAX_REINTENTOS", "3"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5")) # 0.5s, 1s, 2s...
+HTTP_MAX_CONEXIONES_POR_HOST = int(os.getenv("HTTP_MAX_CONEXIONES_POR_HOST", "4"))
+HTTP_MAX_HOSTS_EN_POOL = int(os.getenv("HTTP_MAX_HOSTS_EN_POOL", "64"))
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+STATUS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+_semaforos_por_host = {}
+_semaforos_lock = threading.Lock()
+
+
+def _crear_sesion() -> requests.Session:
+    """Crea la sesión compartida con reintentos y pool de conexiones por host."""
+    retry = Retry(
+        total=HTTP_MAX_REINTENTOS,
+        connect=HTTP_MAX_REINTENTOS,
+        read=HTTP_MAX_REINTENTOS,
+        status=HTTP_MAX_REINTENTOS,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=STATUS_REINTENTABLES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True, # Honrar Retry-After en 429/503
+        raise_on_status=False, # Tras agotar reintentos, retornar la última respuesta (raise_for_status decide)
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_MAX_HOSTS_EN_POOL, # Número de pools (hosts) cacheados
+        pool_maxsize=HTTP_MAX_CONEXIONES_POR_HOST, # Conexiones keep-alive reutilizables por host
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({'User-Agent': DEFAULT_USER_AGENT})
+    return session
+
+
+def get_session() -> requests.Session:
+    """Retorna la sesión HTTP compartida del proceso (creándola la primera vez)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _crear_sesion()
+    return _session
+
+
+def _semaforo_host(url: str) -> threading.BoundedSemaphore:
+    """Semáforo que limita las peticiones concurrentes a un mismo host."""
+    host = urlparse(url).netloc.lower()
+    with _semaforos_lock:
+        semaforo = _semaforos_por_host.get(host)
+        if semaforo is None:
+            semaforo = threading.BoundedSemaphore(HTTP_MAX_CONEXIONES_POR_HOST)
+            _semaforos_por_host[host] = semaforo
+        return semaforo
+
+
+def request(method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+    """
+    Realiza una petición HTTP con la sesión compartida.
+    timeout puede ser un número (lectura) o una tupla (conexión, lectura); por defecto usa la configuración global.
+    Lanza requests.exceptions.RequestException en errores de red, como requests.
+    """
+    if timeout is None:
+        timeout = (HTTP_TIMEOUT_CONEXION, HTTP_TIMEOUT_LECTURA)
+    elif isinstance(timeout, (int, float)):
+        timeout = (min(HTTP_TIMEOUT_CONEXION, timeout), timeout)
+    with _semaforo_host(url):
+        return get_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET con la sesión compartida (mismos argumentos que requests.get)."""
+    return request("GET", url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    """HEAD con la sesión compartida (mismos argumentos que requests.head)."""
+    kwargs.setdefault("allow_redirects", True)
+    return request("HEAD", url, **kwargs)
+
+
+async def aget(url: str, **kwargs) -> requests.Response:
+    """Versión asíncrona de get(): ejecuta la petición en un hilo sin bloquear el event loop."""
+    return await asyncio.to_thread(get, url, **kwargs)
+
+
+def close():
+    """Cierra la sesión compartida y sus conexiones keep-alive."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,340 @@
+# llm_backends.py
+# Backends del cliente LLM (llm_client). Se elige con LLM_BACKEND:
+# - "gemini" (por defecto): Google Gemini. El SDK se importa y configura en la primera llamada,
+#   no al importar llm_client (importar el proceso es más rápido y no exige clave ni red).
+# - "fake": respuestas locales deterministas (mismo prompt = misma respuesta), con latencia configurable
+#   e inyección de fallos. Con salida estructurada genera un JSON válido para el response_schema pedido.
+#   Sirve para pruebas de carga del pipeline, del análisis por lotes y de la API sin red ni cuota.
+# - "replay": reproduce respuestas grabadas en LLM_REPLAY_ARCHIVO (JSONL); si falta una, usa el fake
+#   (o falla si LLM_REPLAY_RESPALDO_FAKE=0).
+# - "grabar": llama a Gemini y graba cada respuesta en LLM_REPLAY_ARCHIVO para reproducirla después.
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+import llm_resilience
+
+# === Configuración (variables de entorno) ===
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+LLM_FAKE_LATENCIA_MS = float(os.getenv("LLM_FAKE_LATENCIA_MS", "300")) # Latencia media por llamada (±50%)
+LLM_FAKE_TASA_ERROR = float(os.getenv("LLM_FAKE_TASA_ERROR", "0")) # Probabilidad 0-1 de fallo por llamada
+LLM_FAKE_TIPO_ERROR = os.getenv("LLM_FAKE_TIPO_ERROR", "cuota") # cuota | transitorio | seguridad | invalida
+LLM_FAKE_SEMILLA = int(os.getenv("LLM_FAKE_SEMILLA", "42")) # Semilla de latencias y fallos (reproducibles)
+LLM_FAKE_RESPUESTAS = os.getenv("LLM_FAKE_RESPUESTAS", "") # JSON opcional: [{"contiene": "...", "respuesta": "..."}]
+LLM_REPLAY_ARCHIVO = os.getenv("LLM_REPLAY_ARCHIVO", "llm_replay.jsonl")
+LLM_REPLAY_RESPALDO_FAKE = os.getenv("LLM_REPLAY_RESPALDO_FAKE", "1") == "1"
+
+TAMANO_TROZO_STREAM = 40 # Caracteres por fragmento en los streams simulados
+
+
+class LLMBackend:
+    """
+    Interfaz de un backend. generate() retorna (texto, tokens consumidos o None).
+    Las implementaciones por defecto de la versión asíncrona y de los streams se apoyan en generate().
+    """
+    nombre = 'base'
+
+    def generate(self, model_name: str, prompt, generation_config: Optional[Dict[str, Any]]) -> Tuple[str, Optional[int]]:
+        raise NotImplementedError
+
+    async def agenerate(self, model_name: str, prompt, generation_config: Optional[Dict[str, Any]]) -> Tuple[str, Optional[int]]:
+        return await asyncio.to_thread(self.generate, model_name, prompt, generation_config)
+
+    def generate_stream(self, model_name: str, prompt, generation_config: Optional[Dict[str, Any]]) -> Iterator[str]:
+        texto, _ = self.generate(model_name, prompt, generation_config)
+        for inicio in range(0, len(texto), TAMANO_TROZO_STREAM):
+            yield texto[inicio:inicio + TAMANO_TROZO_STREAM]
+
+    async def agenerate_stream(self, model_name: str, prompt, generation_config: Optional[Dict[str, Any]]) -> AsyncIterator[str]:
+        texto, _ = await self.agenerate(model_name, prompt, generation_config)
+        for inicio in range(0, len(texto), TAMANO_TROZO_STREAM):
+            yield texto[inicio:inicio + TAMANO_TROZO_STREAM]
+
+
+# === Gemini ===
+
+def _texto_de_chunk(chunk) -> str:
+    """Texto de un fragmento del stream ('' si el fragmento no trae texto, p. ej. solo metadatos)."""
+    try:
+        return chunk.text
+    except ValueError:
+        return ''
+
+
+def _tokens_reales(response) -> Optional[int]:
+    """Tokens consumidos según la respuesta (usage_metadata), o None si no los indica."""
+    uso = getattr(response, 'usage_metadata', None)
+    return getattr(uso, 'total_token_count', None) or None
+
+
+def _esquema_para_sdk(esquema: Dict[str, Any], campos_sdk: frozenset) -> Dict[str, Any]:
+    """
+    Adapta un response_schema a los campos que entiende la versión instalada del SDK de Gemini
+    (las antiguas rechazan 'minimum'/'maximum'). Los límites que el SDK no admite pasan a la
+    descripción para que el modelo siga respetando el rango; el resto de campos desconocidos se omite.
+    """
+    adaptado = {}
+    limites = []
+    for clave, valor in esquema.items():
+        if clave in ('minimum', 'maximum') and clave not in campos_sdk:
+            limites.append(f"{'mínimo' if clave == 'minimum' else 'máximo'} {valor}")
+        elif clave not in campos_sdk:
+            continue
+        elif clave == 'items':
+            adaptado[clave] = _esquema_para_sdk(valor, campos_sdk)
+        elif clave == 'properties':
+            adaptado[clave] = {nombre: _esquema_para_sdk(propiedad, campos_sdk) for nombre, propiedad in valor.items()}
+        else:
+            adaptado[clave] = valor
+    if limites:
+        adaptado['description'] = " ".join(filter(None, [adaptado.get('description'), f"({', '.join(limites)})"]))
+    return adaptado
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini con handles de modelo cacheados. El SDK se carga en la primera llamada."""
+    nombre = 'gemini'
+
+    def __init__(self, api_key: Optional[str] = None):
+        self._api_key = api_key
+        self._genai = None
+        self._modelos = {}
+        self._lock = threading.Lock()
+        self._campos_esquema = None
+
+    def _sdk(self):
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai # Import diferido: tarda ~0.7 s
+                    # Configurar la API de Gemini con la clave de entorno
+                    genai.configure(api_key=self._api_key or os.getenv("GEMINI_API_KEY"))
+                    self._genai = genai
+        return self._genai
+
+    def get_model(self, model_name: str):
+        """Retorna el handle cacheado del modelo, creándolo la primera vez."""
+        modelo = self._modelos.get(model_name)
+        if modelo is None:
+            genai = self._sdk()
+            with self._lock:
+                modelo = self._modelos.get(model_name)
+                if modelo is None:
+                    modelo = self._modelos[model_name] = genai.GenerativeModel(model_name)
+        return modelo
+
+    def _config_sdk(self, generation_config):
+        """generation_config con el response_schema adaptado a los campos de Schema del SDK instalado."""
+        if not generation_config or 'response_schema' not in generation_config:
+            return generation_config
+        if self._campos_esquema is None:
+            campos = self._sdk().protos.Schema.pb().DESCRIPTOR.fields
+            self._campos_esquema = frozenset(campo.name.rstrip('_') for campo in campos) # type_ -> type
+        return {**generation_config, 'response_schema': _esquema_para_sdk(generation_config['response_schema'], self._campos_esquema)}
+
+    def generate(self, model_name, prompt, generation_config):
+        response = self.get_model(model_name).generate_content(prompt, generation_config=self._config_sdk(generation_config))
+        return response.text, _tokens_reales(response)
+
+    async def agenerate(self, model_name, prompt, generation_config):
+        response = await self.get_model(model_name).generate_content_async(prompt, generation_config=self._config_sdk(generation_config))
+        return response.text, _tokens_reales(response)
+
+    def generate_stream(self, model_name, prompt, generation_config):
+        generation_config = self._config_sdk(generation_config)
+        for chunk in self.get_model(model_name).generate_content(prompt, generation_config=generation_config, stream=True):
+            texto = _texto_de_chunk(chunk)
+            if texto:
+                yield texto
+
+    async def agenerate_stream(self, model_name, prompt, generation_config):
+        response = await self.get_model(model_name).generate_content_async(
+            prompt, generation_config=self._config_sdk(generation_config), stream=True
+        )
+        async for chunk in response:
+            texto = _texto_de_chunk(chunk)
+            if texto:
+                yield texto
+
+
+# === Fake determinista ===
+
+_ERRORES_SIMULADOS = {
+    'cuota': llm_resilience.LLMQuotaError,
+    'transitorio': llm_resilience.LLMTransientError,
+    'seguridad': llm_resilience.LLMSafetyError,
+    'invalida': llm_resilience.LLMInvalidRequestError,
+}
+_RE_ARTICULO_LOTE = re.compile(r"\[ARTÍCULO \d+\]")
+
+
+def _semilla(prompt) -> int:
+    return int(hashlib.sha256(str(prompt).encode('utf-8')).hexdigest()[:12], 16)
+
+
+def _valor_para_esquema(esquema: Dict[str, Any], semilla: int, prompt: str, campo: str = '') -> Any:
+    """Valor determinista conforme al esquema (subconjunto de OpenAPI que usa response_parser.esquema_gemini)."""
+    tipo = str(esquema.get('type', 'string')).lower()
+    if tipo == 'object':
+        return {
+            nombre: _valor_para_esquema(propiedad, semilla + posicion, prompt, nombre)
+            for posicion, (nombre, propiedad) in enumerate(esquema.get('properties', {}).items())
+        }
+    if tipo == 'array':
+        items = esquema.get('items', {'type': 'string'})
+        if 'indice' in items.get('properties', {}):
+            # Análisis por lotes: un elemento por cada [ARTÍCULO N] del prompt
+            num = len(_RE_ARTICULO_LOTE.findall(prompt)) or 1
+            return [{**_valor_para_esquema(items, semilla + i * 13, prompt), 'indice': i + 1} for i in range(num)]
+        return [_valor_para_esquema(items, semilla + i, prompt, campo) for i in range(3 + semilla % 3)]
+    if tipo == 'integer':
+        # Scores entre 4 y 10 para que las pruebas de carga tengan fuentes que superen los umbrales habituales
+        if campo == 'score':
+            return 4 + semilla % 7
+        minimo, maximo = esquema.get('minimum', 0), esquema.get('maximum', 99)
+        return int(minimo + semilla % (maximo - minimo + 1))
+    if tipo == 'number':
+        return round((semilla % 1000) / 100, 2)
+    if tipo == 'boolean':
+        return semilla % 2 == 0
+    if campo == 'body':
+        parrafos = [f"Párrafo simulado {i + 1} ({semilla % 10000}). " + "Contenido de prueba generado localmente. " * 8 for i in range(6)]
+        return "## Introducción\n\n" + "\n\n".join(parrafos)
+    return f"{campo or 'texto'} simulado {semilla % 10000}"
+
+
+class FakeBackend(LLMBackend):
+    """
+    Backend local y determinista para pruebas: sin red, sin clave y sin cuota.
+    La respuesta depende solo del prompt y del esquema; la latencia y los fallos, de la semilla.
+    """
+    nombre = 'fake'
+
+    def __init__(self, latencia_ms: float = LLM_FAKE_LATENCIA_MS, tasa_error: float = LLM_FAKE_TASA_ERROR,
+                 tipo_error: str = LLM_FAKE_TIPO_ERROR, semilla: int = LLM_FAKE_SEMILLA,
+                 archivo_respuestas: str = LLM_FAKE_RESPUESTAS):
+        self.latencia_ms = latencia_ms
+        self.tasa_error = tasa_error
+        self.tipo_error = _ERRORES_SIMULADOS.get(tipo_error, llm_resilience.LLMQuotaError)
+        self._aleatorio = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._respuestas = []
+        if archivo_respuestas:
+            with open(archivo_respuestas, 'r', encoding='utf-8') as f:
+                self._respuestas = json.load(f)
+        self.llamadas = 0
+
+    def _sortear(self, model_name: str) -> float:
+        """Latencia de esta llamada (segundos); lanza el error simulado si toca."""
+        with self._lock:
+            self.llamadas += 1
+            latencia = self.latencia_ms / 1000 * self._aleatorio.uniform(0.5, 1.5)
+            falla = self._aleatorio.random() < self.tasa_error
+        if falla:
+            raise self.tipo_error(f"Fallo simulado ({self.tipo_error.tipo}) del backend fake", model_name, retry_after=None)
+        return latencia
+
+    def _respuesta(self, prompt, generation_config) -> str:
+        prompt = str(prompt)
+        for regla in self._respuestas:
+            if regla.get('contiene', '') in prompt:
+                return regla['respuesta']
+        esquema = (generation_config or {}).get('response_schema')
+        if esquema:
+            return json.dumps(_valor_para_esquema(esquema, _semilla(prompt), prompt), ensure_ascii=False)
+        return f"Respuesta simulada {_semilla(prompt) % 10000}.\n\n- Sugerencia de prueba 1\n- Sugerencia de prueba 2"
+
+    def generate(self, model_name, prompt, generation_config):
+        latencia = self._sortear(model_name)
+        time.sleep(latencia)
+        return self._respuesta(prompt, generation_config), None
+
+    async def agenerate(self, model_name, prompt, generation_config):
+        latencia = self._sortear(model_name)
+        await asyncio.sleep(latencia)
+        return self._respuesta(prompt, generation_config), None
+
+
+# === Grabación y reproducción ===
+
+def _clave_replay(model_name: str, prompt, generation_config) -> str:
+    configuracion = json.dumps(generation_config or {}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{model_name}\x00{configuracion}\x00{prompt}".encode('utf-8')).hexdigest()
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Reproduce respuestas grabadas (JSONL con 'clave', 'modelo' y 'respuesta').
+    Con `real` (modo grabación) llama al backend real y añade cada respuesta nueva al archivo.
+    Con `respaldo`, las respuestas no grabadas se piden a ese backend (normalmente el fake).
+    """
+    nombre = 'replay'
+
+    def __init__(self, archivo: str = LLM_REPLAY_ARCHIVO, real: Optional[LLMBackend] = None,
+                 respaldo: Optional[LLMBackend] = None):
+        self.archivo = archivo
+        self.real = real
+        self.respaldo = respaldo
+        self._lock = threading.Lock()
+        self._grabadas: Dict[str, str] = {}
+        if os.path.exists(archivo):
+            with open(archivo, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    if linea.strip():
+                        registro = json.loads(linea)
+                        self._grabadas[registro['clave']] = registro['respuesta']
+        print(f"📼 LLM: Backend replay con {len(self._grabadas)} respuestas grabadas en '{archivo}'"
+              f"{' (grabando)' if real else ''}.")
+
+    def _grabar(self, clave: str, model_name: str, respuesta: str):
+        with self._lock:
+            self._grabadas[clave] = respuesta
+            with open(self.archivo, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'clave': clave, 'modelo': model_name, 'respuesta': respuesta}, ensure_ascii=False) + "\n")
+
+    def generate(self, model_name, prompt, generation_config):
+        clave = _clave_replay(model_name, prompt, generation_config)
+        grabada = self._grabadas.get(clave)
+        if grabada is not None:
+            return grabada, None
+        if self.real is not None:
+            texto, tokens = self.real.generate(model_name, prompt, generation_config)
+            self._grabar(clave, model_name, texto)
+            return texto, tokens
+        if self.respaldo is not None:
+            return self.respaldo.generate(model_name, prompt, generation_config)
+        raise llm_resilience.LLMInvalidRequestError("Respuesta no grabada para este prompt (backend replay)", model_name)
+
+    async def agenerate(self, model_name, prompt, generation_config):
+        clave = _clave_replay(model_name, prompt, generation_config)
+        grabada = self._grabadas.get(clave)
+        if grabada is not None:
+            return grabada, None
+        if self.real is not None:
+            texto, tokens = await self.real.agenerate(model_name, prompt, generation_config)
+            await asyncio.to_thread(self._grabar, clave, model_name, texto)
+            return texto, tokens
+        if self.respaldo is not None:
+            return await self.respaldo.agenerate(model_name, prompt, generation_config)
+        raise llm_resilience.LLMInvalidRequestError("Respuesta no grabada para este prompt (backend replay)", model_name)
+
+
+def crear_backend(nombre: str = LLM_BACKEND) -> LLMBackend:
+    """Crea el backend configurado en LLM_BACKEND (gemini, fake, replay o grabar)."""
+    if nombre == 'fake':
+        print(f"🧪 LLM: Usando el backend fake (latencia {LLM_FAKE_LATENCIA_MS:.0f} ms, tasa de error {LLM_FAKE_TASA_ERROR}).")
+        return FakeBackend()
+    if nombre == 'replay':
+        return ReplayBackend(respaldo=FakeBackend() if LLM_REPLAY_RESPALDO_FAKE else None)
+    if nombre == 'grabar':
+        return ReplayBackend(real=GeminiBackend())
+    if nombre != 'gemini':
+        print(f"⚠️ LLM: LLM_BACKEND='{nombre}' desconocido. Usando Gemini.")
+    return GeminiBackend()
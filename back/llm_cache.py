@@ -0,0 +1,108 @@
+# llm_cache.py
+# Caché en disco de respuestas del LLM para llamadas deterministas (análisis de fuentes, sugerencias).
+# - Clave: hash SHA-256 de (nombre del modelo + prompt).
+# - Respuestas comprimidas con zlib en un archivo SQLite propio (separado de la DB principal).
+# - Expulsión por TTL y por tamaño total (LRU por último acceso).
+# - Contadores de aciertos/fallos y de caracteres de prompt que no se enviaron a la API.
+
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+import sqlite_cache
+
+# === Configuración (variables de entorno) ===
+LLM_CACHE_DB_PATH = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+LLM_CACHE_HABILITADA = os.getenv("LLM_CACHE_HABILITADA", "1") == "1"
+LLM_CACHE_TTL_SEG = int(os.getenv("LLM_CACHE_TTL_SEG", str(7 * 24 * 3600))) # Expulsar respuestas con más de 7 días
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "50")) # Tamaño máximo (comprimido) de la caché
+LLM_CACHE_EXPULSAR_CADA = 50 # Ejecutar la expulsión cada N escrituras
+
+_stats = {'aciertos': 0, 'fallos': 0, 'guardadas': 0, 'expulsadas': 0, 'caracteres_prompt_ahorrados': 0}
+
+_cache = sqlite_cache.CacheSQLite(
+    "LLMCache", lambda: LLM_CACHE_DB_PATH, "respuestas", '''
+        CREATE TABLE IF NOT EXISTS respuestas (
+            clave TEXT PRIMARY KEY,
+            modelo TEXT NOT NULL,
+            respuesta BLOB NOT NULL, -- Texto de la respuesta comprimido (zlib)
+            tamano INTEGER NOT NULL DEFAULT 0, -- Bytes comprimidos
+            fecha_creacion REAL NOT NULL,
+            ultimo_acceso REAL NOT NULL
+        )
+    ''', columna_ttl="fecha_creacion", expulsar_cada=LLM_CACHE_EXPULSAR_CADA)
+
+
+def _clave(model_name: str, prompt: str) -> str:
+    """Clave de la caché: hash SHA-256 del modelo y el prompt."""
+    return hashlib.sha256(f"{model_name}\x00{prompt}".encode('utf-8')).hexdigest()
+
+
+def obtener(model_name: str, prompt: str) -> Optional[str]:
+    """Retorna la respuesta cacheada para (modelo, prompt), o None si no existe, caducó o la caché está deshabilitada."""
+    if not LLM_CACHE_HABILITADA:
+        return None
+    clave = _clave(model_name, prompt)
+    ahora = time.time()
+    try:
+        with _cache.lock:
+            conn = _cache.conexion()
+            row = conn.execute(
+                'SELECT respuesta FROM respuestas WHERE clave = ? AND fecha_creacion >= ?',
+                (clave, ahora - LLM_CACHE_TTL_SEG)
+            ).fetchone()
+            if row is None:
+                _stats['fallos'] += 1
+                return None
+            conn.execute('UPDATE respuestas SET ultimo_acceso = ? WHERE clave = ?', (ahora, clave))
+            conn.commit()
+            _stats['aciertos'] += 1
+            _stats['caracteres_prompt_ahorrados'] += len(prompt)
+    except sqlite3.Error as e:
+        print(f"⚠️ LLMCache: Error leyendo caché: {str(e)}")
+        return None
+    return zlib.decompress(row[0]).decode('utf-8')
+
+
+def guardar(model_name: str, prompt: str, respuesta: str):
+    """Guarda (o reemplaza) la respuesta del LLM para (modelo, prompt), comprimida."""
+    if not LLM_CACHE_HABILITADA or not respuesta:
+        return
+    blob = zlib.compress(respuesta.encode('utf-8'), 6)
+    ahora = time.time()
+    try:
+        with _cache.lock:
+            conn = _cache.conexion()
+            conn.execute('''
+                INSERT OR REPLACE INTO respuestas (clave, modelo, respuesta, tamano, fecha_creacion, ultimo_acceso)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (_clave(model_name, prompt), model_name, blob, len(blob), ahora, ahora))
+            conn.commit()
+            _stats['guardadas'] += 1
+            debe_expulsar = _cache.registrar_escritura()
+    except sqlite3.Error as e:
+        print(f"⚠️ LLMCache: Error guardando respuesta: {str(e)}")
+        return
+    if debe_expulsar:
+        expulsar()
+
+
+def expulsar():
+    """Elimina respuestas caducadas (TTL) y, si la caché supera LLM_CACHE_MAX_MB, las menos usadas recientemente."""
+    if not LLM_CACHE_HABILITADA:
+        return
+    expulsadas = _cache.expulsar(LLM_CACHE_TTL_SEG, LLM_CACHE_MAX_MB)
+    with _cache.lock:
+        _stats['expulsadas'] += expulsadas
+
+
+def estadisticas() -> Dict[str, Any]:
+    """Contadores del proceso y tasa de acierto (aciertos sobre el total de consultas)."""
+    with _cache.lock:
+        stats = dict(_stats)
+    consultas = stats['aciertos'] + stats['fallos']
+    stats['tasa_acierto'] = round(stats['aciertos'] / consultas, 3) if consultas else 0.0
+    return stats
@@ -1,24 +1,238 @@
 # llm_client.py
+# Cliente LLM compartido del proceso.
+# - Backend intercambiable (llm_backends, LLM_BACKEND): Gemini por defecto (SDK cargado en la primera llamada,
+#   con los handles de modelo cacheados), o un backend local determinista / de reproducción para pruebas sin red.
+# - API síncrona (generate) y asíncrona nativa (agenerate, usa generate_content_async),
+#   más variantes en streaming (generate_stream / agenerate_stream).
+# - Un único semáforo global limita las llamadas simultáneas al LLM (síncronas + asíncronas),
+#   para que pipeline, analyzer y copilot se solapen sin acaparar la cuota ni bloquear otras peticiones.
+# - Caché de respuestas (llm_cache) para prompts repetidos; se desactiva por llamada con use_cache=False.
+# - Salida estructurada: con response_schema se pide a Gemini JSON (response_mime_type) conforme al esquema.
+# - Resiliencia (llm_resilience): errores clasificados, reintentos con backoff, circuit breaker por modelo
+#   y conmutación al modelo de respaldo (GEMINI_FALLBACK_MODEL). Las llamadas fallidas lanzan LLMError.
+# - Ritmo (llm_limiter): token bucket de peticiones y tokens por minuto por modelo, con prioridades
+#   (interactiva > normal > fondo) tanto en la cuota como en el semáforo de concurrencia. Sin cupo, se espera en cola.
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager, contextmanager
 
-import google.generativeai as genai
+import llm_backends
+import llm_cache
+import llm_limiter
+import llm_resilience
 from dotenv import load_dotenv
+from llm_limiter import PRIORIDAD_FONDO, PRIORIDAD_INTERACTIVA, PRIORIDAD_NORMAL
+from llm_resilience import (LLMCircuitOpenError, LLMError, LLMInvalidRequestError, LLMQuotaError, LLMSafetyError,
+                            LLMTransientError)
 
 load_dotenv()
-# Configurar la API de Gemini con la clave de entorno
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-def generate_raw_content(prompt, model_name="gemini-2.0-flash-lite-preview-02-05"):
+# === Configuración (variables de entorno) ===
+DEFAULT_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-lite-preview-02-05")
+FALLBACK_MODEL_NAME = os.getenv("GEMINI_FALLBACK_MODEL", "") # Vacío: sin modelo de respaldo
+LLM_MAX_CONCURRENCIA = int(os.getenv("LLM_MAX_CONCURRENCIA", "4")) # Llamadas simultáneas al LLM en todo el proceso
+CARACTERES_POR_TOKEN = 4 # Aproximación para texto en español/inglés con los tokenizadores de Gemini
+LLM_SALIDA_ESTRUCTURADA = os.getenv("LLM_SALIDA_ESTRUCTURADA", "1") == "1" # "0" ignora response_schema (modelos sin soporte)
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación rápida (sin llamar a la API) del número de tokens de un texto."""
+    return (len(texto) + CARACTERES_POR_TOKEN - 1) // CARACTERES_POR_TOKEN
+
+
+def _generation_config(response_schema):
+    """generation_config de Gemini para pedir JSON conforme a response_schema (None si no aplica)."""
+    if response_schema is None or not LLM_SALIDA_ESTRUCTURADA:
+        return None
+    return {'response_mime_type': 'application/json', 'response_schema': response_schema}
+
+
+def _clave_cache_modelo(model_name: str, generation_config) -> str:
+    """Las respuestas en modo JSON se cachean aparte de las de texto libre para el mismo prompt."""
+    return f"{model_name}|json" if generation_config else model_name
+
+
+def _tokens_estimados(prompt) -> int:
+    """Tokens que se reservan en el limitador antes de la llamada (entrada + salida estimada)."""
+    return estimar_tokens(prompt if isinstance(prompt, str) else str(prompt)) + llm_limiter.LLM_TOKENS_SALIDA_ESTIMADOS
+
+
+class LLMClient:
+    """
+    Cliente LLM con concurrencia acotada sobre un backend (llm_backends.LLMBackend).
+    Seguro para uso concurrente desde varios hilos y desde el event loop de FastAPI.
+    """
+
+    def __init__(self, default_model=DEFAULT_MODEL_NAME, max_concurrencia=LLM_MAX_CONCURRENCIA,
+                 fallback_model=FALLBACK_MODEL_NAME, backend=None):
+        self.default_model = default_model
+        self.fallback_model = fallback_model or None
+        self.max_concurrencia = max(1, max_concurrencia)
+        # Backend configurado en LLM_BACKEND si no se pasa uno (p. ej. llm_backends.FakeBackend() en pruebas)
+        self.backend = backend or llm_backends.crear_backend()
+        # Semáforo de hilos (no asyncio) con prioridades: lo comparten las llamadas síncronas y las asíncronas
+        self._semaforo = llm_limiter.SemaforoPrioridad(self.max_concurrencia)
+
+    def _modelos_a_intentar(self, model_name):
+        """El modelo pedido y, si está configurado y es distinto, el de respaldo."""
+        if self.fallback_model and self.fallback_model != model_name:
+            return [model_name, self.fallback_model]
+        return [model_name]
+
+    @contextmanager
+    def _turno(self, model_name, tokens, prioridad):
+        """
+        Espera cupo de ritmo del modelo y de concurrencia (por prioridad); libera la concurrencia al salir.
+        Entrega los tokens descontados del limitador (para ajustar_tokens()).
+        """
+        consumidos = llm_limiter.limitador(model_name).adquirir(tokens, prioridad)
+        self._semaforo.acquire(prioridad)
+        try:
+            yield consumidos
+        finally:
+            self._semaforo.release()
+
+    @asynccontextmanager
+    async def _aturno(self, model_name, tokens, prioridad):
+        """Versión asíncrona de _turno(): no bloquea el event loop mientras espera."""
+        consumidos = await llm_limiter.limitador(model_name).aadquirir(tokens, prioridad)
+        await self._semaforo.aacquire(prioridad)
+        try:
+            yield consumidos
+        finally:
+            self._semaforo.release()
+
+    def generate(self, prompt, model_name=None, use_cache=True, response_schema=None, prioridad=PRIORIDAD_NORMAL) -> str:
+        """
+        Genera contenido (bloqueante). Retorna el texto de la respuesta; relanza las excepciones de la API.
+        Con use_cache=True un prompt ya respondido por el mismo modelo se sirve desde llm_cache sin llamar a la API.
+        Con response_schema (dict, ver response_parser.esquema_gemini) la respuesta es JSON conforme al esquema.
+        Reintenta los errores de cuota/transitorios y conmuta al modelo de respaldo; si todo falla lanza LLMError.
+        prioridad (llm_limiter.PRIORIDAD_*) decide el orden cuando hay que esperar cupo.
+        """
+        model_name = model_name or self.default_model
+        generation_config = _generation_config(response_schema)
+        clave_modelo = _clave_cache_modelo(model_name, generation_config)
+        cacheable = use_cache and isinstance(prompt, str)
+        if cacheable:
+            cacheada = llm_cache.obtener(clave_modelo, prompt)
+            if cacheada is not None:
+                return cacheada
+        tokens = _tokens_estimados(prompt)
+        plan = llm_resilience.PlanDeIntentos(self._modelos_a_intentar(model_name))
+        for nombre in plan:
+            try:
+                with self._turno(nombre, tokens, prioridad) as consumidos:
+                    texto, tokens_reales = self.backend.generate(nombre, prompt, generation_config)
+            except Exception as e:
+                # Esperar fuera del semáforo para no bloquear el cupo a otras llamadas
+                time.sleep(plan.fallo(e))
+                continue
+            plan.exito()
+            llm_limiter.limitador(nombre).ajustar_tokens(consumidos, tokens_reales)
+            if cacheable:
+                llm_cache.guardar(clave_modelo, prompt, texto)
+            return texto
+        raise plan.error_final()
+
+    async def agenerate(self, prompt, model_name=None, use_cache=True, response_schema=None, prioridad=PRIORIDAD_NORMAL) -> str:
+        """Versión asíncrona de generate(): no bloquea el event loop mientras espera a Gemini."""
+        model_name = model_name or self.default_model
+        generation_config = _generation_config(response_schema)
+        clave_modelo = _clave_cache_modelo(model_name, generation_config)
+        cacheable = use_cache and isinstance(prompt, str)
+        if cacheable:
+            cacheada = await asyncio.to_thread(llm_cache.obtener, clave_modelo, prompt)
+            if cacheada is not None:
+                return cacheada
+        tokens = _tokens_estimados(prompt)
+        plan = llm_resilience.PlanDeIntentos(self._modelos_a_intentar(model_name))
+        for nombre in plan:
+            try:
+                async with self._aturno(nombre, tokens, prioridad) as consumidos:
+                    texto, tokens_reales = await self.backend.agenerate(nombre, prompt, generation_config)
+            except Exception as e:
+                await asyncio.sleep(plan.fallo(e))
+                continue
+            plan.exito()
+            llm_limiter.limitador(nombre).ajustar_tokens(consumidos, tokens_reales)
+            if cacheable:
+                await asyncio.to_thread(llm_cache.guardar, clave_modelo, prompt, texto)
+            return texto
+        raise plan.error_final()
+
+    def generate_stream(self, prompt, model_name=None, response_schema=None, prioridad=PRIORIDAD_NORMAL):
+        """
+        Generador síncrono con los fragmentos de texto de la respuesta a medida que Gemini los produce.
+        Sin caché. El cupo del semáforo se mantiene mientras dura el stream.
+        Solo se reintenta (o se conmuta de modelo) si el error llega antes del primer fragmento.
+        """
+        tokens = _tokens_estimados(prompt)
+        plan = llm_resilience.PlanDeIntentos(self._modelos_a_intentar(model_name or self.default_model))
+        for nombre in plan:
+            emitido = False
+            try:
+                with self._turno(nombre, tokens, prioridad):
+                    for texto in self.backend.generate_stream(nombre, prompt, _generation_config(response_schema)):
+                        emitido = True
+                        yield texto
+            except Exception as e:
+                if emitido:
+                    raise llm_resilience.clasificar_error(e, nombre) from e
+                time.sleep(plan.fallo(e))
+                continue
+            plan.exito()
+            return
+        raise plan.error_final()
+
+    async def agenerate_stream(self, prompt, model_name=None, response_schema=None, prioridad=PRIORIDAD_NORMAL):
+        """Versión asíncrona de generate_stream() (async generator)."""
+        tokens = _tokens_estimados(prompt)
+        plan = llm_resilience.PlanDeIntentos(self._modelos_a_intentar(model_name or self.default_model))
+        for nombre in plan:
+            emitido = False
+            try:
+                async with self._aturno(nombre, tokens, prioridad):
+                    async for texto in self.backend.agenerate_stream(nombre, prompt, _generation_config(response_schema)):
+                        emitido = True
+                        yield texto
+            except Exception as e:
+                if emitido:
+                    raise llm_resilience.clasificar_error(e, nombre) from e
+                await asyncio.sleep(plan.fallo(e))
+                continue
+            plan.exito()
+            return
+        raise plan.error_final()
+
+
+# Cliente compartido del proceso
+client = LLMClient()
+
+
+def generate_raw_content(prompt, model_name=None, use_cache=True, response_schema=None, prioridad=PRIORIDAD_NORMAL):
     """
     Genera contenido crudo usando el modelo Gemini.
-    Esta función es un wrapper simple de la llamada generate_content.
-    No maneja prompts específicos ni parsing de resultados.
+    Esta función es un wrapper simple sobre el cliente compartido.
+    No maneja prompts específicos ni parsing de resultados (ver response_parser).
+    use_cache=False fuerza una llamada nueva (generación/reescritura, donde se espera una respuesta distinta).
+    response_schema pide la respuesta en JSON conforme al esquema.
+    prioridad: PRIORIDAD_INTERACTIVA (copilot), PRIORIDAD_NORMAL (generación) o PRIORIDAD_FONDO (análisis de fuentes).
     """
-    try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        # Devuelve solo el texto, como en el código original
-        return response.text
-    except Exception as e:
-        # Relanzar la excepción para que el llamador la maneje
-        raise e
+    # Relanza las excepciones para que el llamador las maneje
+    return client.generate(prompt, model_name=model_name, use_cache=use_cache, response_schema=response_schema,
+                           prioridad=prioridad)
+
+
+async def agenerate_raw_content(prompt, model_name=None, use_cache=True, response_schema=None, prioridad=PRIORIDAD_NORMAL):
+    """Versión asíncrona de generate_raw_content()."""
+    return await client.agenerate(prompt, model_name=model_name, use_cache=use_cache, response_schema=response_schema,
+                                  prioridad=prioridad)
+
+
+async def agenerate_raw_content_stream(prompt, model_name=None, response_schema=None, prioridad=PRIORIDAD_NORMAL):
+    """Async generator con los fragmentos de texto de la respuesta (streaming, sin caché)."""
+    async for texto in client.agenerate_stream(prompt, model_name=model_name, response_schema=response_schema,
+                                               prioridad=prioridad):
+        yield texto
@@ -0,0 +1,274 @@
+# llm_limiter.py
+# Limitación de ritmo de las llamadas al LLM en el cliente (la usa llm_client), para no llegar a los 429.
+# - Token bucket por modelo con dos cubos: peticiones por minuto (RPM) y tokens por minuto (TPM).
+#   La ráfaga (capacidad) más lo que se recarga en un minuto nunca supera el límite, de modo que
+#   ninguna ventana de 60 s excede la cuota.
+# - Clases de prioridad: las llamadas interactivas (copilot, Canvas) pasan por delante de la
+#   generación normal y esta por delante del análisis de fuentes en segundo plano.
+# - Si no hay cupo, la llamada espera en cola (por prioridad y orden de llegada) en lugar de fallar.
+# - SemaforoPrioridad: el límite de llamadas simultáneas también respeta las prioridades.
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# === Prioridades (menor = antes) ===
+PRIORIDAD_INTERACTIVA = 0 # Copilot / Canvas: el usuario está esperando
+PRIORIDAD_NORMAL = 1 # Generación de artículos
+PRIORIDAD_FONDO = 2 # Análisis de fuentes del scraper
+
+# === Configuración (variables de entorno) ===
+LLM_LIMITE_RPM = int(os.getenv("LLM_LIMITE_RPM", "30")) # Peticiones por minuto por modelo (0 = sin límite)
+LLM_LIMITE_TPM = int(os.getenv("LLM_LIMITE_TPM", "1000000")) # Tokens (entrada + salida) por minuto por modelo (0 = sin límite)
+# Límites por modelo: "modelo:rpm:tpm,otro-modelo:rpm:tpm" (sustituyen a los de arriba para ese modelo)
+LLM_LIMITES_MODELOS = os.getenv("LLM_LIMITES_MODELOS", "")
+LLM_FRACCION_RAFAGA = float(os.getenv("LLM_FRACCION_RAFAGA", "0.1")) # Parte del límite por minuto disponible de golpe
+LLM_TOKENS_SALIDA_ESTIMADOS = int(os.getenv("LLM_TOKENS_SALIDA_ESTIMADOS", "1000")) # Se corrige con el uso real al terminar
+
+
+def _limites_por_modelo() -> Dict[str, Tuple[int, int]]:
+    limites = {}
+    for entrada in LLM_LIMITES_MODELOS.split(","):
+        partes = [p.strip() for p in entrada.rsplit(":", 2)]
+        if len(partes) == 3 and partes[0]:
+            try:
+                limites[partes[0]] = (int(partes[1]), int(partes[2]))
+            except ValueError:
+                print(f"⚠️ LLM: Entrada ignorada en LLM_LIMITES_MODELOS: '{entrada}'")
+    return limites
+
+
+class _ColaPrioridad:
+    """
+    Espera ordenada por (prioridad, llegada): solo la cabeza de la cola intenta consumir,
+    así una llamada de fondo no adelanta a una interactiva que llegó después.
+    Las esperas síncronas duermen en la Condition; las asíncronas, en un asyncio.Event que se
+    despierta desde _notificar() (o al vencer la espera estimada), sin sondear.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._cola = []
+        self._turnos = itertools.count()
+        self._esperas_async: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = {}
+
+    def _notificar(self):
+        """Bajo el lock. Despierta a todas las esperas (hilos y corrutinas) para que la nueva cabeza lo intente."""
+        self._cond.notify_all()
+        for loop, evento in self._esperas_async.values():
+            loop.call_soon_threadsafe(evento.set)
+
+    def _intentar(self, entrada, consumir: Callable[[], Optional[float]]) -> Optional[float]:
+        """Bajo el lock. Retorna 0 si se consumió; si no, segundos estimados de espera (None = indefinido)."""
+        if self._cola[0] is not entrada:
+            return None
+        espera = consumir()
+        if espera == 0:
+            heapq.heappop(self._cola)
+            self._notificar()
+        return espera
+
+    def _retirar(self, entrada):
+        if entrada in self._cola:
+            self._cola.remove(entrada)
+            heapq.heapify(self._cola)
+            self._notificar()
+
+    def _esperar(self, consumir: Callable[[], Optional[float]], prioridad: int):
+        with self._cond:
+            entrada = [prioridad, next(self._turnos)]
+            heapq.heappush(self._cola, entrada)
+            try:
+                while True:
+                    espera = self._intentar(entrada, consumir)
+                    if espera == 0:
+                        return
+                    self._cond.wait(espera)
+            except BaseException:
+                self._retirar(entrada)
+                raise
+
+    async def _aesperar(self, consumir: Callable[[], Optional[float]], prioridad: int):
+        """Como _esperar, sin bloquear el event loop: duerme hasta la espera estimada o hasta que lo despierten."""
+        evento = asyncio.Event()
+        with self._cond:
+            entrada = [prioridad, next(self._turnos)]
+            heapq.heappush(self._cola, entrada)
+            self._esperas_async[entrada[1]] = (asyncio.get_running_loop(), evento)
+        try:
+            while True:
+                with self._cond:
+                    espera = self._intentar(entrada, consumir)
+                    if espera == 0:
+                        return
+                    evento.clear() # Bajo el lock: un aviso posterior no se pierde
+                try:
+                    await asyncio.wait_for(evento.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._cond:
+                self._retirar(entrada)
+            raise
+        finally:
+            with self._cond:
+                self._esperas_async.pop(entrada[1], None)
+
+
+class LimitadorModelo(_ColaPrioridad):
+    """Token bucket de peticiones y de tokens por minuto de un modelo."""
+
+    def __init__(self, modelo: str, rpm: int, tpm: int):
+        super().__init__()
+        self.modelo = modelo
+        self.rpm = rpm
+        self.tpm = tpm
+        # Capacidad + recarga en 60 s = límite por minuto
+        self._capacidad_peticiones = max(1.0, rpm * LLM_FRACCION_RAFAGA) if rpm else 0.0
+        self._capacidad_tokens = max(1.0, tpm * LLM_FRACCION_RAFAGA) if tpm else 0.0
+        self._recarga_peticiones = (rpm - self._capacidad_peticiones) / 60 if rpm else 0.0
+        self._recarga_tokens = (tpm - self._capacidad_tokens) / 60 if tpm else 0.0
+        self._peticiones = self._capacidad_peticiones
+        self._tokens = self._capacidad_tokens
+        self._ultima_recarga = time.monotonic()
+        self.esperas = 0
+        self.segundos_esperados = 0.0
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        transcurrido = ahora - self._ultima_recarga
+        self._ultima_recarga = ahora
+        self._peticiones = min(self._capacidad_peticiones, self._peticiones + transcurrido * self._recarga_peticiones)
+        self._tokens = min(self._capacidad_tokens, self._tokens + transcurrido * self._recarga_tokens)
+
+    def _a_consumir(self, tokens: float) -> float:
+        """Tokens que se descuentan del cubo: una petición mayor que el cubo entero nunca cabría, se limita a su capacidad."""
+        return min(tokens, self._capacidad_tokens) if self.tpm else 0
+
+    def _consumir(self, tokens: float) -> float:
+        """Consume una petición y `tokens` (ya limitados con _a_consumir) si hay cupo (retorna 0); si no, los segundos hasta que lo haya."""
+        self._recargar()
+        espera = 0.0
+        if self.rpm and self._peticiones < 1:
+            espera = max(espera, (1 - self._peticiones) / self._recarga_peticiones if self._recarga_peticiones else 60.0)
+        if self.tpm and self._tokens < tokens:
+            espera = max(espera, (tokens - self._tokens) / self._recarga_tokens if self._recarga_tokens else 60.0)
+        if espera > 0:
+            return espera
+        if self.rpm:
+            self._peticiones -= 1
+        if self.tpm:
+            self._tokens -= tokens
+        return 0
+
+    def adquirir(self, tokens: int, prioridad: int = PRIORIDAD_NORMAL) -> float:
+        """
+        Bloquea hasta que haya cupo para una petición de `tokens` tokens estimados.
+        Retorna los tokens descontados realmente del cubo, que es lo que hay que pasar a ajustar_tokens().
+        """
+        if not self.rpm and not self.tpm:
+            return 0
+        consumidos = self._a_consumir(tokens)
+        inicio = time.monotonic()
+        self._esperar(lambda: self._consumir(consumidos), prioridad)
+        self._registrar_espera(time.monotonic() - inicio)
+        return consumidos
+
+    async def aadquirir(self, tokens: int, prioridad: int = PRIORIDAD_NORMAL) -> float:
+        """Versión asíncrona de adquirir()."""
+        if not self.rpm and not self.tpm:
+            return 0
+        consumidos = self._a_consumir(tokens)
+        inicio = time.monotonic()
+        await self._aesperar(lambda: self._consumir(consumidos), prioridad)
+        self._registrar_espera(time.monotonic() - inicio)
+        return consumidos
+
+    def _registrar_espera(self, segundos: float):
+        if segundos > 0.01:
+            with self._cond:
+                self.esperas += 1
+                self.segundos_esperados += segundos
+
+    def ajustar_tokens(self, consumidos: float, reales: Optional[int]):
+        """
+        Corrige el cubo de tokens con el uso real de la respuesta (usage_metadata).
+        `consumidos` es lo que retornó adquirir(): lo descontado de verdad, no la estimación sin limitar.
+        """
+        if not self.tpm or not reales:
+            return
+        with self._cond:
+            self._tokens = min(self._capacidad_tokens, self._tokens + consumidos - reales)
+            self._notificar()
+
+
+class SemaforoPrioridad(_ColaPrioridad):
+    """Semáforo de llamadas simultáneas que, al liberarse un cupo, se lo da a la llamada de mayor prioridad."""
+
+    def __init__(self, valor: int):
+        super().__init__()
+        self._libres = valor
+
+    def _tomar(self) -> Optional[float]:
+        if self._libres > 0:
+            self._libres -= 1
+            return 0
+        return None
+
+    def acquire(self, prioridad: int = PRIORIDAD_NORMAL):
+        self._esperar(self._tomar, prioridad)
+
+    async def aacquire(self, prioridad: int = PRIORIDAD_NORMAL):
+        await self._aesperar(self._tomar, prioridad)
+
+    def release(self):
+        with self._cond:
+            self._libres += 1
+            self._notificar()
+
+
+_limitadores: Dict[str, LimitadorModelo] = {}
+_limitadores_lock = threading.Lock()
+_LIMITES_MODELOS = _limites_por_modelo()
+
+
+def repartir_limites(partes: int, propias: int = 1):
+    """
+    Deja a este proceso `propias` de las `partes` en que se dividen los límites por minuto configurados
+    (la API y los procesos de `python -m pipeline worker` de la misma máquina comparten la cuota).
+    Llamar al arrancar el proceso, antes de la primera llamada al LLM.
+    """
+    global LLM_LIMITE_RPM, LLM_LIMITE_TPM
+    if propias >= partes:
+        return
+    def repartir(limite: int) -> int:
+        return max(1, limite * propias // partes) if limite else 0
+
+    with _limitadores_lock:
+        LLM_LIMITE_RPM, LLM_LIMITE_TPM = repartir(LLM_LIMITE_RPM), repartir(LLM_LIMITE_TPM)
+        for modelo, (rpm, tpm) in list(_LIMITES_MODELOS.items()):
+            _LIMITES_MODELOS[modelo] = (repartir(rpm), repartir(tpm))
+        _limitadores.clear()
+
+
+def limitador(modelo: str) -> LimitadorModelo:
+    """Limitador compartido del modelo (se crea la primera vez con sus límites configurados)."""
+    with _limitadores_lock:
+        actual = _limitadores.get(modelo)
+        if actual is None:
+            rpm, tpm = _LIMITES_MODELOS.get(modelo, (LLM_LIMITE_RPM, LLM_LIMITE_TPM))
+            actual = _limitadores[modelo] = LimitadorModelo(modelo, rpm, tpm)
+        return actual
+
+
+def estadisticas() -> Dict[str, Dict[str, float]]:
+    """Por modelo: límites, llamadas que tuvieron que esperar y segundos de espera acumulados."""
+    with _limitadores_lock:
+        return {
+            modelo: {'rpm': l.rpm, 'tpm': l.tpm, 'esperas': l.esperas, 'segundos_esperados': round(l.segundos_esperados, 2)}
+            for modelo, l in _limitadores.items()
+        }
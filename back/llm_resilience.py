@@ -0,0 +1,290 @@
+# llm_resilience.py
+# Capa de resiliencia de las llamadas al LLM (la usa llm_client).
+# - Clasifica los errores de la API en cuota (429), transitorio (5xx, timeouts, red),
+#   bloqueo de seguridad, petición inválida y circuito abierto.
+# - Reintentos con backoff exponencial y jitter completo, respetando el retry-after de la API.
+# - Un circuit breaker por modelo: tras varios fallos seguidos de cuota/transitorios deja de llamar
+#   a ese modelo durante un enfriamiento (y después deja pasar una llamada de prueba).
+# - Conmutación al modelo de respaldo (GEMINI_FALLBACK_MODEL en llm_client) cuando el principal
+#   agota los reintentos o tiene el circuito abierto.
+
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# === Configuración (variables de entorno) ===
+LLM_REINTENTOS = int(os.getenv("LLM_REINTENTOS", "3")) # Reintentos por modelo tras el primer intento
+LLM_BACKOFF_BASE_SEG = float(os.getenv("LLM_BACKOFF_BASE_SEG", "1"))
+LLM_BACKOFF_MAX_SEG = float(os.getenv("LLM_BACKOFF_MAX_SEG", "30"))
+LLM_ESPERA_MAX_SEG = float(os.getenv("LLM_ESPERA_MAX_SEG", "60")) # Un retry-after mayor pasa directamente al modelo de respaldo
+LLM_CIRCUITO_UMBRAL_FALLOS = int(os.getenv("LLM_CIRCUITO_UMBRAL_FALLOS", "5")) # Fallos seguidos que abren el circuito
+LLM_CIRCUITO_ENFRIAMIENTO_SEG = float(os.getenv("LLM_CIRCUITO_ENFRIAMIENTO_SEG", "30"))
+
+
+# === Errores clasificados ===
+
+class LLMError(Exception):
+    """Error de una llamada al LLM ya clasificado."""
+    reintentable = False
+    tipo = 'desconocido'
+
+    def __init__(self, mensaje: str, modelo: Optional[str] = None, retry_after: Optional[float] = None):
+        super().__init__(mensaje)
+        self.modelo = modelo
+        self.retry_after = retry_after
+
+
+class LLMQuotaError(LLMError):
+    """Cuota o límite de peticiones agotado (429 / RESOURCE_EXHAUSTED)."""
+    reintentable = True
+    tipo = 'cuota'
+
+
+class LLMTransientError(LLMError):
+    """Error temporal del servicio o de red (5xx, timeouts, conexión)."""
+    reintentable = True
+    tipo = 'transitorio'
+
+
+class LLMSafetyError(LLMError):
+    """El prompt o la respuesta fueron bloqueados (seguridad, recitación) o la respuesta no trae texto."""
+    tipo = 'seguridad'
+
+
+class LLMInvalidRequestError(LLMError):
+    """Petición inválida (argumentos, clave de API, modelo inexistente). Reintentar no sirve."""
+    tipo = 'invalida'
+
+
+class LLMCircuitOpenError(LLMError):
+    """El circuito del modelo está abierto: no se llama a la API hasta que pase el enfriamiento."""
+    tipo = 'circuito_abierto'
+
+
+@lru_cache(maxsize=None)
+def _tipos_de_error():
+    """
+    (cuota, transitorios, seguridad, inválidos): clases de excepción de cada categoría.
+    Se importan del SDK de Google en el primer error (no al importar el módulo); sin el SDK
+    (backends locales de llm_backends) solo se clasifican las excepciones estándar.
+    """
+    try:
+        from google.api_core import exceptions as google_exceptions
+        from google.generativeai.types import generation_types
+    except ImportError:
+        return (), (ConnectionError, TimeoutError), (ValueError,), ()
+    cuota = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+    transitorios = (
+        google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError, google_exceptions.BadGateway,
+        google_exceptions.GatewayTimeout, google_exceptions.DeadlineExceeded, google_exceptions.Aborted,
+        google_exceptions.Unknown, google_exceptions.RetryError, generation_types.BrokenResponseError,
+        generation_types.IncompleteIterationError, ConnectionError, TimeoutError,
+    )
+    seguridad = (generation_types.BlockedPromptException, generation_types.StopCandidateException, ValueError)
+    invalidos = (google_exceptions.ClientError,) # 400, 401, 403, 404... (después de descartar 429)
+    return cuota, transitorios, seguridad, invalidos
+
+
+_RE_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)|retry in ([\d.]+)\s*s", re.IGNORECASE)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Segundos que la API pide esperar (RetryInfo en los detalles o en el mensaje), si los indica."""
+    for detalle in getattr(exc, 'details', None) or []:
+        retraso = getattr(detalle, 'retry_delay', None)
+        if retraso is not None and getattr(retraso, 'seconds', None) is not None:
+            return retraso.seconds + getattr(retraso, 'nanos', 0) / 1e9
+    coincidencia = _RE_RETRY_DELAY.search(str(exc))
+    if coincidencia:
+        return float(coincidencia.group(1) or coincidencia.group(2))
+    return None
+
+
+def clasificar_error(exc: Exception, modelo: Optional[str] = None) -> LLMError:
+    """Convierte una excepción de la API de Gemini (o de red) en el LLMError correspondiente."""
+    if isinstance(exc, LLMError):
+        return exc
+    mensaje = f"{type(exc).__name__}: {exc}"
+    cuota, transitorios, seguridad, invalidos = _tipos_de_error()
+    if isinstance(exc, cuota):
+        return LLMQuotaError(mensaje, modelo, _retry_after(exc))
+    if isinstance(exc, transitorios):
+        return LLMTransientError(mensaje, modelo, _retry_after(exc))
+    if isinstance(exc, seguridad):
+        return LLMSafetyError(mensaje, modelo)
+    if isinstance(exc, invalidos):
+        return LLMInvalidRequestError(mensaje, modelo)
+    return LLMError(mensaje, modelo)
+
+
+def espera_backoff(intento: int, retry_after: Optional[float] = None) -> float:
+    """Segundos a esperar antes del reintento número intento+1 (backoff exponencial con jitter completo)."""
+    espera = random.uniform(0, min(LLM_BACKOFF_MAX_SEG, LLM_BACKOFF_BASE_SEG * (2 ** intento)))
+    if retry_after is not None:
+        # Respetar lo que pide la API; el jitter evita que todos los hilos reintenten a la vez
+        espera = retry_after + random.uniform(0, LLM_BACKOFF_BASE_SEG)
+    return min(espera, LLM_ESPERA_MAX_SEG)
+
+
+# === Estadísticas del proceso ===
+_estadisticas = {'reintentos': 0, 'conmutaciones_respaldo': 0, 'aperturas_circuito': 0, 'llamadas_rechazadas_circuito': 0}
+_errores_por_tipo: Dict[str, int] = {}
+_estadisticas_lock = threading.Lock()
+
+
+def _contar(clave: str, diccionario: Optional[Dict[str, int]] = None):
+    diccionario = _estadisticas if diccionario is None else diccionario
+    with _estadisticas_lock:
+        diccionario[clave] = diccionario.get(clave, 0) + 1
+
+
+# === Circuit breaker por modelo ===
+
+class CircuitBreaker:
+    """
+    Circuito de un modelo: 'cerrado' (normal), 'abierto' (no se llama durante el enfriamiento)
+    y 'semiabierto' (pasado el enfriamiento, se deja pasar una única llamada de prueba).
+    """
+
+    def __init__(self, modelo: str):
+        self.modelo = modelo
+        self.estado = 'cerrado'
+        self._fallos_seguidos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        """True si se puede llamar al modelo ahora."""
+        with self._lock:
+            if self.estado == 'cerrado':
+                return True
+            if self.estado == 'abierto' and time.monotonic() >= self._abierto_hasta:
+                self.estado = 'semiabierto'
+            if self.estado == 'semiabierto' and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+        _contar('llamadas_rechazadas_circuito')
+        return False
+
+    def registrar_exito(self):
+        with self._lock:
+            if self.estado != 'cerrado':
+                print(f"✅ LLM: Circuito del modelo '{self.modelo}' cerrado de nuevo.")
+            self.estado = 'cerrado'
+            self._fallos_seguidos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos_seguidos += 1
+            self._prueba_en_curso = False
+            if self.estado == 'semiabierto' or self._fallos_seguidos >= LLM_CIRCUITO_UMBRAL_FALLOS:
+                if self.estado != 'abierto':
+                    print(f"🔌 LLM: Circuito del modelo '{self.modelo}' abierto durante {LLM_CIRCUITO_ENFRIAMIENTO_SEG:.0f}s "
+                          f"({self._fallos_seguidos} fallos seguidos).")
+                    _contar('aperturas_circuito')
+                self.estado = 'abierto'
+                self._abierto_hasta = time.monotonic() + LLM_CIRCUITO_ENFRIAMIENTO_SEG
+
+
+_circuitos: Dict[str, CircuitBreaker] = {}
+_circuitos_lock = threading.Lock()
+
+
+def obtener_circuito(modelo: str) -> CircuitBreaker:
+    """Circuit breaker compartido del modelo (se crea la primera vez)."""
+    with _circuitos_lock:
+        circuito = _circuitos.get(modelo)
+        if circuito is None:
+            circuito = _circuitos[modelo] = CircuitBreaker(modelo)
+        return circuito
+
+
+# === Plan de intentos ===
+
+class PlanDeIntentos:
+    """
+    Recorre los intentos de una llamada: hasta 1 + LLM_REINTENTOS por modelo, en orden
+    (principal y después el de respaldo), saltando los modelos con el circuito abierto.
+
+    Uso (el llamador hace la llamada y la espera, síncrona o asíncrona):
+        plan = PlanDeIntentos([modelo, respaldo])
+        for nombre in plan:
+            try:
+                texto = llamar(nombre)
+            except Exception as e:
+                time.sleep(plan.fallo(e))  # relanza si el error no es reintentable
+                continue
+            plan.exito()
+            return texto
+        raise plan.error_final()
+    """
+
+    def __init__(self, modelos: List[str]):
+        self.modelos = modelos
+        self.modelo: Optional[str] = None
+        self._circuito: Optional[CircuitBreaker] = None
+        self._intento = 0
+        self._cambiar_modelo = False
+        self._ultimo_error: Optional[LLMError] = None
+
+    def __iter__(self):
+        for posicion, nombre in enumerate(self.modelos):
+            if posicion > 0:
+                print(f"↪️ LLM: Conmutando al modelo de respaldo '{nombre}' ({self._ultimo_error}).")
+                _contar('conmutaciones_respaldo')
+            self._circuito = obtener_circuito(nombre)
+            self._cambiar_modelo = False
+            for intento in range(LLM_REINTENTOS + 1):
+                if not self._circuito.permitir():
+                    self._ultimo_error = LLMCircuitOpenError(f"Circuito abierto para el modelo '{nombre}'", nombre)
+                    break
+                self.modelo = nombre
+                self._intento = intento
+                yield nombre
+                if self._cambiar_modelo:
+                    break
+
+    def fallo(self, exc: Exception) -> float:
+        """
+        Registra el fallo del intento actual. Relanza el LLMError si no es reintentable;
+        si no, retorna los segundos a esperar antes del siguiente intento (0 si se pasa al siguiente modelo).
+        """
+        error = clasificar_error(exc, self.modelo)
+        _contar(error.tipo, _errores_por_tipo)
+        self._ultimo_error = error
+        if not error.reintentable:
+            # La API respondió (el modelo está disponible): no cuenta como fallo del circuito
+            self._circuito.registrar_exito()
+            raise error from exc
+        self._circuito.registrar_fallo()
+        if (self._intento >= LLM_REINTENTOS or (error.retry_after or 0) > LLM_ESPERA_MAX_SEG
+                or self._circuito.estado == 'abierto'):
+            self._cambiar_modelo = True
+            return 0
+        _contar('reintentos')
+        espera = espera_backoff(self._intento, error.retry_after)
+        print(f"⏳ LLM: {error.tipo} en '{self.modelo}' (intento {self._intento + 1}). Reintentando en {espera:.1f}s...")
+        return espera
+
+    def exito(self):
+        self._circuito.registrar_exito()
+
+    def error_final(self) -> LLMError:
+        """Error a relanzar cuando se agotan todos los intentos."""
+        return self._ultimo_error or LLMError("No se pudo realizar la llamada al LLM.")
+
+
+def estadisticas() -> Dict[str, object]:
+    """Contadores del proceso: reintentos, conmutaciones, aperturas de circuito, errores por tipo y estado de los circuitos."""
+    with _estadisticas_lock:
+        datos = dict(_estadisticas)
+        datos['errores_por_tipo'] = dict(_errores_por_tipo)
+    with _circuitos_lock:
+        datos['circuitos'] = {modelo: circuito.estado for modelo, circuito in _circuitos.items()}
+    return datos
@@ -2,7 +2,7 @@
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 # --- Modelos para Configuración ---
 
@@ -10,6 +10,7 @@ class ConfigBase(BaseModel):
     """Modelo base para la configuración, excluyendo campos gestionados por DB."""
     tema: str = Field(..., description="Nombre de la sección o tema.")
     min_score_fuente: int = Field(5, ge=1, le=10, description="Score mínimo para fuentes en el scraping (Fase 1).")
+    min_score_prefiltro: int = Field(3, ge=0, le=10, description="Puntuación local mínima (sin IA) para enviar una fuente al análisis con IA. 0 desactiva el prefiltro.")
     num_fuentes_scraper: int = Field(10, ge=1, description="Número de fuentes a intentar buscar en el scraping.")
     num_resultados_scraper: int = Field(5, ge=1, description="Número de fuentes a analizar y considerar guardar en la Fase 1.")
     min_score_generador: int = Field(7, ge=1, le=10, description="Score mínimo para fuentes a usar en la generación (Fase 2).")
@@ -154,6 +155,8 @@ class GenerationTaskDB(GenerationTaskBase):
     id: int
     configuracion_id: Optional[int] = None
     articulo_generado_id: Optional[int] = None
+    intentos: int = 0 # Veces que un worker ha reclamado la tarea (ver task_queue.py)
+    lote_id: Optional[str] = None # Lote de POST /generate/batch, si la tarea pertenece a uno
     fecha_solicitud: datetime
     fecha_actualizacion: datetime
     fecha_finalizacion: Optional[datetime] = None
@@ -177,6 +180,24 @@ class GenerateRequestModel(ConfigBase):
     pass # No necesitas re-declarar nada si la UI siempre envía todos los campos
 
 
+class GenerateBatchRequestModel(BaseModel):
+    """
+    Modelo para la solicitud al endpoint POST /generate/batch.
+    Cada tema se genera con su configuración guardada (o los defaults de ConfigBase si no tiene).
+    """
+    temas: List[str] = Field(default_factory=list, description="Temas a generar (se ignoran repetidos).")
+    todos_los_temas: bool = Field(False, description="Si True, genera todos los temas con configuración guardada (salvo 'Defecto').")
+
+
+class GenerationBatchStatus(BaseModel):
+    """Modelo de respuesta de GET /generate/batch/{lote_id}: progreso del lote y estado de cada tarea."""
+    lote_id: str
+    total: int
+    por_estado: Dict[str, int] # {'pendiente': n, 'en_progreso': n, 'completado': n, 'error': n}
+    terminado: bool
+    tareas: List[GenerationTaskDB]
+
+
 # ChatRequestModel ya no necesita 'tema' si el contexto se pasa de otra forma (ej. article_id)
 # Opcional: Si quieres permitir chat general sin artículo, puedes dejar 'tema' opcional
 class ChatRequestModel(BaseModel):
@@ -246,3 +267,36 @@ class GeneratedArticleSourceLinkDB(GeneratedArticleSourceLinkBase):
 
     class Config:
         orm_mode = True
+
+
+# --- Modelos de las respuestas estructuradas del LLM ---
+# Validan el JSON que devuelve Gemini (response_parser) y se usan como response_schema.
+
+class SourceAnalysisLLM(BaseModel):
+    """Análisis de una fuente devuelto por el Analyzer."""
+    score: int = Field(..., ge=1, le=10, description="1=irrelevante, 10=excelente")
+    reason: str = Field("", description="Explicación concisa")
+    resumen: Optional[str] = Field(None, description="Resumen breve (máx. 100 caracteres)")
+    tags: List[str] = Field(default_factory=list, description="3-5 palabras clave relevantes")
+
+    @field_validator('score', mode='before')
+    @classmethod
+    def redondear_score(cls, valor):
+        # El modelo a veces devuelve 7.5 o "8"
+        try:
+            return round(float(valor))
+        except (TypeError, ValueError):
+            return valor
+
+
+class BatchSourceAnalysisLLM(SourceAnalysisLLM):
+    """Análisis de una fuente dentro de un lote (con el número N de la cabecera [ARTÍCULO N])."""
+    indice: int
+
+
+class GeneratedArticleLLM(BaseModel):
+    """Artículo generado (o regenerado) por el Generator."""
+    title: str
+    meta_description: str
+    tags: List[str]
+    body: str
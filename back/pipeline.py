@@ -3,156 +3,276 @@
 # Carga parámetros de configuración por tema desde la DB.
 # Usa plantillas de prompt HARDCODEADAS en analyzer.py y content_generator.py.
 # Genera la previsualización HTML al finalizar con éxito.
+# Las etapas forman un grafo de dependencias (stage_graph.py): las independientes se solapan y todas se cronometran.
 
 import asyncio
 import json  # Importar json para depurar config dicts
 import os  # Importar os para manejo de rutas, si mock_publisher lo necesita o para debug
 import re  # Importar re si mock_publisher lo necesita (para nombre de archivo)
+import sys
+from collections import Counter
 from datetime import \
     datetime  # Importar datetime si mock_publisher lo necesita para timestamp
+from typing import List, Optional
 
 import content_generator
 # Importar los módulos que contienen las "herramientas"
 import database
 import scraper
+import stage_graph
 import web_tools
 # Importar los modelos Pydantic
 from models import (  # Importar GeneratedArticleDB si la función lo retornara (no lo hace ahora)
     GeneratedArticleDB, GenerateRequestModel)
 
+# === Configuración (variables de entorno) ===
+PIPELINE_IMAGENES_ESPECULATIVAS = os.getenv("PIPELINE_IMAGENES_ESPECULATIVAS", "1") == "1" # Buscar imágenes mientras se redacta
+PIPELINE_TAGS_CONSULTA_PROVISIONAL = 4 # Tags de las fuentes añadidos al tema en la query especulativa
+
+
+async def _buscar_fuentes(generate_request: GenerateRequestModel) -> list:
+    """PASO 1 del pipeline: busca, analiza y guarda fuentes. Retorna la lista de fuentes con 'full_content'."""
+    print("🔍 PIPELINE: Buscando y analizando fuentes...")
+    # Pasar SOLO los parámetros numéricos relevantes y el tema a scraper.buscar_noticias
+    # scraper.buscar_noticias ahora retorna lista de dicts con metadata Y 'full_content'
+    # y guarda la metadata en la DB articulos (y añade el ID).
+    # Las etapas son bloqueantes (red, LLM, SQLite): se ejecutan en un hilo con asyncio.to_thread
+    # para no congelar el event loop de FastAPI durante toda la generación.
+    scraper_stats = {}
+    sources_with_content = await asyncio.to_thread(
+        scraper.buscar_noticias,
+        generate_request.tema,
+        num_noticias_a_buscar=generate_request.num_fuentes_scraper,
+        min_score_para_analizar=generate_request.min_score_fuente,
+        min_score_prefiltro=generate_request.min_score_prefiltro,
+        num_resultados_a_retornar=generate_request.num_fuentes_generador, # Usar este parametro para limitar cuántas fuentes pasar al generator
+        estadisticas=scraper_stats
+    )
+    print(f"📊 PIPELINE: Scraper realizó {scraper_stats.get('llamadas_llm', 0)} llamadas al LLM "
+          f"(ahorradas por parada temprana: {scraper_stats.get('llamadas_llm_ahorradas', 0)}, "
+          f"candidatos cancelados: {scraper_stats.get('candidatos_cancelados', 0)}, "
+          f"descartadas por el prefiltro local: {scraper_stats.get('rechazados_prefiltro', 0)}).")
+    return sources_with_content
+
+
+def _consulta_provisional_imagenes(tema: str, sources_with_content: list) -> str:
+    """Query de imágenes antes de tener el artículo: el tema y los tags más repetidos en las fuentes."""
+    conteo_tags = Counter(
+        tag.strip().lower() for src in sources_with_content for tag in (src.get('tags') or []) if isinstance(tag, str) and tag.strip()
+    )
+    tags = [tag for tag, _ in conteo_tags.most_common(PIPELINE_TAGS_CONSULTA_PROVISIONAL) if tag not in tema.lower()]
+    return (tema + " " + " ".join(tags))[:150].strip()
+
+
+def _consulta_final_imagenes(tema: str, generated_article_data: dict) -> str:
+    """Query de imágenes a partir del título y los tags del artículo generado."""
+    image_search_query = generated_article_data.get('title', tema) + " " + " ".join(generated_article_data.get('tags', []))
+    return image_search_query[:150].strip()
+
+
+# === Etapas del grafo del pipeline (ver stage_graph.py) ===
+# Cada etapa recibe sus entradas del contexto por nombre y retorna su salida.
+#
+#   request ─► fuentes ─┬─► generacion ──────────────┬─► imagenes ─► guardado
+#                       └─► imagenes_especulativas ──┘
+#
+# La búsqueda especulativa de imágenes (tema + tags de las fuentes) se solapa con la redacción;
+# si trae suficientes imágenes, la etapa 'imagenes' las reutiliza sin volver a llamar a Unsplash.
+
+async def _etapa_fuentes(request: GenerateRequestModel) -> list:
+    sources_with_content = await _buscar_fuentes(request)
+    if not sources_with_content:
+        raise stage_graph.EtapaFallida("No se encontraron fuentes útiles.")
+    return sources_with_content
+
+
+async def _etapa_imagenes_especulativas(tema: str, fuentes: list, request: GenerateRequestModel) -> Optional[list]:
+    if not PIPELINE_IMAGENES_ESPECULATIVAS or request.num_imagenes_buscar <= 0:
+        return None
+    consulta = _consulta_provisional_imagenes(tema, fuentes)
+    print(f"🖼️ PIPELINE: Búsqueda especulativa de imágenes mientras se redacta: '{consulta}'")
+    return await asyncio.to_thread(web_tools.find_free_images, consulta, num_results=request.num_imagenes_buscar)
+
+
+def _etapa_generacion(eventos: Optional[asyncio.Queue]):
+    """Etapa de redacción; con una cola de eventos, genera en streaming y publica el borrador según llega."""
+
+    async def generacion(tema: str, fuentes: list, request: GenerateRequestModel) -> dict:
+        print("✍️ PIPELINE: Generando borrador de artículo...")
+        generated_article_data = None
+        if eventos is None:
+            # Pasar la lista de fuentes CON contenido y los parámetros de generación al generator
+            generated_article_data = await asyncio.to_thread(
+                content_generator.generate_seo_content,
+                tema,
+                fuentes, # Lista de fuentes CON contenido (metadata + 'full_content')
+                longitud=request.longitud_texto,
+                tono=request.tono_texto
+            )
+        else:
+            async for evento in content_generator.agenerate_seo_content_stream(
+                tema, fuentes, longitud=request.longitud_texto, tono=request.tono_texto
+            ):
+                if 'articulo' in evento:
+                    generated_article_data = evento['articulo']
+                else:
+                    eventos.put_nowait({'tipo': 'campo', **evento})
+        if not generated_article_data:
+            raise stage_graph.EtapaFallida("Falló la generación del borrador de texto.")
+        return generated_article_data
+
+    return generacion
+
+
+async def _etapa_imagenes(tema: str, articulo: dict, imagenes_especulativas: Optional[list],
+                          request: GenerateRequestModel) -> list:
+    num_imagenes_buscar = request.num_imagenes_buscar
+    if num_imagenes_buscar <= 0:
+        return []
+    if imagenes_especulativas and len(imagenes_especulativas) >= num_imagenes_buscar:
+        print(f"🖼️ PIPELINE: Se reutilizan las {len(imagenes_especulativas)} imágenes de la búsqueda especulativa.")
+        return imagenes_especulativas
+    # La especulativa no bastó: query definitiva con el título y los tags generados
+    print("🖼️ PIPELINE: Buscando imágenes...")
+    found_images_metadata = await asyncio.to_thread(
+        web_tools.find_free_images, _consulta_final_imagenes(tema, articulo), num_results=num_imagenes_buscar
+    )
+    if not found_images_metadata:
+        print("⚠️ PIPELINE: No se encontraron imágenes.")
+    return found_images_metadata or imagenes_especulativas or []
+
+
+async def _etapa_guardado(tema: str, articulo: dict, fuentes: list, imagenes: list) -> int:
+    """Guarda artículo, enlaces a fuentes, fuentes usadas e imágenes (una transacción). Retorna el ID."""
+    print("💾 PIPELINE: Guardando artículo generado, fuentes usadas y metadata de imágenes...")
+    articulo['tema'] = tema # Añadir el tema para guardar en la DB
+    # Las IDs de las fuentes que se usaron vienen en la lista de fuentes (incluye ID)
+    source_ids_used = [src.get('id') for src in fuentes if src.get('id') is not None]
+    # Score y resumen del análisis hecho para este tema (la fila de la fuente puede ser de otro tema)
+    puntuaciones = {src['id']: {'score': src.get('score'), 'resumen': src.get('resumen')} for src in fuentes if src.get('id') is not None}
+    article_id = await asyncio.to_thread(database.save_generation_result, articulo, source_ids_used, imagenes, puntuaciones)
+    if not article_id:
+        raise stage_graph.EtapaFallida("Falló al guardar el artículo generado en la base de datos.")
+    return article_id
+
+
+async def _cargar_checkpoints(tarea_id: Optional[int]) -> dict:
+    """Salidas de las etapas que la tarea ya completó en una ejecución anterior ({} si no hay tarea o checkpoints)."""
+    if tarea_id is None:
+        return {}
+    restauradas = await asyncio.to_thread(database.cargar_checkpoints, tarea_id)
+    if restauradas:
+        print(f"♻️ PIPELINE: Reanudando la tarea {tarea_id} desde checkpoint (etapas completadas: {', '.join(restauradas)}).")
+    return restauradas
+
+
+def _guardar_checkpoint(tarea_id: Optional[int]):
+    """Callback al_terminar de stage_graph que guarda la salida de cada etapa completada contra la tarea."""
+
+    async def guardar(etapa: str, salida):
+        if tarea_id is not None:
+            await asyncio.to_thread(database.guardar_checkpoint, tarea_id, etapa, salida)
+
+    return guardar
+
+
+def _grafo_generacion(eventos: Optional[asyncio.Queue] = None) -> List[stage_graph.Etapa]:
+    """Etapas del pipeline de generación. Entradas iniciales del contexto: 'request' y 'tema'."""
+    return [
+        stage_graph.Etapa('fuentes', _etapa_fuentes, entradas=['request']),
+        stage_graph.Etapa('imagenes_especulativas', _etapa_imagenes_especulativas,
+                          entradas=['tema', 'fuentes', 'request'], opcional=True),
+        stage_graph.Etapa('generacion', _etapa_generacion(eventos), entradas=['tema', 'fuentes', 'request'], salida='articulo'),
+        stage_graph.Etapa('imagenes', _etapa_imagenes, entradas=['tema', 'articulo', 'imagenes_especulativas', 'request']),
+        stage_graph.Etapa('guardado', _etapa_guardado, entradas=['tema', 'articulo', 'fuentes', 'imagenes'], salida='article_id'),
+    ]
+
 
 # La función recibe el modelo GenerateRequestModel.
 # Esta request model contiene los parámetros (numéricos, estilo)
 # que se usarán para esta ejecución. La lógica para cargar la config
 # desde la DB y construir este modelo reside en el llamador (ej. endpoint API).
-async def run_full_generation_pipeline(generate_request: GenerateRequestModel):
+async def run_full_generation_pipeline(generate_request: GenerateRequestModel, tarea_id: Optional[int] = None):
     """
     Ejecuta el pipeline completo de generación de contenido
     basándose en los parámetros numéricos y de estilo proporcionados en la solicitud.
     Usa plantillas de prompt hardcodeadas en analyzer.py y content_generator.py.
-    Genera la previsualización HTML al completar con éxito.
+    Las etapas se ejecutan como un grafo de dependencias (ver _grafo_generacion) y se cronometran.
+    Con tarea_id (cola de generación), la salida de cada etapa se guarda como checkpoint y una nueva
+    ejecución de la misma tarea retoma desde la última etapa completada (sin volver a scrapear ni analizar).
+    Retorna el ID del artículo generado, o None si alguna etapa falla.
     """
     tema = generate_request.tema
     print(f"\n--- PIPELINE: Iniciando para '{tema}' ---")
-
-    # Los parámetros numéricos y de estilo vienen directamente del GenerateRequestModel
-    # Las plantillas de prompt NO se usan aquí, los módulos (analyzer, generator)
-    # usan sus defaults hardcodeados.
-
-    # Capturar los parámetros relevantes del modelo de request para pasarlos
-    # Se asume que GenerateRequestModel tiene todos los campos de ConfigBase y sus defaults
-    num_fuentes_scraper = generate_request.num_fuentes_scraper
-    min_score_fuente = generate_request.min_score_fuente
-    num_resultados_scraper = generate_request.num_resultados_scraper # Este es el límite de fuentes procesadas por scraper
-    num_fuentes_generador = generate_request.num_fuentes_generador # Este es el límite de fuentes A USAR por generator
-    longitud_texto = generate_request.longitud_texto
-    tono_texto = generate_request.tono_texto
-    num_imagenes_buscar = generate_request.num_imagenes_buscar
-
-
-    # Variable para almacenar el ID del artículo generado si tiene éxito
-    generated_article_id = None
-    # Variable para almacenar los datos completos del artículo generado
-    generated_article_data = None
-    # Variable para almacenar la metadata de las imágenes encontradas
-    found_images_metadata = None
-    # Lista de IDs de fuentes usadas
-    source_ids_used = []
-
-
+    tiempos = {}
     try:
-        # === PASO 1: Buscar fuentes y obtener su contenido ===
-        print("🔍 PIPELINE: Buscando y analizando fuentes...")
-        # Pasar SOLO los parámetros numéricos relevantes y el tema a scraper.buscar_noticias
-        # scraper.buscar_noticias ahora retorna lista de dicts con metadata Y 'full_content'
-        # y guarda la metadata en la DB articulos (y añade el ID).
-        sources_with_content = scraper.buscar_noticias(
-            tema,
-            num_noticias_a_buscar=num_fuentes_scraper,
-            min_score_para_analizar=min_score_fuente,
-            num_resultados_a_retornar=num_fuentes_generador # Usar este parametro para limitar cuántas fuentes pasar al generator
-        )
-
-        if not sources_with_content:
-            print("❌ PIPELINE: No se encontraron fuentes útiles.")
-            # En una implementación real, podrías registrar un error en la tabla generacion_tareas
-            return None # Retornar None si no hay fuentes
-
-
-        # === PASO 2: Generar el Artículo (texto) ===
-        print("✍️ PIPELINE: Generando borrador de artículo...")
-        # Pasar la lista de fuentes CON contenido y los parámetros de generación al generator
-        # content_generator.generate_seo_content usará su plantilla hardcodeada
-        generated_article_data = content_generator.generate_seo_content(
-            tema,
-            sources_with_content, # Lista de fuentes CON contenido (metadata + 'full_content')
-            longitud=longitud_texto, # <-- Pasando args
-            tono=tono_texto
-        )
-
-        if not generated_article_data:
-            print("❌ PIPELINE: Falló la generación del borrador de texto.")
-            # Registrar error en generacion_tareas si se usa
-            return None
-
-        # === PASO 3: Buscar Imágenes ===
-        print("🖼️ PIPELINE: Buscando imágenes...")
-        # La búsqueda de imágenes usa datos del artículo generado
-        # Construir la query a partir del título y tags generados
-        image_search_query = generated_article_data.get('title', tema) + " " + " ".join(generated_article_data.get('tags', []))
-        image_search_query = image_search_query[:150].strip()
-
-        # Pasar parámetro num_imagenes_buscar
-        found_images_metadata = web_tools.find_free_images(
-            image_search_query,
-            num_results=num_imagenes_buscar # <-- Pasando arg
+        contexto = await stage_graph.ejecutar(
+            _grafo_generacion(), {'request': generate_request, 'tema': tema}, tiempos,
+            al_terminar=_guardar_checkpoint(tarea_id), restauradas=await _cargar_checkpoints(tarea_id)
         )
-        if not found_images_metadata:
-             print("⚠️ PIPELINE: No se encontraron imágenes.")
-
-
-        # === PASO 4: Guardar Artículo Generado y Metadata de Imágenes en DB ===
-        print("💾 PIPELINE: Guardando artículo generado y metadata de imágenes...")
-        # Asegurarse de que los datos del artículo incluyen el tema antes de guardar
-        generated_article_data['tema'] = tema # Añadir el tema para guardar en la DB
-        # save_generated_article retorna el ID del artículo generado
-        generated_article_id = database.save_generated_article(generated_article_data)
-
-        if generated_article_id:
-            # Guardar metadata de imágenes, asociadas al ID del artículo
-            if found_images_metadata:
-                 for img_meta in found_images_metadata:
-                     img_meta['articulo_generado_id'] = generated_article_id
-                     database.save_image_metadata(img_meta)
-            print(f"✅ PIPELINE: Artículo generado y metadata de imágenes guardadas con ID {generated_article_id}.")
-
-            # === PASO 5: Marcar Fuentes Usadas ===
-            print("✅ PIPELINE: Marcando fuentes utilizadas...")
-            # Las IDs de las fuentes que se usaron vienen en la lista sources_with_content (ahora incluye ID)
-            if sources_with_content: # Solo marcar si realmente se usaron fuentes
-                 source_ids_used = [src.get('id') for src in sources_with_content if src.get('id') is not None]
-                 for source_id in source_ids_used:
-                      database.mark_source_used(source_id)
+        print(f"--- PIPELINE: Pipeline completado para '{tema}'. Artículo ID: {contexto['article_id']} ---")
+        return contexto['article_id']
 
+    except stage_graph.EtapaFallida as e:
+        print(f"❌ PIPELINE: {str(e)}")
+        return None
 
-          
+    except Exception as e:
+        # Manejo de errores general para cualquier fallo en el pipeline
+        print(f"❌ PIPELINE: Error CRÍTICO durante el pipeline para '{tema}': {str(e)}")
+        return None
 
+    finally:
+        print(f"⏱️ PIPELINE: {stage_graph.resumen_tiempos(tiempos)}")
 
-            print(f"--- PIPELINE: Pipeline completado para '{tema}'. Artículo ID: {generated_article_id} ---")
-            # Retornar el ID del artículo generado como indicador de éxito
-            return generated_article_id
-
-        else:
-            print("❌ PIPELINE: Falló al guardar el artículo generado en la base de datos.")
-            # Registrar error en generacion_tareas si se usa
-            return None # Retornar None en caso de fallo al guardar
 
+async def run_full_generation_pipeline_stream(generate_request: GenerateRequestModel):
+    """
+    Versión en streaming de run_full_generation_pipeline (async generator).
+    Emite diccionarios {'tipo': ..., ...} a medida que avanza:
+      - {'tipo': 'etapa', 'etapa': 'fuentes'|'imagenes_especulativas'|'generacion'|'imagenes'|'guardado'} (al iniciar cada una)
+      - {'tipo': 'fuentes', 'num_fuentes': int}
+      - {'tipo': 'campo', 'campo': str, 'delta'|'item'|'valor': ...}  (borrador del artículo según llega)
+      - {'tipo': 'completado', 'article_id': int, 'tiempos': {...}}  o  {'tipo': 'error', 'detalle': str}  (siempre el último)
+    """
+    tema = generate_request.tema
+    print(f"\n--- PIPELINE (streaming): Iniciando para '{tema}' ---")
+    eventos = asyncio.Queue()
+    tiempos = {}
+
+    def al_terminar(etapa: str, salida):
+        if etapa == 'fuentes':
+            eventos.put_nowait({'tipo': 'fuentes', 'num_fuentes': len(salida)})
+
+    ejecucion = asyncio.create_task(stage_graph.ejecutar(
+        _grafo_generacion(eventos), {'request': generate_request, 'tema': tema}, tiempos,
+        al_iniciar=lambda etapa: eventos.put_nowait({'tipo': 'etapa', 'etapa': etapa}), al_terminar=al_terminar
+    ))
+    try:
+        # Reenviar los eventos de las etapas mientras el grafo se ejecuta
+        while not (ejecucion.done() and eventos.empty()):
+            siguiente = asyncio.ensure_future(eventos.get())
+            await asyncio.wait({siguiente, ejecucion}, return_when=asyncio.FIRST_COMPLETED)
+            if siguiente.done():
+                yield siguiente.result()
+            else:
+                siguiente.cancel()
+
+        contexto = ejecucion.result()
+        print(f"--- PIPELINE (streaming): Pipeline completado para '{tema}'. Artículo ID: {contexto['article_id']} ---")
+        yield {'tipo': 'completado', 'article_id': contexto['article_id'], 'tiempos': tiempos}
+
+    except stage_graph.EtapaFallida as e:
+        print(f"❌ PIPELINE: {str(e)}")
+        yield {'tipo': 'error', 'detalle': str(e)}
 
     except Exception as e:
-        # Manejo de errores general para cualquier fallo en el pipeline
-        print(f"❌ PIPELINE: Error CRÍTICO durante el pipeline para '{tema}': {str(e)}")
-        # Registrar error en generacion_tareas si se usa
-        return None
+        print(f"❌ PIPELINE: Error CRÍTICO durante el pipeline en streaming para '{tema}': {str(e)}")
+        yield {'tipo': 'error', 'detalle': str(e)}
+
+    finally:
+        ejecucion.cancel()
+        print(f"⏱️ PIPELINE: {stage_graph.resumen_tiempos(tiempos)}")
 
 
 # === Bloque para pruebas independientes ===
@@ -160,6 +280,18 @@ async def run_full_generation_pipeline(generate_request: GenerateRequestModel):
 # Simula la carga de configuración desde la DB para construir un GenerateRequestModel
 # y luego ejecuta el pipeline.
 if __name__ == "__main__":
+    # Modo worker: python -m pipeline worker --concurrency N
+    # Ejecuta las tareas encoladas por POST /generate en un pool de procesos (ver task_queue.py).
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        import argparse
+
+        import task_queue
+        parser = argparse.ArgumentParser(prog="python -m pipeline worker", description="Worker multiproceso de la cola de generación.")
+        parser.add_argument("--concurrency", type=int, default=task_queue.TAREAS_WORKER_PROCESOS or os.cpu_count() or 1,
+                            help="Pipelines simultáneos (procesos hijos). Por defecto TAREAS_WORKER_PROCESOS o el número de CPUs.")
+        args = parser.parse_args(sys.argv[2:])
+        sys.exit(task_queue.ejecutar_worker_procesos(args.concurrency))
+
     print("--- Prueba independiente del Pipeline Completo ---")
 
     # Necesitas inicializar la DB para las funciones de database
@@ -0,0 +1,159 @@
+# prefilter.py
+# Pre-puntuación local de fuentes (sin LLM) entre la extracción del texto y analyzer.
+# Combina heurísticas baratas en una puntuación 0-10:
+# - Relevancia tipo BM25 de los términos del tema en el texto.
+# - Idioma (por proporción de stopwords) frente a los idiomas aceptados.
+# - Recencia (años mencionados en el texto).
+# - Proporción de "boilerplate" (frases muy cortas o de avisos legales/cookies/newsletter).
+# - Longitud (contenido "delgado").
+# Además detecta casi-duplicados dentro de una misma búsqueda (Jaccard de shingles de 5 palabras).
+
+import os
+import re
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set
+
+import text_utils
+
+# === Configuración (variables de entorno) ===
+PREFILTRO_IDIOMAS = [i.strip() for i in os.getenv("PREFILTRO_IDIOMAS", "es,en").split(",") if i.strip()]
+PREFILTRO_MIN_PALABRAS = int(os.getenv("PREFILTRO_MIN_PALABRAS", "250")) # Por debajo, el contenido se considera "delgado"
+PREFILTRO_MAX_ANTIGUEDAD_ANOS = int(os.getenv("PREFILTRO_MAX_ANTIGUEDAD_ANOS", "3")) # Antigüedad a la que la recencia llega a 0
+PREFILTRO_UMBRAL_DUPLICADO = float(os.getenv("PREFILTRO_UMBRAL_DUPLICADO", "0.8")) # Jaccard a partir del cual es casi-duplicado
+
+# Parámetros BM25 (sin IDF: los candidatos se evalúan de uno en uno, sin corpus)
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_LONGITUD_MEDIA = 800 # Longitud (palabras) de referencia de un artículo
+
+PESO_RELEVANCIA = 0.5
+PESO_RECENCIA = 0.15
+PESO_LIMPIEZA = 0.15 # 1 - proporción de boilerplate
+PESO_LONGITUD = 0.2
+PENALIZACION_IDIOMA = 0.5 # Multiplicador si el idioma no está en PREFILTRO_IDIOMAS
+
+MARCADORES_BOILERPLATE = (
+    "cookies", "suscribete", "newsletter", "politica de privacidad", "aviso legal", "derechos reservados",
+    "inicia sesion", "registrate", "comparte en", "siguenos", "leer mas", "publicidad",
+    "subscribe", "privacy policy", "all rights reserved", "sign in", "sign up", "share on", "read more", "advertisement",
+)
+
+_RE_ANIO = re.compile(r"\b(19[5-9]\d|20\d{2})\b")
+TAMANO_SHINGLE = 5
+
+
+def _raiz(token: str) -> str:
+    """Raíz aproximada (prefijo) para que 'inteligencia' coincida con 'inteligencias'."""
+    return token[:6]
+
+
+def relevancia_bm25(tema: str, tokens: list) -> float:
+    """
+    Relevancia 0-1 del texto para el tema: media, por término del tema, del TF saturado
+    y normalizado por longitud de BM25 (un término ausente aporta 0).
+    """
+    terminos = {_raiz(t) for t in text_utils.tokenizar(tema, quitar_stopwords=True)}
+    if not terminos:
+        return 1.0
+    if not tokens:
+        return 0.0
+    frecuencias: Dict[str, int] = {}
+    for token in tokens:
+        raiz = _raiz(token)
+        if raiz in terminos:
+            frecuencias[raiz] = frecuencias.get(raiz, 0) + 1
+    normalizacion = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_LONGITUD_MEDIA)
+    total = sum(tf * (BM25_K1 + 1) / (tf + normalizacion) for tf in frecuencias.values())
+    return total / ((BM25_K1 + 1) * len(terminos))
+
+
+def detectar_idioma(tokens: list) -> str:
+    """Retorna 'es', 'en' o 'desconocido' según la proporción de stopwords de cada idioma."""
+    if not tokens:
+        return 'desconocido'
+    es = sum(1 for t in tokens if t in text_utils.STOPWORDS_ES)
+    en = sum(1 for t in tokens if t in text_utils.STOPWORDS_EN)
+    if max(es, en) / len(tokens) < 0.1:
+        return 'desconocido'
+    return 'es' if es >= en else 'en'
+
+
+def recencia(texto: str) -> float:
+    """1.0 si el año más reciente mencionado es el actual o el anterior; decrece hasta 0. 0.5 si no hay años."""
+    anio_actual = datetime.now().year
+    anios = [int(a) for a in _RE_ANIO.findall(texto) if int(a) <= anio_actual]
+    if not anios:
+        return 0.5
+    antiguedad = anio_actual - max(anios)
+    return max(0.0, 1.0 - max(0, antiguedad - 1) / PREFILTRO_MAX_ANTIGUEDAD_ANOS)
+
+
+def proporcion_boilerplate(texto: str) -> float:
+    """Fracción de frases muy cortas (< 5 palabras) o con marcadores de boilerplate."""
+    frases = text_utils.dividir_frases(texto)
+    if not frases:
+        return 1.0
+    ruido = 0
+    for frase in frases:
+        normalizada = text_utils.normalizar(frase)
+        if len(normalizada.split()) < 5 or any(m in normalizada for m in MARCADORES_BOILERPLATE):
+            ruido += 1
+    return ruido / len(frases)
+
+
+def calcular_huella(texto: str) -> Set[int]:
+    """Conjunto de hashes de shingles de TAMANO_SHINGLE palabras (para detectar casi-duplicados)."""
+    tokens = text_utils.tokenizar(texto)
+    if len(tokens) < TAMANO_SHINGLE:
+        return {zlib.crc32(' '.join(tokens).encode('utf-8'))}
+    return {
+        zlib.crc32(' '.join(tokens[i:i + TAMANO_SHINGLE]).encode('utf-8'))
+        for i in range(len(tokens) - TAMANO_SHINGLE + 1)
+    }
+
+
+def es_casi_duplicado(huella: Set[int], huellas_vistas: Iterable[Set[int]]) -> bool:
+    """True si la huella tiene una similitud de Jaccard >= PREFILTRO_UMBRAL_DUPLICADO con alguna ya vista."""
+    for vista in huellas_vistas:
+        union = len(huella | vista)
+        if union and len(huella & vista) / union >= PREFILTRO_UMBRAL_DUPLICADO:
+            return True
+    return False
+
+
+def evaluar(tema: str, texto: str) -> Dict[str, Any]:
+    """
+    Pre-puntúa un texto extraído para un tema.
+    Retorna un dict con 'puntuacion' (0-10), los componentes ('relevancia', 'idioma', 'recencia',
+    'boilerplate', 'palabras') y 'motivo_rechazo' (str) si hay un motivo de rechazo inmediato.
+    """
+    tokens = text_utils.tokenizar(texto)
+    relevancia = relevancia_bm25(tema, tokens)
+    idioma = detectar_idioma(tokens)
+    valor_recencia = recencia(texto)
+    boilerplate = proporcion_boilerplate(texto)
+    factor_longitud = min(1.0, len(tokens) / PREFILTRO_MIN_PALABRAS) if PREFILTRO_MIN_PALABRAS else 1.0
+
+    puntuacion = 10 * (
+        PESO_RELEVANCIA * relevancia
+        + PESO_RECENCIA * valor_recencia
+        + PESO_LIMPIEZA * (1 - boilerplate)
+        + PESO_LONGITUD * factor_longitud
+    )
+    if idioma not in PREFILTRO_IDIOMAS:
+        puntuacion *= PENALIZACION_IDIOMA
+
+    motivo_rechazo: Optional[str] = None
+    if relevancia == 0:
+        motivo_rechazo = "no menciona ningún término del tema"
+
+    return {
+        'puntuacion': round(puntuacion, 2),
+        'relevancia': round(relevancia, 3),
+        'idioma': idioma,
+        'recencia': round(valor_recencia, 2),
+        'boilerplate': round(boilerplate, 2),
+        'palabras': len(tokens),
+        'motivo_rechazo': motivo_rechazo,
+    }
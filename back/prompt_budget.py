@@ -0,0 +1,131 @@
+# prompt_budget.py
+# Presupuesto de tokens para los prompts (analyzer y content_generator).
+# - Estima tokens sin llamar a la API (llm_client.estimar_tokens).
+# - Reparte un presupuesto por llamada entre varias fuentes en proporción a su score;
+#   lo que una fuente corta no usa se redistribuye entre las demás.
+# - Recorta cada texto quedándose con las frases más informativas (entradilla, frases con
+#   cifras/fechas y frases con términos del tema) en lugar de un prefijo ciego, conservando el orden.
+
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import llm_client
+import text_utils
+
+SEPARADOR_OMISION = " [...] " # Marca los huecos donde se omitieron frases
+
+FRASES_ENTRADILLA = 3 # Las primeras frases suelen resumir la noticia
+PESO_ENTRADILLA = 3.0
+PESO_CIFRAS = 1.0 # Por cada cifra, porcentaje o fecha (con tope)
+MAX_CIFRAS_POR_FRASE = 3
+PESO_TEMA = 1.5 # Por cada término del tema presente en la frase
+
+_RE_CIFRAS = re.compile(
+    r"\d+(?:[.,]\d+)?\s?%?|\b(?:enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre"
+    r"|january|february|march|april|june|july|august|september|october|november|december)\b",
+    re.IGNORECASE,
+)
+
+
+def _raices_tema(tema: str) -> set:
+    """Raíces (prefijos de 6 letras) de los términos significativos del tema."""
+    return {t[:6] for t in text_utils.tokenizar(tema, quitar_stopwords=True)}
+
+
+def _puntuar_frase(frase: str, posicion: int, raices_tema: set) -> float:
+    """Puntuación de informatividad de una frase."""
+    puntuacion = PESO_ENTRADILLA if posicion < FRASES_ENTRADILLA else 0.0
+    puntuacion += PESO_CIFRAS * min(MAX_CIFRAS_POR_FRASE, len(_RE_CIFRAS.findall(frase)))
+    if raices_tema:
+        tokens = {t[:6] for t in text_utils.tokenizar(frase, quitar_stopwords=True)}
+        puntuacion += PESO_TEMA * len(raices_tema & tokens)
+    return puntuacion
+
+
+def recortar_texto(texto: str, tema: str, max_tokens: int) -> str:
+    """
+    Reduce un texto a max_tokens (estimados) conservando las frases más informativas.
+    Si el texto ya cabe, se retorna intacto. Las frases elegidas mantienen su orden original
+    y los huecos se marcan con SEPARADOR_OMISION.
+    """
+    if not texto or llm_client.estimar_tokens(texto) <= max_tokens:
+        return texto
+    if max_tokens <= 0:
+        return ""
+
+    frases = text_utils.dividir_frases(texto)
+    raices_tema = _raices_tema(tema)
+    # Orden de preferencia: mayor puntuación primero; a igualdad, la frase más temprana
+    candidatas = sorted(
+        range(len(frases)),
+        key=lambda i: (-_puntuar_frase(frases[i], i, raices_tema), i)
+    )
+
+    elegidas = []
+    tokens_usados = 0
+    coste_separador = llm_client.estimar_tokens(SEPARADOR_OMISION)
+    for indice in candidatas:
+        coste = llm_client.estimar_tokens(frases[indice]) + coste_separador
+        if tokens_usados + coste > max_tokens:
+            continue
+        elegidas.append(indice)
+        tokens_usados += coste
+
+    if not elegidas:
+        # Ni una frase cabe entera (frases enormes o texto sin puntuación): prefijo por caracteres
+        return texto[:max_tokens * llm_client.CARACTERES_POR_TOKEN]
+
+    elegidas.sort()
+    partes = []
+    anterior = -1
+    for indice in elegidas:
+        if partes and indice != anterior + 1:
+            partes.append(SEPARADOR_OMISION.strip())
+        partes.append(frases[indice])
+        anterior = indice
+    if anterior != len(frases) - 1:
+        partes.append(SEPARADOR_OMISION.strip())
+    return " ".join(partes)
+
+
+def repartir_presupuesto(tamanos: Sequence[int], pesos: Sequence[float], presupuesto_total: int) -> List[int]:
+    """
+    Reparte presupuesto_total (tokens) entre textos de tamanos dados en proporción a sus pesos.
+    Un texto nunca recibe más de lo que ocupa; el sobrante se redistribuye entre los demás.
+    """
+    asignado = [0] * len(tamanos)
+    activos = [i for i in range(len(tamanos)) if tamanos[i] > 0]
+    restante = presupuesto_total
+    while activos and restante > 0:
+        peso_total = sum(max(pesos[i], 0.1) for i in activos)
+        cuotas = {i: restante * max(pesos[i], 0.1) / peso_total for i in activos}
+        completos = [i for i in activos if tamanos[i] <= cuotas[i]]
+        if not completos:
+            for i in activos:
+                asignado[i] = int(cuotas[i])
+            break
+        for i in completos:
+            asignado[i] = tamanos[i]
+            restante -= tamanos[i]
+        activos = [i for i in activos if i not in completos]
+    return asignado
+
+
+def ajustar_fuentes(fuentes: List[Dict[str, Any]], tema: str, presupuesto_total: int,
+                    clave_texto: str = 'full_content', clave_score: str = 'score') -> List[Optional[str]]:
+    """
+    Recorta el texto de cada fuente para que la suma quepa en presupuesto_total tokens,
+    dando más presupuesto a las fuentes con mayor score. Retorna los textos en el mismo orden
+    (None para las fuentes sin texto).
+    """
+    textos = [fuente.get(clave_texto) or None for fuente in fuentes]
+    tamanos = [llm_client.estimar_tokens(texto) if texto else 0 for texto in textos]
+    pesos = []
+    for fuente in fuentes:
+        score = fuente.get(clave_score)
+        pesos.append(float(score) if isinstance(score, (int, float)) else 5.0)
+    cuotas = repartir_presupuesto(tamanos, pesos, presupuesto_total)
+    return [
+        recortar_texto(texto, tema, cuota) if texto else None
+        for texto, cuota in zip(textos, cuotas)
+    ]
@@ -0,0 +1,383 @@
+# response_parser.py
+# Parsing de respuestas del LLM, compartido por analyzer, content_generator y la reparación de JSON.
+# - esquema_gemini: convierte un modelo Pydantic (models.py) en el response_schema de Gemini.
+# - cargar_json: extracción tolerante del JSON de una respuesta. Camino rápido con el decodificador C
+#   de json (raw_decode desde la primera llave); si falla, extractor de llaves balanceadas en una
+#   pasada + reparación con json5 (comas finales, comillas simples, comentarios...).
+# - parsear_respuesta: carga + validación con Pydantic y, solo si hace falta, UNA llamada al LLM
+#   pidiéndole que repare su JSON (en vez de tirar la generación).
+# - StreamingJSONParser: parser incremental de un objeto JSON plano que llega por trozos
+#   (respuesta en streaming de Gemini). Emite eventos a medida que llegan los valores de los campos,
+#   sin esperar a que el objeto esté completo.
+
+import copy
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+
+import json5
+import llm_client
+from pydantic import BaseModel, ValidationError
+
+_RE_CONTROL = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F\u2028\u2029]')
+# strict=False acepta saltos de línea/tabuladores literales dentro de las cadenas (frecuentes en 'body')
+_DECODIFICADOR = json.JSONDecoder(strict=False)
+_CIERRES = {'{': '}', '[': ']'}
+
+PROMPT_REPARACION_JSON = """
+La siguiente respuesta debía ser {descripcion} válido conforme a este esquema JSON, pero no se pudo parsear o no cumple el esquema.
+Devuelve SOLO el JSON corregido: sin explicaciones, sin bloques de código y sin cambiar el contenido de los textos.
+
+Esquema:
+{esquema}
+
+Respuesta a corregir:
+{respuesta}
+"""
+
+
+# === Esquemas para la salida estructurada de Gemini ===
+
+def _tipo_gemini(propiedad: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte una propiedad del JSON Schema de Pydantic al subconjunto que acepta Gemini."""
+    nullable = False
+    if 'anyOf' in propiedad:
+        # Optional[X] -> X con nullable
+        opciones = [p for p in propiedad['anyOf'] if p.get('type') != 'null']
+        nullable = len(opciones) < len(propiedad['anyOf'])
+        propiedad = {**opciones[0], 'description': propiedad.get('description')} if opciones else {'type': 'string'}
+    tipo = {'type': propiedad.get('type', 'string')}
+    if tipo['type'] == 'array':
+        tipo['items'] = _tipo_gemini(propiedad.get('items', {'type': 'string'}))
+    # Límites de Field(ge=..., le=...): p. ej. score entre 1 y 10
+    for limite in ('minimum', 'maximum'):
+        if limite in propiedad:
+            tipo[limite] = propiedad[limite]
+    if propiedad.get('description'):
+        tipo['description'] = propiedad['description']
+    if nullable:
+        tipo['nullable'] = True
+    return tipo
+
+
+@lru_cache(maxsize=None)
+def _esquema_cacheado(modelo: Type[BaseModel], lista: bool) -> Dict[str, Any]:
+    """Esquema convertido una sola vez por modelo. NO modificar: esquema_gemini entrega copias."""
+    propiedades = {
+        nombre: _tipo_gemini(propiedad)
+        for nombre, propiedad in modelo.model_json_schema().get('properties', {}).items()
+    }
+    # Todos los campos como requeridos: así el modelo los emite siempre
+    esquema = {'type': 'object', 'properties': propiedades, 'required': list(propiedades)}
+    return {'type': 'array', 'items': esquema} if lista else esquema
+
+
+def esquema_gemini(modelo: Type[BaseModel], lista: bool = False) -> Dict[str, Any]:
+    """
+    response_schema de Gemini para un modelo Pydantic (o para una lista de ellos si lista=True).
+    Retorna una copia propia: el llamador puede modificarla sin alterar la de los demás.
+    """
+    return copy.deepcopy(_esquema_cacheado(modelo, lista))
+
+
+# === Extracción tolerante de JSON ===
+
+def extraer_json(texto: str, apertura: str = '{') -> Optional[str]:
+    """
+    Extractor de llaves balanceadas en una sola pasada: retorna el fragmento desde la primera
+    apertura ('{' o '[') hasta su cierre, ignorando llaves dentro de cadenas.
+    Si la respuesta está truncada, retorna hasta el final del texto. None si no hay apertura.
+    """
+    inicio = texto.find(apertura)
+    if inicio < 0:
+        return None
+    cierre = _CIERRES[apertura]
+    profundidad = 0
+    en_cadena = False
+    escape = False
+    for posicion in range(inicio, len(texto)):
+        c = texto[posicion]
+        if en_cadena:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                en_cadena = False
+        elif c == '"':
+            en_cadena = True
+        elif c == apertura:
+            profundidad += 1
+        elif c == cierre:
+            profundidad -= 1
+            if profundidad == 0:
+                return texto[inicio:posicion + 1]
+    return texto[inicio:]
+
+
+def cargar_json(texto: str, apertura: str = '{') -> Any:
+    """
+    Carga el primer objeto (apertura='{') o array (apertura='[') JSON de una respuesta del LLM,
+    tolerando texto o bloques ```json alrededor. Retorna None si no se puede cargar.
+    """
+    if not texto:
+        return None
+    inicio = texto.find(apertura)
+    if inicio < 0:
+        return None
+    # Camino rápido: el decodificador de json (en C) se detiene solo al cerrar el valor
+    try:
+        valor, _ = _DECODIFICADOR.raw_decode(texto, inicio)
+        return valor
+    except json.JSONDecodeError:
+        pass
+    # Camino lento: fragmento balanceado, sin caracteres de control, y json5 (más permisivo)
+    fragmento = _RE_CONTROL.sub('', extraer_json(texto, apertura))
+    try:
+        return json5.loads(fragmento)
+    except ValueError:
+        return None
+
+
+def validar(datos: Any, modelo: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+    """Valida un dict contra el modelo Pydantic. Retorna el dict normalizado o None si no es válido."""
+    if not isinstance(datos, dict):
+        return None
+    try:
+        return modelo.model_validate(datos).model_dump()
+    except ValidationError as e:
+        print(f"⚠️ ResponseParser: JSON no conforme a {modelo.__name__}: {e.error_count()} errores ({e.errors()[0]['loc']}).")
+        return None
+
+
+def _cargar_y_validar(texto: str, modelo: Type[BaseModel], lista: bool):
+    """Objeto validado (o None); con lista=True, la lista de elementos válidos (o None si no hay array)."""
+    if not lista:
+        return validar(cargar_json(texto, '{'), modelo)
+    datos = cargar_json(texto, '[')
+    if not isinstance(datos, list):
+        return None
+    return [item for item in (validar(dato, modelo) for dato in datos) if item is not None]
+
+
+def parsear_respuesta(texto: str, modelo: Type[BaseModel], lista: bool = False, reparar: bool = True,
+                      model_name: Optional[str] = None, prioridad: int = llm_client.PRIORIDAD_NORMAL):
+    """
+    Parsea y valida la respuesta del LLM contra el modelo Pydantic.
+    Si falla y reparar=True, hace UNA llamada al LLM para que corrija el JSON (con salida estructurada),
+    con la misma prioridad que la llamada original.
+
+    Returns:
+        dict validado (o None); con lista=True, la lista de dicts válidos (o None si no se obtuvo un array).
+    """
+    resultado = _cargar_y_validar(texto, modelo, lista)
+    if resultado is not None or not reparar or not texto:
+        return resultado
+
+    print(f"🔧 ResponseParser: Respuesta no válida para {modelo.__name__}. Pidiendo al LLM que repare el JSON...")
+    prompt = PROMPT_REPARACION_JSON.format(
+        descripcion="un array JSON" if lista else "un objeto JSON",
+        esquema=json.dumps(esquema_gemini(modelo, lista), ensure_ascii=False),
+        respuesta=texto
+    )
+    try:
+        reparado = llm_client.generate_raw_content(
+            prompt, model_name=model_name, response_schema=esquema_gemini(modelo, lista), prioridad=prioridad
+        )
+    except Exception as e:
+        print(f"❌ ResponseParser: Error en la llamada de reparación: {str(e)}")
+        return None
+    resultado = _cargar_y_validar(reparado, modelo, lista)
+    if resultado is None:
+        print(f"❌ ResponseParser: La reparación tampoco produjo un JSON válido. Inicio respuesta: {texto[:200]}...")
+    return resultado
+
+# Estados del parser
+_BUSCANDO_OBJETO = 0 # Antes de la '{' inicial (p. ej. texto o ```json previo)
+_ESPERANDO_CLAVE = 1
+_EN_CLAVE = 2
+_ESPERANDO_DOS_PUNTOS = 3
+_ESPERANDO_VALOR = 4
+_EN_VALOR_TEXTO = 5
+_EN_ARRAY = 6 # Dentro de un array de strings (p. ej. 'tags')
+_EN_ITEM_TEXTO = 7
+_EN_VALOR_OTRO = 8 # Número, true/false/null u objeto/array anidado: se acumula y se decodifica al cerrar
+_TERMINADO = 9
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class StreamingJSONParser:
+    """
+    Parser incremental para respuestas con la forma {"clave": "texto", "lista": ["a", "b"], ...}.
+
+    Uso:
+        parser = StreamingJSONParser()
+        for trozo in stream:
+            for evento in parser.feed(trozo):
+                ...
+        parser.resultado  # dict con los valores completos
+
+    Eventos emitidos por feed():
+        {'campo': str, 'delta': str}   fragmento nuevo del valor de texto de un campo
+        {'campo': str, 'item': Any}    elemento completo de un campo de tipo lista
+        {'campo': str, 'valor': Any}   valor completo de un campo (al terminar cualquier campo)
+    """
+
+    def __init__(self):
+        self.resultado: Dict[str, Any] = {}
+        self._estado = _BUSCANDO_OBJETO
+        self._clave = ''
+        self._buffer: List[str] = [] # Texto del valor/clave/item en curso
+        self._escape = None # None, '' (tras '\\') o los dígitos de un \\uXXXX en curso
+        self._sustituto_alto = None # Primera mitad de un par sustituto \\uXXXX pendiente
+        self._profundidad = 0 # Para valores anidados en _EN_VALOR_OTRO
+        self._en_cadena_otro = False
+        self._items: List[Any] = []
+
+    @property
+    def terminado(self) -> bool:
+        return self._estado == _TERMINADO
+
+    def _leer_caracter_cadena(self, c: str):
+        """
+        Procesa un carácter dentro de una cadena JSON.
+        Retorna (texto_decodificado, cadena_cerrada).
+        """
+        if self._escape is not None:
+            if self._escape == '' and c != 'u':
+                self._escape = None
+                return _ESCAPES.get(c, c), False
+            self._escape += c
+            if len(self._escape) < 5: # 'u' + 4 dígitos hex
+                return '', False
+            codigo = self._escape[1:]
+            self._escape = None
+            try:
+                punto = int(codigo, 16)
+            except ValueError:
+                return '', False
+            # Pares sustitutos (\ud83d\ude00): esperar a la segunda mitad para emitir el carácter
+            if 0xD800 <= punto <= 0xDBFF:
+                self._sustituto_alto = punto
+                return '', False
+            if 0xDC00 <= punto <= 0xDFFF and self._sustituto_alto is not None:
+                punto = 0x10000 + ((self._sustituto_alto - 0xD800) << 10) + (punto - 0xDC00)
+            self._sustituto_alto = None
+            return chr(punto), False
+        if c == '\\':
+            self._escape = ''
+            return '', False
+        if c == '"':
+            return '', True
+        return c, False
+
+    def feed(self, trozo: str) -> List[Dict[str, Any]]:
+        """Procesa un trozo de la respuesta y retorna los eventos producidos."""
+        eventos: List[Dict[str, Any]] = []
+        delta: List[str] = []
+
+        def emitir_delta():
+            if delta:
+                eventos.append({'campo': self._clave, 'delta': ''.join(delta)})
+                delta.clear()
+
+        for c in trozo:
+            estado = self._estado
+            if estado == _TERMINADO:
+                break
+            elif estado == _BUSCANDO_OBJETO:
+                if c == '{':
+                    self._estado = _ESPERANDO_CLAVE
+            elif estado == _ESPERANDO_CLAVE:
+                if c == '"':
+                    self._buffer = []
+                    self._estado = _EN_CLAVE
+                elif c == '}':
+                    self._estado = _TERMINADO
+            elif estado == _EN_CLAVE:
+                texto, cerrada = self._leer_caracter_cadena(c)
+                if cerrada:
+                    self._clave = ''.join(self._buffer)
+                    self._estado = _ESPERANDO_DOS_PUNTOS
+                else:
+                    self._buffer.append(texto)
+            elif estado == _ESPERANDO_DOS_PUNTOS:
+                if c == ':':
+                    self._estado = _ESPERANDO_VALOR
+            elif estado == _ESPERANDO_VALOR:
+                if c.isspace():
+                    continue
+                self._buffer = []
+                if c == '"':
+                    self._estado = _EN_VALOR_TEXTO
+                elif c == '[':
+                    self._items = []
+                    self._estado = _EN_ARRAY
+                else:
+                    self._buffer = [c]
+                    self._profundidad = 1 if c == '{' else 0
+                    self._en_cadena_otro = False
+                    self._estado = _EN_VALOR_OTRO
+            elif estado == _EN_VALOR_TEXTO:
+                texto, cerrada = self._leer_caracter_cadena(c)
+                if cerrada:
+                    emitir_delta()
+                    self._finalizar_campo(''.join(self._buffer), eventos)
+                else:
+                    self._buffer.append(texto)
+                    delta.append(texto)
+            elif estado == _EN_ARRAY:
+                if c == '"':
+                    self._buffer = []
+                    self._estado = _EN_ITEM_TEXTO
+                elif c == ']':
+                    self._finalizar_campo(list(self._items), eventos)
+            elif estado == _EN_ITEM_TEXTO:
+                texto, cerrada = self._leer_caracter_cadena(c)
+                if cerrada:
+                    item = ''.join(self._buffer)
+                    self._items.append(item)
+                    eventos.append({'campo': self._clave, 'item': item})
+                    self._estado = _EN_ARRAY
+                else:
+                    self._buffer.append(texto)
+            elif estado == _EN_VALOR_OTRO:
+                if self._en_cadena_otro:
+                    self._buffer.append(c)
+                    if self._escape is not None:
+                        self._escape = None
+                    elif c == '\\':
+                        self._escape = ''
+                    elif c == '"':
+                        self._en_cadena_otro = False
+                    continue
+                if c == '"':
+                    self._en_cadena_otro = True
+                elif c in '{[':
+                    self._profundidad += 1
+                elif c in '}]' and self._profundidad > 0:
+                    self._profundidad -= 1
+                elif self._profundidad == 0 and c in ',}':
+                    self._finalizar_campo(self._decodificar_otro(), eventos)
+                    if c == '}':
+                        self._estado = _TERMINADO
+                    continue
+                self._buffer.append(c)
+
+        emitir_delta()
+        return eventos
+
+    def _decodificar_otro(self) -> Any:
+        texto = ''.join(self._buffer).strip()
+        try:
+            return json.loads(texto)
+        except json.JSONDecodeError:
+            return texto
+
+    def _finalizar_campo(self, valor: Any, eventos: List[Dict[str, Any]]):
+        self.resultado[self._clave] = valor
+        eventos.append({'campo': self._clave, 'valor': valor})
+        self._buffer = []
+        self._estado = _ESPERANDO_CLAVE
@@ -1,33 +1,342 @@
 # scraper.py (Corregido - No usa plantilla de prompt para analyzer)
 
+import os
 import re
+import threading
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                as_completed, wait)
 from datetime import \
     datetime  # Importar datetime aquí si se usa para fecha_scraping
+from typing import Any, Dict, Optional
 from urllib.parse import quote_plus
 
 import analyzer
 import database
+import driver_pool
+import http_client
+import prefilter
 import requests
 import web_tools
 from bs4 import BeautifulSoup
 
+# === Límites de concurrencia del motor de procesamiento de fuentes ===
+# Las URLs candidatas se procesan en paralelo, pero cada etapa tiene su propio tope
+# (compartido por todas las búsquedas en curso del proceso).
+MAX_WORKERS_SCRAPER = int(os.getenv("SCRAPER_MAX_WORKERS", "8"))
+MAX_DESCARGAS_CONCURRENTES = int(os.getenv("SCRAPER_MAX_DESCARGAS", "6"))
+MAX_ANALISIS_CONCURRENTES = int(os.getenv("SCRAPER_MAX_ANALISIS", "3"))
+MAX_ESCRITURAS_DB_CONCURRENTES = int(os.getenv("SCRAPER_MAX_ESCRITURAS_DB", "1"))
+
+# Modo "suficiente": dejar de descargar/analizar en cuanto se tienen
+# num_resultados_a_retornar fuentes con score >= min_score_para_analizar.
+PARADA_TEMPRANA_POR_DEFECTO = os.getenv("SCRAPER_PARADA_TEMPRANA", "1") == "1"
+
+# Análisis por lotes: los candidatos descargados se agrupan y se puntúan varios por llamada al LLM
+# (ver analyzer.analyze_batch_with_gemini). Con "0" se analiza cada fuente por separado.
+ANALISIS_EN_LOTE_POR_DEFECTO = os.getenv("SCRAPER_ANALISIS_EN_LOTE", "1") == "1"
+
+# URLs finales que está procesando alguna búsqueda en curso del proceso (p. ej. los temas de un lote
+# de POST /generate/batch): una URL compartida por varios temas se descarga una sola vez.
+# La búsqueda que la reclama publica el texto descargado en el Future y las demás lo reutilizan.
+# Solo se comparte la descarga: el prefiltro, el análisis y el score son de cada tema (la relevancia
+# depende del tema; los prompts idénticos ya los sirve llm_cache).
+# Las entradas se quitan al terminar la búsqueda que las reclamó; a partir de ahí las URLs guardadas
+# las descarta database.url_existe, como hasta ahora.
+_urls_en_proceso: Dict[str, Future] = {} # final_url -> Future con el texto ('' si no se extrajo), o None si se abandonó sin descargar
+_urls_en_proceso_lock = threading.Lock()
+
+_semaforo_descargas = threading.BoundedSemaphore(MAX_DESCARGAS_CONCURRENTES)
+_semaforo_analisis = threading.BoundedSemaphore(MAX_ANALISIS_CONCURRENTES)
+_semaforo_escrituras_db = threading.BoundedSemaphore(MAX_ESCRITURAS_DB_CONCURRENTES)
+
+
+def _cuota_alcanzada(ejecucion, final_url, contador='candidatos_cancelados'):
+    """
+    Verifica si la ejecución ya se detuvo por parada temprana.
+    Si es así, suma uno a ejecucion[contador] y retorna True. Solo los candidatos que ya pasaron
+    el prefiltro y la deduplicación cuentan como 'llamadas_llm_ahorradas'; el resto (que quizá
+    nunca habrían llegado al LLM) cuenta como 'candidatos_cancelados'.
+    """
+    if not ejecucion['parada'].is_set():
+        return False
+    with ejecucion['lock']:
+        ejecucion[contador] += 1
+    print(f"🛑 Scraper: Cuota alcanzada, se descarta {final_url[:60]}... sin analizar.")
+    return True
+
+
+def _pasa_prefiltro(final_url, text, tema, ejecucion):
+    """
+    Pre-puntuación local (prefilter) antes de gastar una llamada al LLM.
+    Rechaza casi-duplicados de otras fuentes de la misma búsqueda y textos con
+    puntuación < ejecucion['min_score_prefiltro']. Un umbral de 0 desactiva el prefiltro.
+    """
+    if not ejecucion['min_score_prefiltro']:
+        return True
+    evaluacion = prefilter.evaluar(tema, text)
+    huella = prefilter.calcular_huella(text)
+    motivo = evaluacion['motivo_rechazo']
+    with ejecucion['lock']:
+        if not motivo and prefilter.es_casi_duplicado(huella, ejecucion['huellas']):
+            motivo = "casi-duplicado de otra fuente de esta búsqueda"
+        if not motivo and evaluacion['puntuacion'] < ejecucion['min_score_prefiltro']:
+            motivo = f"puntuación local {evaluacion['puntuacion']} < {ejecucion['min_score_prefiltro']}"
+        if motivo:
+            ejecucion['rechazados_prefiltro'] += 1
+        else:
+            ejecucion['huellas'].append(huella)
+    if motivo:
+        print(f"🚫 Scraper: Prefiltro descarta {final_url[:60]}... ({motivo}).")
+        return False
+    return True
+
+
+def _reclamar_url(final_url, ejecucion) -> Optional[Future]:
+    """
+    Reserva final_url para esta búsqueda y retorna None: la búsqueda debe publicar el texto con _publicar_url.
+    Si otra búsqueda en curso ya la está descargando, retorna el Future de esa búsqueda.
+    """
+    with _urls_en_proceso_lock:
+        en_curso = _urls_en_proceso.get(final_url)
+        if en_curso is not None:
+            return en_curso
+        future = _urls_en_proceso[final_url] = Future()
+    with ejecucion['lock']:
+        ejecucion['urls_reclamadas'][final_url] = future
+    return None
+
+
+def _publicar_url(final_url, text, ejecucion):
+    """
+    Publica a las demás búsquedas el texto descargado de una URL reclamada por esta ('' si no se pudo extraer),
+    o None si se abandona sin descargarla (la retoma quien la espere).
+    """
+    with ejecucion['lock']:
+        future = ejecucion['urls_reclamadas'].get(final_url)
+        if future is None or future.done():
+            return
+        if text is None:
+            del ejecucion['urls_reclamadas'][final_url]
+    if text is None:
+        with _urls_en_proceso_lock:
+            if _urls_en_proceso.get(final_url) is future:
+                del _urls_en_proceso[final_url]
+    future.set_result(text)
+
+
+def _liberar_urls(ejecucion):
+    """
+    Al terminar la búsqueda, quita sus URLs de _urls_en_proceso (las guardadas quedan cubiertas por url_existe)
+    y resuelve con None las que no llegó a publicar, para que quien las espere las retome.
+    """
+    with _urls_en_proceso_lock:
+        for final_url, future in ejecucion['urls_reclamadas'].items():
+            if _urls_en_proceso.get(final_url) is future:
+                del _urls_en_proceso[final_url]
+    for future in ejecucion['urls_reclamadas'].values():
+        if not future.done():
+            future.set_result(None)
+
+
+def _descargar(final_url, tema, ejecucion) -> Optional[str]:
+    """
+    Texto de final_url: lo descarga esta búsqueda o, si otra en curso ya la está descargando, espera a
+    que lo publique y lo reutiliza. Retorna None si la URL se descarta (ya guardada, cuota o sin contenido).
+    """
+    while True:
+        compartida = _reclamar_url(final_url, ejecucion)
+        if compartida is None:
+            break
+        # Quien descarga publica el texto sin esperar a nada más, así que esta espera no puede bloquearse en ciclo
+        text = compartida.result()
+        if text is None:
+            continue # La otra búsqueda la abandonó sin descargarla: se vuelve a reclamar
+        if not text:
+            print(f"⏩ Scraper: Otra búsqueda descartó {final_url[:60]}... (ya guardada o sin contenido); se omite para '{tema}'.")
+            return None
+        with ejecucion['lock']:
+            ejecucion['compartidas_otro_tema'] += 1
+        print(f"🤝 Scraper: Se reutiliza la descarga de {final_url[:60]}... hecha por otra búsqueda en curso para '{tema}'.")
+        return text
+
+    text = None
+    try:
+        if database.url_existe(final_url):
+            print(f"⏩ Scraper: Saltando duplicado: {final_url[:60]}...")
+            text = ''
+            return None
+        if _cuota_alcanzada(ejecucion, final_url):
+            return None
+        with _semaforo_descargas:
+            text = web_tools.fetch_and_extract_content(final_url) or ''
+        if not text:
+            print(f"⏩ Scraper: Saltando URL por contenido no extraído/muy corto: {final_url[:60]}...")
+            return None
+        return text
+    finally:
+        _publicar_url(final_url, text, ejecucion)
+
+
+def _preparar_candidato(url, tema, ejecucion):
+    """
+    Primera parte del procesamiento de una URL candidata de DDG: resuelve la redirección,
+    descarta duplicados/no-artículos, descarga el contenido y aplica el prefiltro local.
+    Retorna (final_url, texto) o None si la URL se descarta.
+    """
+    if _cuota_alcanzada(ejecucion, url):
+        return None
+
+    final_url = url
+    # Resolución ligera (parámetro uddg / redirecciones HTTP); Selenium solo como fallback
+    resolved = web_tools.resolve_redirect_url(url)
+    if not resolved:
+        print(f"🌐 Scraper: Redirección no resuelta por HTTP. Usando Selenium (pool) para {url[:60]}...")
+        with driver_pool.get_pool().driver() as driver:
+            if driver:
+                resolved = web_tools.get_final_url(url, driver)
+    if resolved: final_url = resolved
+    else: print(f"⚠️ Scraper: Usando URL original por fallo en redirección: {final_url[:60]}...")
+
+    with ejecucion['lock']:
+        if final_url in ejecucion['urls_vistas']:
+            print(f"⏩ Scraper: Saltando URL repetida en esta búsqueda: {final_url[:60]}...")
+            return None
+        ejecucion['urls_vistas'].add(final_url)
+
+    if any(x in final_url for x in ["/tag/", "/temas/", "?page=", "#", "/category/", ".pdf", ".zip"]):
+        print(f"⏩ Scraper: Saltando URL no-articulo/archivo: {final_url[:60]}...")
+        return None
+
+    text = _descargar(final_url, tema, ejecucion)
+    if not text:
+        return None
+    # Prefiltro propio del tema, también con un texto descargado por otra búsqueda
+    if not _pasa_prefiltro(final_url, text, tema, ejecucion):
+        return None
+    return final_url, text
+
+
+def _guardar_fuente(final_url, text, analysis_result, tema):
+    """
+    Última parte del procesamiento: construye la fuente procesada a partir del análisis
+    y guarda su metadata en la DB. Retorna el dict de la fuente (con 'id') o None.
+    El dict lleva el score y el resumen del análisis de este tema; si la URL ya la guardó otro tema,
+    la fila de 'articulos' conserva los suyos (el pipeline guarda los de este tema en el enlace del artículo).
+    """
+    if not analysis_result or analysis_result.get('score', 0) is None:
+        print(f"⏩ Scraper: Saltando URL por fallo o score inválido en análisis IA: {final_url[:60]}...")
+        return None
+
+    # === PREPARAR DATOS DE FUENTE PROCESADA ===
+    processed_source_data = {
+        'url': final_url,
+        'full_content': text,
+        'score': analysis_result.get('score', 0),
+        'resumen': analysis_result.get('resumen', analysis_result.get('reason', '')),
+        'tags': analysis_result.get('tags', []),
+        'titulo': analysis_result.get('titulo', f"Artículo sobre {tema}"),
+        'fuente': final_url.split('/')[2] if len(final_url.split('/')) > 2 else '',
+        'fecha_publicacion_fuente': None,
+        'fecha_scraping': datetime.now().isoformat(),
+        'usada_para_generar': 0,
+    }
+
+    # === Guardar la metadata de la fuente en la tabla `articulos` AQUI ===
+    try:
+        with _semaforo_escrituras_db:
+            source_id_in_db = database.guardar_articulo(processed_source_data)
+        if source_id_in_db:
+            processed_source_data['id'] = source_id_in_db
+            print(f"✅ Scraper: Fuente {final_url[:60]}... analizada y guardada en DB con ID {source_id_in_db}.")
+            return processed_source_data
+        print(f"⚠️ Scraper: Falló el guardado en DB de fuente {final_url[:60]}... Saltando.")
+    except Exception as db_e:
+        print(f"❌ Scraper: Error al intentar guardar fuente {final_url[:60]}... en DB: {db_e}")
+    return None
+
+
+def _procesar_candidato(url, tema, ejecucion):
+    """
+    Procesa una URL candidata de DDG: resuelve la redirección, descarga el contenido,
+    lo analiza con IA y guarda la metadata en la DB.
+    Cada etapa respeta su límite de concurrencia. Retorna el dict de la fuente procesada o None.
+
+    `ejecucion` es el estado compartido de la búsqueda (URLs vistas, evento de parada y contadores).
+    """
+    preparado = _preparar_candidato(url, tema, ejecucion)
+    if not preparado:
+        return None
+    final_url, text = preparado
+
+    # === Analizar el Contenido con IA (Analyzer) ===
+    # analyzer.analyze_with_gemini usa su prompt hardcodeado
+    with _semaforo_analisis:
+        # Re-verificar tras esperar turno: la cuota pudo completarse mientras tanto
+        if _cuota_alcanzada(ejecucion, final_url, 'llamadas_llm_ahorradas'):
+            return None
+        analysis_result = analyzer.analyze_with_gemini(tema, text)
+    with ejecucion['lock']:
+        ejecucion['llamadas_llm'] += 1
+
+    return _guardar_fuente(final_url, text, analysis_result, tema)
+
+
+def _procesar_lote(lote, tema, ejecucion):
+    """
+    Analiza un lote de candidatos ya descargados con una sola llamada al LLM
+    (analyzer.analyze_batch_with_gemini) y guarda las fuentes resultantes.
+    `lote` es una lista de (indice_ddg, final_url, texto). Retorna una lista de (indice_ddg, fuente procesada o None).
+    """
+    with _semaforo_analisis:
+        if ejecucion['parada'].is_set():
+            with ejecucion['lock']:
+                ejecucion['llamadas_llm_ahorradas'] += len(lote)
+            print(f"🛑 Scraper: Cuota alcanzada, se descarta un lote de {len(lote)} fuentes sin analizar.")
+            return [(indice, None) for indice, _, _ in lote]
+        contadores = {}
+        analisis = analyzer.analyze_batch_with_gemini(tema, [text for _, _, text in lote], estadisticas=contadores)
+    with ejecucion['lock']:
+        ejecucion['llamadas_llm'] += contadores.get('llamadas_llm', 0)
+        # Llamadas evitadas por agrupar: una por fuente menos las realmente realizadas
+        ejecucion['llamadas_llm_ahorradas_lote'] += max(0, len(lote) - contadores.get('llamadas_llm', 0))
+
+    return [
+        (indice, _guardar_fuente(final_url, text, analysis_result, tema))
+        for (indice, final_url, text), analysis_result in zip(lote, analisis)
+    ]
+
 
 def buscar_noticias(
     tema: str,
     num_noticias_a_buscar: int,
     min_score_para_analizar: int,
-    num_resultados_a_retornar: int
+    num_resultados_a_retornar: int,
     # Ya NO recibe analyzer_prompt_template
+    parada_temprana: bool = PARADA_TEMPRANA_POR_DEFECTO,
+    analisis_en_lote: bool = ANALISIS_EN_LOTE_POR_DEFECTO,
+    min_score_prefiltro: float = 0,
+    estadisticas: Optional[Dict[str, Any]] = None
 ):
     """
     Busca URLs de fuentes para un tema, resuelve, obtiene contenido, analiza con IA
     y retorna metadata + contenido de las fuentes más relevantes.
+    Las URLs candidatas se procesan concurrentemente (ver MAX_*_CONCURRENTES);
+    el orden del resultado es el mismo que en el procesamiento secuencial.
 
     Args:
         tema (str): El tema o consulta de búsqueda principal.
         num_noticias_a_buscar (int): Número máximo de URLs a buscar inicialmente en DDG.
         min_score_para_analizar (int): Score mínimo que una fuente analizada debe tener.
         num_resultados_a_retornar (int): Número máximo de fuentes (metadata + contenido) a retornar.
+        parada_temprana (bool): Si True, deja de descargar/analizar candidatos (y cancela los pendientes)
+            en cuanto hay num_resultados_a_retornar fuentes con score >= min_score_para_analizar.
+        analisis_en_lote (bool): Si True, las fuentes descargadas se puntúan en lotes (varias por llamada
+            al LLM, ver analyzer.analyze_batch_with_gemini); si False, una llamada por fuente.
+        min_score_prefiltro (float): Puntuación local mínima (0-10, ver prefilter.evaluar) para enviar
+            una fuente al LLM. 0 desactiva el prefiltro.
+        estadisticas (dict, opcional): Si se proporciona, se rellena con los contadores de la ejecución
+            ('candidatos', 'llamadas_llm', 'llamadas_llm_ahorradas', 'candidatos_cancelados',
+            'llamadas_llm_ahorradas_lote', 'rechazados_prefiltro', 'compartidas_otro_tema', 'parada_temprana_activada').
 
     Returns:
         list: Lista de diccionarios con metadata de fuente + 'full_content'.
@@ -42,7 +351,7 @@ def buscar_noticias(
         url = f"https://duckduckgo.com/html/?q={quote_plus(query_ddg)}&kl=es-es"
         headers = {'User-Agent': 'Mozilla/5.0'}
         try:
-            response = requests.get(url, headers=headers, timeout=15)
+            response = http_client.get(url, headers=headers, timeout=15)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, 'html.parser')
             return [
@@ -59,80 +368,137 @@ def buscar_noticias(
 
 
     # --- Lógica principal del scraper ---
+    # Cada URL candidata se procesa en un hilo del pool; las etapas (descarga,
+    # análisis IA, escritura en DB) están limitadas por sus propios semáforos.
     processed_articles = []
-    driver = None
+    candidate_urls = []
+    ejecucion = {
+        'lock': threading.Lock(), # Protege urls_vistas y los contadores
+        'urls_vistas': set(), # Evita procesar dos veces la misma URL final dentro de la ejecución
+        'parada': threading.Event(), # Se activa al alcanzar la cuota (parada temprana)
+        'llamadas_llm': 0,
+        'llamadas_llm_ahorradas': 0, # Candidatos ya prefiltrados que la parada temprana dejó sin analizar
+        'candidatos_cancelados': 0, # Candidatos descartados por la parada temprana antes de descargarlos/prefiltrarlos
+        'llamadas_llm_ahorradas_lote': 0, # Llamadas evitadas al agrupar fuentes en un mismo prompt
+        'min_score_prefiltro': min_score_prefiltro,
+        'huellas': [], # Huellas (shingles) de los textos que pasaron el prefiltro, para detectar casi-duplicados
+        'rechazados_prefiltro': 0,
+        'urls_reclamadas': {}, # final_url -> Future reservado en _urls_en_proceso (se liberan al terminar)
+        'compartidas_otro_tema': 0, # Candidatos cuya descarga hizo otra búsqueda en curso (el análisis es propio)
+    }
 
+    candidate_urls = fetch_urls_from_ddg()
     try:
-        driver = web_tools.setup_driver()
-        if not driver: print("⚠️ Scraper: Continuará sin resolución de redirecciones.")
-
-        for url in fetch_urls_from_ddg():
-            try:
-                final_url = url
-                if driver:
-                    resolved = web_tools.get_final_url(url, driver)
-                    if resolved: final_url = resolved
-                    else: print(f"⚠️ Scraper: Usando URL original por fallo en redirección: {final_url[:60]}...")
-                else: final_url = url
-
-                if database.url_existe(final_url):
-                    print(f"⏩ Scraper: Saltando duplicado: {final_url[:60]}...")
-                    continue
-
-                if any(x in final_url for x in ["/tag/", "/temas/", "?page=", "#", "/category/", ".pdf", ".zip"]):
-                    print(f"⏩ Scraper: Saltando URL no-articulo/archivo: {final_url[:60]}...")
-                    continue
-
-                text = web_tools.fetch_and_extract_content(final_url)
-                if not text:
-                    print(f"⏩ Scraper: Saltando URL por contenido no extraído/muy corto: {final_url[:60]}...")
-                    continue
-
-                # === Analizar el Contenido con IA (Analyzer) ===
-                # analyzer.analyze_with_gemini usa su prompt hardcodeado
-                # No le pasamos template aquí
-                analysis_result = analyzer.analyze_with_gemini(tema, text) # <-- No pasar template
-
-                if not analysis_result or analysis_result.get('score', 0) is None:
-                    print(f"⏩ Scraper: Saltando URL por fallo o score inválido en análisis IA: {final_url[:60]}...")
-                    continue
-
-                # === PREPARAR DATOS DE FUENTE PROCESADA ===
-                processed_source_data = {
-                    'url': final_url,
-                    'full_content': text,
-                    'score': analysis_result.get('score', 0),
-                    'resumen': analysis_result.get('resumen', analysis_result.get('reason', '')),
-                    'tags': analysis_result.get('tags', []),
-                    'titulo': analysis_result.get('titulo', f"Artículo sobre {tema}"),
-                    'fuente': final_url.split('/')[2] if len(final_url.split('/')) > 2 else '',
-                    'fecha_publicacion_fuente': None,
-                    'fecha_scraping': datetime.now().isoformat(),
-                    'usada_para_generar': 0,
-                }
-
-                # === Guardar la metadata de la fuente en la tabla `articulos` AQUI ===
-                try:
-                    source_id_in_db = database.guardar_articulo(processed_source_data)
-                    if source_id_in_db:
-                        processed_source_data['id'] = source_id_in_db
-                        print(f"✅ Scraper: Fuente {final_url[:60]}... analizada y guardada en DB con ID {source_id_in_db}.")
-                        processed_articles.append(processed_source_data)
-                    else:
-                        print(f"⚠️ Scraper: Falló el guardado en DB de fuente {final_url[:60]}... Saltando.")
-                except Exception as db_e:
-                     print(f"❌ Scraper: Error al intentar guardar fuente {final_url[:60]}... en DB: {db_e}")
-                     pass
-
-            except Exception as e:
-                print(f"⚠️ Scraper: Error procesando URL {url}: {e}")
-                pass
+        if candidate_urls:
+            num_workers = max(1, min(MAX_WORKERS_SCRAPER, len(candidate_urls)))
+            modo = "análisis por lotes" if analisis_en_lote else "análisis individual"
+            print(f"⚙️ Scraper: Procesando {len(candidate_urls)} URLs candidatas con {num_workers} workers ({modo}).")
+            fuentes_confiables = 0
+
+            def registrar_resultado(indice, processed_source_data, pendientes):
+                """Acumula una fuente procesada y activa la parada temprana al completar la cuota."""
+                nonlocal fuentes_confiables
+                if not processed_source_data:
+                    return
+                processed_articles.append((indice, processed_source_data))
+                score = processed_source_data.get('score')
+                if isinstance(score, (int, float)) and score >= min_score_para_analizar:
+                    fuentes_confiables += 1
+                if parada_temprana and not ejecucion['parada'].is_set() and fuentes_confiables >= num_resultados_a_retornar:
+                    print(f"🛑 Scraper: {fuentes_confiables} fuentes con score >= {min_score_para_analizar}. Deteniendo búsqueda (parada temprana).")
+                    ejecucion['parada'].set()
+                    # Cancelar los candidatos que aún no empezaron; los que están en curso
+                    # abandonan antes de llamar al LLM (ver _cuota_alcanzada). Un candidato cancelado
+                    # no se ha descargado ni prefiltrado: no cuenta como llamada al LLM ahorrada.
+                    with ejecucion['lock']:
+                        for pendiente in pendientes:
+                            if pendiente.cancel():
+                                ejecucion['candidatos_cancelados'] += 1
 
+            with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="scraper") as executor:
+                if not analisis_en_lote:
+                    futures = {
+                        executor.submit(_procesar_candidato, url, tema, ejecucion): indice
+                        for indice, url in enumerate(candidate_urls)
+                    }
+                    for future in as_completed(futures):
+                        if future.cancelled():
+                            continue
+                        try:
+                            processed_source_data = future.result()
+                        except Exception as e:
+                            print(f"⚠️ Scraper: Error procesando URL {candidate_urls[futures[future]]}: {e}")
+                            continue
+                        registrar_resultado(futures[future], processed_source_data, futures)
+                else:
+                    # Las descargas corren en paralelo; los textos descargados se acumulan y se envían
+                    # al analizador en lotes de ANALYZER_LOTE_MAX_FUENTES (el último lote puede ser menor).
+                    descargas = {
+                        executor.submit(_preparar_candidato, url, tema, ejecucion): indice
+                        for indice, url in enumerate(candidate_urls)
+                    }
+                    lotes_en_curso = set()
+                    pendientes_de_lote = []
+                    with ThreadPoolExecutor(max_workers=MAX_ANALISIS_CONCURRENTES, thread_name_prefix="scraper-lote") as executor_lotes:
+                        en_vuelo = set(descargas)
+                        while en_vuelo:
+                            completados, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                            for future in completados:
+                                if future.cancelled():
+                                    continue
+                                if future in lotes_en_curso:
+                                    try:
+                                        for indice, processed_source_data in future.result():
+                                            registrar_resultado(indice, processed_source_data, descargas)
+                                    except Exception as e:
+                                        print(f"⚠️ Scraper: Error procesando lote de fuentes: {e}")
+                                    continue
+                                try:
+                                    preparado = future.result()
+                                except Exception as e:
+                                    print(f"⚠️ Scraper: Error procesando URL {candidate_urls[descargas[future]]}: {e}")
+                                    continue
+                                if preparado:
+                                    pendientes_de_lote.append((descargas[future], *preparado))
+
+                            if ejecucion['parada'].is_set():
+                                if pendientes_de_lote:
+                                    with ejecucion['lock']:
+                                        ejecucion['llamadas_llm_ahorradas'] += len(pendientes_de_lote)
+                                    pendientes_de_lote = []
+                                continue
+                            descargas_restantes = any(f in descargas for f in en_vuelo)
+                            if len(pendientes_de_lote) >= analyzer.ANALYZER_LOTE_MAX_FUENTES or (pendientes_de_lote and not descargas_restantes):
+                                lote_future = executor_lotes.submit(_procesar_lote, pendientes_de_lote, tema, ejecucion)
+                                lotes_en_curso.add(lote_future)
+                                en_vuelo.add(lote_future)
+                                pendientes_de_lote = []
     finally:
-        if driver:
-            try: driver.quit()
-            except Exception as e: print(f"⚠️ Scraper: Error al cerrar el driver de Selenium: {e}")
-            print("✅ Scraper: Driver de Selenium cerrado.")
+        _liberar_urls(ejecucion) # También si algo falla: quien espere sus URLs no se queda bloqueado
+
+    if ejecucion['compartidas_otro_tema']:
+        print(f"💰 Scraper: {ejecucion['compartidas_otro_tema']} candidatos reutilizaron la descarga de otra búsqueda en curso.")
+    if ejecucion['parada'].is_set():
+        print(f"💰 Scraper: Parada temprana evitó {ejecucion['llamadas_llm_ahorradas']} llamadas al LLM ({ejecucion['llamadas_llm']} realizadas) "
+              f"y canceló {ejecucion['candidatos_cancelados']} candidatos sin descargar.")
+    if ejecucion['rechazados_prefiltro']:
+        print(f"🚫 Scraper: El prefiltro local descartó {ejecucion['rechazados_prefiltro']} candidatos sin llamar al LLM.")
+    if ejecucion['llamadas_llm_ahorradas_lote']:
+        print(f"💰 Scraper: El análisis por lotes evitó {ejecucion['llamadas_llm_ahorradas_lote']} llamadas al LLM.")
+    if estadisticas is not None:
+        estadisticas.update({
+            'candidatos': len(candidate_urls),
+            'llamadas_llm': ejecucion['llamadas_llm'],
+            'llamadas_llm_ahorradas': ejecucion['llamadas_llm_ahorradas'],
+            'candidatos_cancelados': ejecucion['candidatos_cancelados'],
+            'llamadas_llm_ahorradas_lote': ejecucion['llamadas_llm_ahorradas_lote'],
+            'rechazados_prefiltro': ejecucion['rechazados_prefiltro'],
+            'compartidas_otro_tema': ejecucion['compartidas_otro_tema'],
+            'parada_temprana_activada': ejecucion['parada'].is_set(),
+        })
+
+    # Restaurar el orden original de DDG para que el desempate por score sea el mismo que en modo secuencial
+    processed_articles = [data for _, data in sorted(processed_articles, key=lambda item: item[0])]
 
 
     # === FILTRAR Y ORDENAR ===
@@ -170,6 +536,7 @@ if __name__ == "__main__":
         min_score_para_analizar=test_min_score,
         num_resultados_a_retornar=test_num_retornar
     )
+    driver_pool.close_pool() # Cerrar los navegadores del fallback, si se llegaron a crear
 
     print("\n--- Resultados del Scraper (TOP Procesado y Guardado) ---")
     if processed_sources:
@@ -0,0 +1,85 @@
+# sqlite_cache.py
+# Plumbing común de las cachés en disco sobre SQLite (fetch_cache y llm_cache).
+# - Conexión perezosa compartida por el proceso, protegida por un lock.
+# - Creación de la tabla e índice de último acceso al abrir la conexión.
+# - Expulsión por TTL y por tamaño total (LRU por último acceso), cada N escrituras.
+# Cada caché conserva su propio esquema, configuración y contadores.
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+
+class CacheSQLite:
+    """
+    Tabla de caché en un archivo SQLite propio. La tabla debe tener las columnas
+    clave (PRIMARY KEY), tamano (bytes comprimidos) y ultimo_acceso, además de la
+    columna de fecha usada para el TTL (columna_ttl).
+    """
+
+    def __init__(self, nombre: str, ruta: Callable[[], str], tabla: str, ddl: str, columna_ttl: str, expulsar_cada: int = 50):
+        self.nombre = nombre # Prefijo de los logs
+        self._ruta = ruta # Se lee al abrir la conexión, para respetar cambios de configuración
+        self.tabla = tabla
+        self._ddl = ddl
+        self._columna_ttl = columna_ttl
+        self._expulsar_cada = expulsar_cada
+        self._conn: Optional[sqlite3.Connection] = None
+        self._escrituras_desde_expulsion = 0
+        self.lock = threading.Lock()
+
+    def conexion(self) -> sqlite3.Connection:
+        """Conexión compartida a la DB de la caché (llamar con self.lock tomado). Crea la tabla si no existe."""
+        if self._conn is None:
+            conn = sqlite3.connect(self._ruta(), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(self._ddl)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.tabla}_ultimo_acceso ON {self.tabla} (ultimo_acceso)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def cerrar(self):
+        """Cierra la conexión; la siguiente operación la vuelve a abrir (p. ej. con otra ruta)."""
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._escrituras_desde_expulsion = 0
+
+    def registrar_escritura(self) -> bool:
+        """Cuenta una escritura (llamar con self.lock tomado). True si toca ejecutar la expulsión."""
+        self._escrituras_desde_expulsion += 1
+        return self._escrituras_desde_expulsion >= self._expulsar_cada
+
+    def expulsar(self, ttl_seg: int, max_mb: int) -> int:
+        """
+        Elimina las entradas caducadas (TTL) y, si la caché supera max_mb, las menos usadas
+        recientemente. Retorna el número de entradas expulsadas (0 si hubo un error).
+        """
+        limite_bytes = max_mb * 1024 * 1024
+        try:
+            with self.lock:
+                conn = self.conexion()
+                self._escrituras_desde_expulsion = 0
+                cursor = conn.execute(f'DELETE FROM {self.tabla} WHERE {self._columna_ttl} < ?', (time.time() - ttl_seg,))
+                expulsadas = cursor.rowcount
+                total = conn.execute(f'SELECT COALESCE(SUM(tamano), 0) FROM {self.tabla}').fetchone()[0]
+                if total > limite_bytes:
+                    # Recorrer de la menos a la más recientemente usada hasta bajar del límite
+                    claves_a_borrar = []
+                    for clave, tamano in conn.execute(f'SELECT clave, tamano FROM {self.tabla} ORDER BY ultimo_acceso ASC'):
+                        if total <= limite_bytes:
+                            break
+                        claves_a_borrar.append((clave,))
+                        total -= tamano
+                    conn.executemany(f'DELETE FROM {self.tabla} WHERE clave = ?', claves_a_borrar)
+                    expulsadas += len(claves_a_borrar)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ {self.nombre}: Error durante la expulsión: {str(e)}")
+            return 0
+        if expulsadas:
+            print(f"🧹 {self.nombre}: {expulsadas} entradas expulsadas.")
+        return expulsadas
@@ -0,0 +1,141 @@
+# stage_graph.py
+# Ejecución de un pipeline como grafo de etapas (DAG) con entradas y salidas explícitas.
+# - Cada etapa declara las claves del contexto que necesita (entradas) y la que produce (salida).
+# - Una etapa arranca en cuanto están disponibles todas sus entradas: las independientes se solapan
+#   (p. ej. la búsqueda especulativa de imágenes mientras la IA redacta el artículo).
+# - Cada etapa se cronometra (inicio relativo y duración) para ver el camino crítico.
+# - Una etapa aborta el pipeline lanzando EtapaFallida (o cualquier excepción): se cancelan las demás.
+#   Las etapas opcionales que fallan solo dejan su salida a None.
+# - Reanudación: las etapas con salida restaurada (p. ej. de un checkpoint) no se vuelven a ejecutar.
+
+import asyncio
+import inspect
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+
+class EtapaFallida(Exception):
+    """El pipeline no puede continuar (p. ej. sin fuentes útiles). El mensaje se muestra al usuario."""
+
+    def __init__(self, mensaje: str, etapa: Optional[str] = None):
+        super().__init__(mensaje)
+        self.etapa = etapa
+
+
+class Etapa:
+    """
+    Nodo del grafo. `funcion` es una corrutina que recibe las entradas como argumentos con nombre
+    y retorna el valor que se guarda en el contexto bajo `salida` (por defecto, el nombre de la etapa).
+    """
+
+    def __init__(self, nombre: str, funcion: Callable[..., Awaitable[Any]], entradas: Iterable[str] = (),
+                 salida: Optional[str] = None, opcional: bool = False):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.entradas = tuple(entradas)
+        self.salida = salida or nombre
+        self.opcional = opcional
+
+
+def _validar(etapas: List[Etapa], contexto: Dict[str, Any]):
+    """Comprueba que cada entrada la produce una sola etapa (o ya está en el contexto) y que no hay ciclos."""
+    productores = {}
+    for etapa in etapas:
+        if etapa.salida in productores or etapa.salida in contexto:
+            raise ValueError(f"La salida '{etapa.salida}' se produce más de una vez.")
+        productores[etapa.salida] = etapa
+    for etapa in etapas:
+        for entrada in etapa.entradas:
+            if entrada not in productores and entrada not in contexto:
+                raise ValueError(f"La entrada '{entrada}' de la etapa '{etapa.nombre}' no la produce ninguna etapa.")
+    # Orden topológico (Kahn) solo para detectar ciclos
+    disponibles = set(contexto)
+    pendientes = list(etapas)
+    while pendientes:
+        listas = [e for e in pendientes if all(entrada in disponibles for entrada in e.entradas)]
+        if not listas:
+            raise ValueError(f"Ciclo entre las etapas: {', '.join(e.nombre for e in pendientes)}.")
+        for etapa in listas:
+            disponibles.add(etapa.salida)
+            pendientes.remove(etapa)
+
+
+async def ejecutar(etapas: List[Etapa], contexto: Dict[str, Any], tiempos: Optional[Dict[str, Dict[str, float]]] = None,
+                   al_iniciar: Optional[Callable[[str], None]] = None,
+                   al_terminar: Optional[Callable[[str, Any], Any]] = None,
+                   restauradas: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Ejecuta las etapas respetando sus dependencias, con las independientes en paralelo.
+    `contexto` trae las entradas iniciales y se completa con las salidas de cada etapa (se retorna).
+    Si se pasa `tiempos`, se rellena con {etapa: {'inicio': s desde el arranque, 'duracion': s}}.
+    `al_iniciar(nombre)` y `al_terminar(nombre, salida)` se llaman al arrancar y al completar cada etapa
+    (p. ej. para emitir progreso o guardar un checkpoint); al_terminar puede ser una corrutina.
+    `restauradas` ({etapa: salida}) son etapas ya completadas en una ejecución anterior: no se ejecutan
+    y su salida entra directamente en el contexto.
+    Lanza EtapaFallida (u otra excepción) de la primera etapa obligatoria que falle.
+    """
+    _validar(etapas, contexto)
+    tiempos = tiempos if tiempos is not None else {}
+    origen = time.monotonic()
+    pendientes = []
+    for etapa in etapas:
+        if restauradas and etapa.nombre in restauradas:
+            contexto[etapa.salida] = restauradas[etapa.nombre]
+            tiempos[etapa.nombre] = {'inicio': 0.0, 'duracion': 0.0, 'restaurada': True}
+        else:
+            pendientes.append(etapa)
+    en_curso: Dict[asyncio.Task, Etapa] = {}
+
+    async def correr(etapa: Etapa):
+        inicio = time.monotonic()
+        try:
+            return await etapa.funcion(**{entrada: contexto[entrada] for entrada in etapa.entradas})
+        finally:
+            tiempos[etapa.nombre] = {'inicio': round(inicio - origen, 3), 'duracion': round(time.monotonic() - inicio, 3)}
+
+    try:
+        while pendientes or en_curso:
+            for etapa in [e for e in pendientes if all(entrada in contexto for entrada in e.entradas)]:
+                pendientes.remove(etapa)
+                if al_iniciar:
+                    al_iniciar(etapa.nombre)
+                en_curso[asyncio.create_task(correr(etapa))] = etapa
+
+            terminadas, _ = await asyncio.wait(en_curso, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in terminadas:
+                etapa = en_curso.pop(tarea)
+                try:
+                    contexto[etapa.salida] = tarea.result()
+                    if al_terminar:
+                        resultado = al_terminar(etapa.nombre, contexto[etapa.salida])
+                        if inspect.isawaitable(resultado):
+                            await resultado
+                except EtapaFallida as e:
+                    if not etapa.opcional:
+                        e.etapa = e.etapa or etapa.nombre
+                        raise
+                    contexto[etapa.salida] = None
+                except Exception as e:
+                    if not etapa.opcional:
+                        raise
+                    print(f"⚠️ PIPELINE: La etapa opcional '{etapa.nombre}' falló ({str(e)}); se continúa sin ella.")
+                    contexto[etapa.salida] = None
+    finally:
+        for tarea in en_curso:
+            tarea.cancel()
+        if en_curso:
+            await asyncio.gather(*en_curso, return_exceptions=True)
+    return contexto
+
+
+def resumen_tiempos(tiempos: Dict[str, Dict[str, float]]) -> str:
+    """Línea legible con la duración de cada etapa (en orden de inicio) y el total."""
+    if not tiempos:
+        return "sin etapas"
+    orden = sorted(tiempos.items(), key=lambda item: item[1]['inicio'])
+    total = max(t['inicio'] + t['duracion'] for _, t in orden)
+    etapas = " | ".join(
+        f"{nombre} (checkpoint)" if t.get('restaurada') else f"{nombre} {t['duracion']:.1f}s (+{t['inicio']:.1f})"
+        for nombre, t in orden
+    )
+    return f"{etapas} | total {total:.1f}s"
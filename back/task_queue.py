@@ -0,0 +1,319 @@
+# task_queue.py
+# Cola de generación persistente sobre la tabla generacion_tareas.
+# - POST /generate solo encola (encolar_generacion) y responde al momento con el ID de la tarea.
+# - Un pool de workers asíncronos (en el event loop de la API) reclama las tareas con un lease,
+#   ejecuta pipeline.run_full_generation_pipeline y registra estado, artículo o mensaje de error.
+# - Mientras trabaja, el worker renueva el lease. Si el proceso muere, el lease caduca y la tarea
+#   la reclama otro worker (hasta TAREAS_MAX_INTENTOS); al apagar la API se devuelve a 'pendiente'.
+# - GET /tasks/{id} consulta el estado (database.get_tarea); POST /tasks/{id}/retry reencola una tarea fallida.
+# - Cada etapa del pipeline deja un checkpoint: los reintentos retoman desde la última etapa completada.
+#   Se borran al completarse la tarea; los de tareas en 'error' se purgan al arrancar tras TAREAS_CHECKPOINTS_RETENCION_DIAS.
+# - Lotes (POST /generate/batch): una tarea por tema con un lote_id común; la concurrencia global la marcan
+#   los workers (no el número de temas) y el progreso se consulta por lote.
+# - Modo worker multiproceso (ejecutar_worker_procesos): los pipelines corren fuera del proceso de la API,
+#   en la misma máquina (SQLite en WAL no admite varias máquinas sobre el mismo archivo).
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import database
+import llm_limiter
+import pipeline
+from models import GenerateRequestModel
+
+# === Configuración (variables de entorno) ===
+# Procesos de `python -m pipeline worker` en esta máquina (0 = no se usa). La API y el worker lo leen para
+# repartirse la cuota del LLM; con el worker en marcha, la API no ejecuta generaciones salvo TAREAS_WORKERS explícito.
+TAREAS_WORKER_PROCESOS = int(os.getenv("TAREAS_WORKER_PROCESOS", "0"))
+TAREAS_WORKERS = int(os.getenv("TAREAS_WORKERS", "0" if TAREAS_WORKER_PROCESOS else "8")) # Generaciones simultáneas en el proceso de la API (0 = solo el worker)
+TAREAS_LEASE_SEG = float(os.getenv("TAREAS_LEASE_SEG", "120")) # Sin renovar en este tiempo, otro worker puede reclamarla
+TAREAS_MAX_INTENTOS = int(os.getenv("TAREAS_MAX_INTENTOS", "3")) # Reclamaciones antes de dar la tarea por fallida
+TAREAS_INTERVALO_SONDEO_SEG = float(os.getenv("TAREAS_INTERVALO_SONDEO_SEG", "5")) # Sondeo de la DB si nadie avisa
+TAREAS_CHECKPOINTS_RETENCION_DIAS = float(os.getenv("TAREAS_CHECKPOINTS_RETENCION_DIAS", "7")) # Checkpoints de tareas fallidas sin reintentar (0 = no purgar)
+
+_workers: List[asyncio.Task] = []
+_hay_tareas: Optional[asyncio.Event] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_id_proceso = uuid.uuid4().hex[:8]
+
+
+def _avisar_workers():
+    """Despierta a los workers en espera (seguro también desde otros hilos)."""
+    if _loop is not None and _hay_tareas is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_hay_tareas.set)
+
+
+def encolar_generacion(generate_request: GenerateRequestModel) -> Optional[int]:
+    """Guarda la solicitud como tarea 'pendiente' y avisa a los workers. Retorna el ID de la tarea (None si falla)."""
+    tarea_id = database.crear_tarea_generacion(generate_request.tema, generate_request.model_dump())
+    if tarea_id is not None:
+        print(f"📥 TAREAS: Tarea {tarea_id} encolada para tema '{generate_request.tema}'.")
+        _avisar_workers()
+    return tarea_id
+
+
+def _estado_final(article_id: Optional[int]):
+    """(estado, mensaje_error) con el que se cierra una tarea según el resultado del pipeline."""
+    if article_id is not None:
+        return 'completado', None
+    return 'error', "Fallo en el pipeline de generación."
+
+
+def _registrar_resultado(tarea_id: int, worker_id: str, estado: str, article_id: Optional[int], mensaje_error: Optional[str]):
+    """Cierra la tarea en la DB (si el worker aún la tiene reclamada) y lo anota en consola."""
+    if database.finalizar_tarea(tarea_id, worker_id, estado, article_id, mensaje_error):
+        if estado == 'completado':
+            database.borrar_checkpoints(tarea_id) # Si falla, se conservan para reintentar desde ellos
+        icono = "✅" if estado == 'completado' else "❌"
+        print(f"{icono} TAREAS: Tarea {tarea_id} {estado}" + (f" (artículo ID {article_id})." if article_id else "."))
+    else:
+        print(f"⚠️ TAREAS: La tarea {tarea_id} ya no pertenece a {worker_id}; se descarta su resultado.")
+
+
+def purgar_checkpoints():
+    """Borra los checkpoints de las tareas fallidas que nadie reintentó en TAREAS_CHECKPOINTS_RETENCION_DIAS días."""
+    if TAREAS_CHECKPOINTS_RETENCION_DIAS <= 0:
+        return
+    borrados = database.purgar_checkpoints_antiguos(TAREAS_CHECKPOINTS_RETENCION_DIAS)
+    if borrados:
+        print(f"🧹 TAREAS: {borrados} checkpoints de tareas fallidas purgados (más de {TAREAS_CHECKPOINTS_RETENCION_DIAS:g} días).")
+
+
+def reintentar_tarea(tarea_id: int) -> Optional[bool]:
+    """
+    Reencola una tarea en 'error'; retomará desde sus checkpoints.
+    Retorna True si se reencoló, False si no estaba en 'error' y None si no existe.
+    """
+    reencolada = database.reintentar_tarea(tarea_id)
+    if not reencolada:
+        return reencolada
+    print(f"🔁 TAREAS: Tarea {tarea_id} reencolada.")
+    _avisar_workers()
+    return True
+
+
+def encolar_lote(solicitudes: List[GenerateRequestModel]) -> Tuple[Optional[str], List[int]]:
+    """Encola una tarea por solicitud bajo un mismo lote_id. Retorna (lote_id, IDs de las tareas); (None, []) si falla."""
+    lote_id = uuid.uuid4().hex[:12]
+    ids = database.crear_lote_tareas(lote_id, [solicitud.model_dump() for solicitud in solicitudes])
+    if not ids:
+        return None, []
+    print(f"📥 TAREAS: Lote {lote_id} encolado con {len(ids)} temas.")
+    _avisar_workers()
+    return lote_id, ids
+
+
+def estado_lote(lote_id: str) -> Optional[Dict[str, Any]]:
+    """Progreso de un lote: total, tareas por estado, si ha terminado y el detalle de cada tarea (None si no existe)."""
+    tareas = database.get_tareas_lote(lote_id)
+    if not tareas:
+        return None
+    por_estado = Counter(tarea['estado'] for tarea in tareas)
+    return {
+        'lote_id': lote_id,
+        'total': len(tareas),
+        'por_estado': {estado: por_estado.get(estado, 0) for estado in ('pendiente', 'en_progreso', 'completado', 'error')},
+        'terminado': por_estado.get('completado', 0) + por_estado.get('error', 0) == len(tareas),
+        'tareas': tareas,
+    }
+
+
+async def _mantener_lease(tarea_id: int, worker_id: str):
+    """Renueva el lease de la tarea cada tercio de TAREAS_LEASE_SEG hasta que se cancele."""
+    while True:
+        await asyncio.sleep(TAREAS_LEASE_SEG / 3)
+        if not await asyncio.to_thread(database.renovar_lease, tarea_id, worker_id, TAREAS_LEASE_SEG):
+            print(f"⚠️ TAREAS: {worker_id} perdió el lease de la tarea {tarea_id}.")
+            return
+
+
+async def _ejecutar_tarea(tarea: dict, worker_id: str):
+    """Ejecuta el pipeline de una tarea reclamada y registra el resultado."""
+    tarea_id = tarea['id']
+    print(f"🏗️ TAREAS: {worker_id} inicia la tarea {tarea_id} ('{tarea['tema']}', intento {tarea['intentos']}).")
+    lease = asyncio.create_task(_mantener_lease(tarea_id, worker_id))
+    try:
+        article_id = await pipeline.run_full_generation_pipeline(GenerateRequestModel(**tarea['parametros']), tarea_id)
+        estado, mensaje_error = _estado_final(article_id)
+    except asyncio.CancelledError:
+        # Apagado de la API: la tarea vuelve a la cola para el siguiente arranque
+        await asyncio.shield(asyncio.to_thread(database.liberar_tarea, tarea_id, worker_id))
+        raise
+    except Exception as e:
+        print(f"❌ TAREAS: Error no controlado en la tarea {tarea_id}: {str(e)}")
+        article_id, estado, mensaje_error = None, 'error', str(e)
+    finally:
+        lease.cancel()
+
+    await asyncio.to_thread(_registrar_resultado, tarea_id, worker_id, estado, article_id, mensaje_error)
+
+
+async def _worker(numero: int):
+    """Bucle de un worker: reclama la siguiente tarea o espera un aviso (o el intervalo de sondeo)."""
+    worker_id = f"{_id_proceso}-{numero}"
+    while True:
+        # Limpiar el aviso antes de consultar: un encolado posterior a la consulta no se pierde
+        _hay_tareas.clear()
+        tarea = await asyncio.to_thread(database.reclamar_tarea, worker_id, TAREAS_LEASE_SEG, TAREAS_MAX_INTENTOS)
+        if tarea is None:
+            try:
+                await asyncio.wait_for(_hay_tareas.wait(), TAREAS_INTERVALO_SONDEO_SEG)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await _ejecutar_tarea(tarea, worker_id)
+
+
+def _partes_cuota(procesos_worker: int, workers_api: int) -> int:
+    """
+    Partes en que se divide la cuota del LLM de la máquina: una por proceso del worker (un pipeline cada uno)
+    y las del proceso de la API, que tiene un solo limitador para sus workers y las llamadas interactivas.
+    """
+    return procesos_worker + max(1, workers_api)
+
+
+def iniciar_workers(num_workers: int = TAREAS_WORKERS):
+    """Arranca los workers en el event loop actual (llamar desde el startup de la API)."""
+    global _hay_tareas, _loop
+    if _workers:
+        return
+    purgar_checkpoints()
+    if TAREAS_WORKER_PROCESOS:
+        # La API se queda con la parte de sus workers (o una, para copilot/Canvas) y el resto es del worker
+        llm_limiter.repartir_limites(_partes_cuota(TAREAS_WORKER_PROCESOS, num_workers), max(1, num_workers))
+    if num_workers <= 0:
+        print("ℹ️ TAREAS: Sin workers en la API (TAREAS_WORKERS=0); las tareas las ejecuta `python -m pipeline worker`.")
+        return
+    _loop = asyncio.get_running_loop()
+    _hay_tareas = asyncio.Event()
+    for numero in range(num_workers):
+        _workers.append(_loop.create_task(_worker(numero)))
+    print(f"✅ TAREAS: {len(_workers)} workers de generación en marcha (lease {TAREAS_LEASE_SEG:.0f}s).")
+
+
+async def detener_workers():
+    """Cancela los workers; las tareas en curso vuelven a 'pendiente' (llamar desde el shutdown de la API)."""
+    global _loop
+    for tarea in _workers:
+        tarea.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _loop = None
+
+
+# === Modo worker multiproceso (python -m pipeline worker --concurrency N) ===
+# Un proceso supervisor reclama tareas de la DB y ejecuta cada pipeline en un proceso hijo:
+# BeautifulSoup, markdown y Selenium dejan de competir por el GIL con la API.
+# Solo en la misma máquina que la API: SQLite en WAL necesita memoria compartida entre procesos y no
+# funciona sobre un sistema de archivos de red. El lease evita duplicados si hay varios workers.
+# Con TAREAS_WORKER_PROCESOS=N (el mismo valor para la API y el worker) la API no ejecuta generaciones
+# (TAREAS_WORKERS pasa a 0 por defecto) y la cuota del LLM se reparte entre los N procesos y la API.
+TAREAS_PIPELINES_POR_PROCESO = int(os.getenv("TAREAS_PIPELINES_POR_PROCESO", "20")) # Se recicla el proceso hijo (drivers, memoria)
+
+
+def _iniciar_proceso_hijo(partes: int):
+    """Initializer de cada proceso del pool: el supervisor gestiona Ctrl+C y el proceso toma su parte de la cuota del LLM."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    llm_limiter.repartir_limites(partes)
+
+
+def _ejecutar_en_proceso(tarea_id: int, parametros: dict) -> Optional[int]:
+    """Ejecuta un pipeline completo en el proceso hijo. Retorna el ID del artículo o None."""
+    try:
+        return asyncio.run(pipeline.run_full_generation_pipeline(GenerateRequestModel(**parametros), tarea_id))
+    finally:
+        database.close_connections()
+
+
+def _registrar_terminada(resultado, en_curso: dict, worker_id: str):
+    """Registra en la DB un pipeline terminado en el pool: (tarea, article_id, excepción o None)."""
+    tarea, article_id, error = resultado
+    en_curso.pop(tarea['id'], None)
+    if error is None:
+        estado, mensaje_error = _estado_final(article_id)
+    else:
+        print(f"❌ TAREAS: Error no controlado en la tarea {tarea['id']}: {str(error)}")
+        estado, mensaje_error = 'error', str(error)
+    _registrar_resultado(tarea['id'], worker_id, estado, article_id, mensaje_error)
+
+
+def _vaciar_terminadas(terminadas: queue.Queue, en_curso: dict, worker_id: str):
+    while True:
+        try:
+            _registrar_terminada(terminadas.get_nowait(), en_curso, worker_id)
+        except queue.Empty:
+            return
+
+
+def ejecutar_worker_procesos(concurrencia: int) -> int:
+    """
+    Bucle del worker multiproceso: mantiene hasta `concurrencia` pipelines en un pool de procesos,
+    renueva sus leases y registra los resultados. Con SIGINT/SIGTERM termina los procesos hijos y
+    devuelve a 'pendiente' las tareas en curso. Retorna el código de salida del proceso.
+    """
+    concurrencia = max(1, concurrencia)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    if TAREAS_WORKER_PROCESOS and TAREAS_WORKER_PROCESOS != concurrencia:
+        print(f"⚠️ TAREAS: --concurrency {concurrencia} no coincide con TAREAS_WORKER_PROCESOS={TAREAS_WORKER_PROCESOS}; "
+              f"la API y el worker se repartirán mal la cuota del LLM.")
+    # Cuota del LLM: una parte por proceso hijo más las de la API (sus workers o, si no tiene, sus llamadas interactivas)
+    partes = _partes_cuota(concurrencia, TAREAS_WORKERS)
+    parar = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: parar.set())
+    signal.signal(signal.SIGINT, lambda *_: parar.set())
+
+    database.inicializar_db()
+    purgar_checkpoints()
+    # spawn: los hijos no heredan conexiones SQLite, hilos ni drivers del supervisor
+    pool = multiprocessing.get_context("spawn").Pool(
+        concurrencia, initializer=_iniciar_proceso_hijo, initargs=(partes,),
+        maxtasksperchild=TAREAS_PIPELINES_POR_PROCESO or None
+    )
+    terminadas = queue.Queue() # (tarea, article_id, excepción) desde los callbacks del pool
+    en_curso = {} # tarea_id -> tarea
+    ultima_renovacion = time.monotonic()
+    print(f"✅ TAREAS: Worker {worker_id} en marcha con {concurrencia} procesos (1/{partes} de la cuota del LLM cada uno).")
+    try:
+        while not parar.is_set():
+            while len(en_curso) < concurrencia:
+                tarea = database.reclamar_tarea(worker_id, TAREAS_LEASE_SEG, TAREAS_MAX_INTENTOS)
+                if tarea is None:
+                    break
+                print(f"🏗️ TAREAS: {worker_id} inicia la tarea {tarea['id']} ('{tarea['tema']}', intento {tarea['intentos']}).")
+                en_curso[tarea['id']] = tarea
+                pool.apply_async(
+                    _ejecutar_en_proceso, (tarea['id'], tarea['parametros']),
+                    callback=lambda article_id, tarea=tarea: terminadas.put((tarea, article_id, None)),
+                    error_callback=lambda e, tarea=tarea: terminadas.put((tarea, None, e)),
+                )
+
+            # Esperar a que termine algún pipeline o a que toque sondear de nuevo la cola
+            try:
+                _registrar_terminada(terminadas.get(timeout=TAREAS_INTERVALO_SONDEO_SEG), en_curso, worker_id)
+            except queue.Empty:
+                pass
+            _vaciar_terminadas(terminadas, en_curso, worker_id)
+
+            if time.monotonic() - ultima_renovacion >= TAREAS_LEASE_SEG / 3:
+                ultima_renovacion = time.monotonic()
+                for tarea_id in list(en_curso):
+                    if not database.renovar_lease(tarea_id, worker_id, TAREAS_LEASE_SEG):
+                        print(f"⚠️ TAREAS: {worker_id} perdió el lease de la tarea {tarea_id}.")
+    finally:
+        print(f"--- TAREAS: Deteniendo worker {worker_id} ({len(en_curso)} tareas vuelven a la cola) ---")
+        pool.terminate()
+        pool.join()
+        _vaciar_terminadas(terminadas, en_curso, worker_id) # Las que acabaron justo antes de terminar el pool
+        for tarea_id in en_curso:
+            database.liberar_tarea(tarea_id, worker_id)
+        database.close_connections()
+    return 0
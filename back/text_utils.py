@@ -0,0 +1,41 @@
+# text_utils.py
+# Utilidades de texto locales (sin red ni LLM): normalización, tokenización y stopwords.
+# Las usan el prefiltro de fuentes (prefilter.py) y otras heurísticas baratas.
+
+import re
+import unicodedata
+from typing import List
+
+# Stopwords mínimas para la detección de idioma y para ignorar palabras vacías en la relevancia
+STOPWORDS_ES = frozenset("""
+de la que el en y a los se del las un por con no una su para es al lo como mas o pero sus le ha me si sin
+sobre este ya entre cuando todo esta ser son dos tambien fue habia era muy anos hasta desde mi porque
+solo han yo hay vez puede todos asi nos ni parte tiene uno donde bien tiempo mismo ese ahora cada
+""".split())
+STOPWORDS_EN = frozenset("""
+the of and to in is that for it as was with be by on not he this are or his from at which but have an
+they you were her she there been one all would their we him has had more its will can who when what
+""".split())
+STOPWORDS = STOPWORDS_ES | STOPWORDS_EN
+
+_RE_PALABRA = re.compile(r"\w+", re.UNICODE)
+_RE_FRASES = re.compile(r"(?<=[.!?])\s+")
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes/diacríticos (para comparar 'Inteligencia' con 'inteligéncia')."""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto: str, quitar_stopwords: bool = False) -> List[str]:
+    """Divide un texto normalizado en palabras (opcionalmente sin stopwords ni números sueltos)."""
+    tokens = _RE_PALABRA.findall(normalizar(texto))
+    if quitar_stopwords:
+        tokens = [t for t in tokens if t not in STOPWORDS and not t.isdigit() and len(t) > 1]
+    return tokens
+
+
+def dividir_frases(texto: str) -> List[str]:
+    """Divide un texto en frases por signos de puntuación final. Descarta frases vacías."""
+    return [frase.strip() for frase in _RE_FRASES.split(texto) if frase.strip()]
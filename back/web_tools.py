@@ -3,18 +3,17 @@
 
 # === Configuración de Unsplash API ===
 import os
+import re
+from urllib.parse import parse_qs, urljoin, urlparse
 
+import fetch_cache
+import http_client
 import requests
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-# No importamos EC ya que no se usa en las funciones movidas, aunque estaba en el original.
-from webdriver_manager.chrome import ChromeDriverManager
 
-# import urllib.parse # No se usa directamente aquí, se usa en scraper para quote_plus
+# Selenium y webdriver-manager se importan de forma perezosa en setup_driver/get_final_url:
+# solo se necesitan para el fallback de redirecciones que requieren JavaScript.
 
 
 load_dotenv()
@@ -29,6 +28,15 @@ def setup_driver():
     Configura y retorna un driver de Selenium optimizado para uso headless.
     Retorna el driver si tiene éxito, None si falla.
     """
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+    except ImportError as e:
+        print(f"⚠️ Selenium/webdriver-manager no disponibles: {str(e)}")
+        return None
+
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--disable-gpu")
@@ -56,6 +64,7 @@ def setup_driver():
 def get_final_url(ddg_redirect_url, driver):
     """
     Resuelve redirecciones de DuckDuckGo usando Selenium para obtener la URL final.
+    Es el fallback de resolve_redirect_url para redirecciones que requieren JavaScript.
     Requiere un driver de Selenium activo.
     Retorna la URL final o None si falla.
     """
@@ -64,6 +73,8 @@ def get_final_url(ddg_redirect_url, driver):
         return None # No se puede resolver sin driver
 
     try:
+        from selenium.webdriver.support.ui import WebDriverWait
+
         # Navegar a la URL que genera la redirección de DDG
         driver.get(ddg_redirect_url)
         # Espera hasta que la URL cambie, indicando la redirección ha terminado
@@ -85,6 +96,55 @@ def get_final_url(ddg_redirect_url, driver):
         return None # Falló la resolución de la URL
 
 
+def _es_url_duckduckgo(url):
+    """Indica si la URL pertenece a DuckDuckGo (es decir, aún no se resolvió la redirección)."""
+    host = urlparse(url).netloc.lower()
+    return host == "duckduckgo.com" or host.endswith(".duckduckgo.com")
+
+
+def resolve_redirect_url(url, timeout=10):
+    """
+    Resuelve una URL de resultado de DuckDuckGo SIN navegador.
+
+    1. Si es un enlace de redirección de DDG (/l/?uddg=...), decodifica el parámetro 'uddg'.
+    2. Si no, sigue las redirecciones HTTP 30x con requests y, si la respuesta es HTML,
+       una posible redirección <meta http-equiv="refresh">.
+
+    Retorna la URL final, o None si no se pudo resolver (p. ej. la redirección
+    necesita JavaScript); en ese caso el llamador puede recurrir a get_final_url con Selenium.
+    """
+    if url.startswith("//"):
+        url = "https:" + url
+
+    parsed = urlparse(url)
+    if _es_url_duckduckgo(url):
+        destino = parse_qs(parsed.query).get('uddg')
+        if destino and destino[0].startswith(("http://", "https://")):
+            return destino[0] # parse_qs ya decodifica el valor
+
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    try:
+        # stream=True: solo leemos las cabeceras y, como mucho, el inicio del HTML
+        with http_client.get(url, headers=headers, timeout=timeout, allow_redirects=True, stream=True) as response:
+            final_url = response.url
+            if 'html' in response.headers.get('Content-Type', '') and response.ok:
+                inicio_html = next(response.iter_content(chunk_size=16384, decode_unicode=False), b'')
+                meta_refresh = re.search(
+                    rb'<meta[^>]+http-equiv=["\']?refresh["\']?[^>]*content=["\']?\s*\d*\s*;\s*url=([^"\'>\s]+)',
+                    inicio_html, re.IGNORECASE
+                )
+                if meta_refresh:
+                    final_url = urljoin(final_url, meta_refresh.group(1).decode('utf-8', errors='ignore'))
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ Error HTTP resolviendo redirección para {url[:60]}...: {str(e)}")
+        return None
+
+    # Si seguimos en DDG, la redirección depende de JavaScript: no resuelta
+    if not final_url or _es_url_duckduckgo(final_url):
+        return None
+    return final_url
+
+
 def extract_article_content(soup):
     """
     Extrae el contenido principal del artículo de un objeto BeautifulSoup.
@@ -160,34 +220,66 @@ def extract_article_content(soup):
     return None
 
 
+def _extraer_texto_de_html(html):
+    """
+    Extrae y limpia el texto principal a partir del HTML crudo (bytes o str).
+    Retorna el texto o None si el contenido es insuficiente o sospechoso.
+    """
+    # Usar el contenido crudo y dejar que BeautifulSoup detecte el encoding
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Usamos la función de extracción mejorada
+    content = extract_article_content(soup)
+
+    # Umbral mínimo de texto extraído y verificación de contenido no deseado (ej: mensajes de cookie)
+    if not content or len(content) < 200 or "aceptar cookies" in content.lower() or "suscribete" in content.lower()[:200]: # Aumentado umbral, añadido filtro básico
+         # print(f"⚠️ Contenido extraído muy corto ({len(content) if content else 0} chars) o sospechoso...") # Depuración, opcional
+         return None
+
+    # Limpieza final de texto (ej: eliminar espacios excesivos)
+    return ' '.join(content.split()).strip() # Reemplazar múltiples espacios/saltos por uno solo
+
+
 def fetch_and_extract_content(url, timeout=15):
     """
     Descarga el HTML de una URL y extrae el contenido principal del artículo.
     Función de conveniencia para usar en otros módulos.
+    Usa la caché en disco (fetch_cache): las entradas frescas se sirven sin red y las
+    antiguas se revalidan con un GET condicional (ETag / Last-Modified).
     Retorna el texto extraído o None si falla o el contenido es insuficiente.
     """
     try:
-        # Headers más amigables
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'} # User-Agent más común
-
-        response = requests.get(url, headers=headers, timeout=timeout)
-        response.raise_for_status() # Lanza excepción para errores HTTP (4xx, 5xx)
+        entrada_cache = fetch_cache.obtener(url)
+        if entrada_cache and entrada_cache['fresca']:
+            return entrada_cache['texto']
 
-        # Usar response.content y especificar encoding si es posible
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # Headers más amigables (User-Agent común) + cabeceras condicionales si hay copia en caché
+        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+        headers.update(fetch_cache.cabeceras_condicionales(entrada_cache))
 
-        # Usamos la función de extracción mejorada
-        content = extract_article_content(soup)
+        response = http_client.get(url, headers=headers, timeout=timeout)
 
-        # Umbral mínimo de texto extraído y verificación de contenido no deseado (ej: mensajes de cookie)
-        if not content or len(content) < 200 or "aceptar cookies" in content.lower() or "suscribete" in content.lower()[:200]: # Aumentado umbral, añadido filtro básico
-             # print(f"⚠️ Contenido extraído muy corto ({len(content) if content else 0} chars) o sospechoso de {url[:60]}...") # Depuración, opcional
-             return None
+        if response.status_code == 304 and entrada_cache:
+            # No modificada: la copia en caché sigue siendo válida
+            fetch_cache.marcar_revalidada(url)
+            return entrada_cache['texto']
 
-        # Limpieza final de texto (ej: eliminar espacios excesivos)
-        content = ' '.join(content.split()).strip() # Reemplazar múltiples espacios/saltos por uno solo
+        response.raise_for_status() # Lanza excepción para errores HTTP (4xx, 5xx)
+        if entrada_cache:
+            fetch_cache.registrar_fallo() # Estaba en caché pero cambió: descarga completa
+
+        content = _extraer_texto_de_html(response.content)
+
+        # Guardar también los resultados sin contenido útil, para no volver a descargarlos
+        fetch_cache.guardar(
+            url,
+            response.content,
+            content,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
 
-        # print(f"✅ Contenido extraído y limpio de {url[:60]}... ({len(content)} chars)") # Depuración, opcional
+        # print(f"✅ Contenido extraído y limpio de {url[:60]}... ({len(content) if content else 0} chars)") # Depuración, opcional
         return content
 
     except requests.exceptions.RequestException as e:
@@ -233,7 +325,7 @@ def find_free_images(query, num_results=3):
     response = None # Inicializar response a None
 
     try:
-        response = requests.get(search_url, headers=headers, params=params, timeout=10)
+        response = http_client.get(search_url, headers=headers, params=params, timeout=10)
         response.raise_for_status() # Lanza excepción para errores HTTP (4xx, 5xx)
 
         data = response.json()
@@ -1,10 +1,12 @@
 import React, { useState, useEffect } from 'react';
 import { Send, Settings } from 'lucide-react';
 import { apiService } from '../services/api';
-import { ConfigBase, GenerateRequestModel } from '../types/api';
+import { ConfigBase, GenerateRequestModel, GenerationTask } from '../types/api';
 import LoadingSpinner from './LoadingSpinner';
 import Alert from './Alert';
 
+const TASK_POLL_INTERVAL_MS = 3000;
+
 interface GenerateArticleProps {
   onArticleGenerated: () => void;
 }
@@ -50,6 +52,16 @@ const GenerateArticle: React.FC<GenerateArticleProps> = ({ onArticleGenerated })
     }));
   };
 
+  const waitForTask = async (taskId: number): Promise<GenerationTask> => {
+    while (true) {
+      const task = await apiService.getTask(taskId);
+      if (task.estado === 'completado' || task.estado === 'error') {
+        return task;
+      }
+      await new Promise(resolve => setTimeout(resolve, TASK_POLL_INTERVAL_MS));
+    }
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     
@@ -62,13 +74,20 @@ const GenerateArticle: React.FC<GenerateArticleProps> = ({ onArticleGenerated })
     setAlert(null);
 
     try {
+      // POST /generate encola la tarea; se consulta su estado hasta que termina
       const result = await apiService.generateArticle(formData);
-      setAlert({ 
-        type: 'success', 
-        message: `Artículo generado exitosamente. ID: ${result.article_id}` 
-      });
-      setFormData(prev => ({ ...prev, tema: '' }));
-      onArticleGenerated();
+      setAlert({ type: 'info', message: `Generación en cola (tarea ${result.task_id}). Esto puede tardar unos minutos...` });
+      const task = await waitForTask(result.task_id!);
+      if (task.estado === 'completado') {
+        setAlert({ 
+          type: 'success', 
+          message: `Artículo generado exitosamente. ID: ${task.articulo_generado_id}` 
+        });
+        setFormData(prev => ({ ...prev, tema: '' }));
+        onArticleGenerated();
+      } else {
+        setAlert({ type: 'error', message: `Error al generar el artículo: ${task.mensaje_error || 'error desconocido'}` });
+      }
     } catch (error) {
       setAlert({ 
         type: 'error', 
@@ -5,6 +5,7 @@ import {
   GeneratedArticleSummary,
   GeneratedArticleUpdate,
   GenerateRequestModel,
+  GenerationTask,
   RewriteResponse,
   SuggestionsResponse
 } from '../types/api';
@@ -40,6 +41,10 @@ class APIService {
     });
   }
 
+  async getTask(taskId: number): Promise<GenerationTask> {
+    return this.fetchWithErrorHandling<GenerationTask>(`/tasks/${taskId}`);
+  }
+
   async getConfig(tema: string = 'Defecto'): Promise<ConfigBase> {
     return this.fetchWithErrorHandling<ConfigBase>(`/config/${tema}`);
   }
@@ -4,6 +4,7 @@ export interface GenerateRequestModel {
   longitud_texto: number;
   tono_texto: string;
   min_score_fuente: number;
+  min_score_prefiltro?: number;
   num_fuentes_scraper: number;
   num_resultados_scraper: number;
   min_score_generador: number;
@@ -15,6 +16,7 @@ export interface ConfigBase {
   longitud_texto: number;
   tono_texto: string;
   min_score_fuente: number;
+  min_score_prefiltro?: number;
   num_fuentes_scraper: number;
   num_resultados_scraper: number;
   min_score_generador: number;
@@ -52,9 +54,22 @@ export interface GeneratedArticleUpdate {
 export interface APIResponse {
   message: string;
   article_id?: number;
+  task_id?: number; // POST /generate: ID de la tarea encolada (consultar con GET /tasks/{id})
   filename?: string;
 }
 
+export interface GenerationTask {
+  id: number;
+  tema: string;
+  estado: 'pendiente' | 'en_progreso' | 'completado' | 'error';
+  articulo_generado_id?: number;
+  mensaje_error?: string;
+  intentos: number;
+  fecha_solicitud: string;
+  fecha_actualizacion: string;
+  fecha_finalizacion?: string;
+}
+
 export interface SuggestionsResponse {
   suggestions: string;
 }
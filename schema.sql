@@ -13,6 +13,15 @@ CREATE TABLE IF NOT EXISTS articulos (
     usada_para_generar INTEGER DEFAULT 0 -- Nuevo campo (0=No, 1=Sí)
 );
 
+-- Texto completo extraído de cada artículo fuente, comprimido (zlib).
+-- Separado de 'articulos' para que los listados no carguen los cuerpos; se lee solo al regenerar.
+CREATE TABLE IF NOT EXISTS articulos_contenido (
+    articulo_id INTEGER PRIMARY KEY, -- Mismo ID que en articulos
+    contenido BLOB NOT NULL, -- full_content comprimido con zlib (UTF-8)
+    longitud INTEGER, -- Longitud en caracteres del texto sin comprimir
+    FOREIGN KEY (articulo_id) REFERENCES articulos(id)
+);
+
 -- Tabla para los tags (pueden ser usados por fuentes o generados)
 CREATE TABLE IF NOT EXISTS tags (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -59,6 +68,7 @@ CREATE TABLE IF NOT EXISTS configuracion (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     tema TEXT UNIQUE NOT NULL,
     min_score_fuente INTEGER DEFAULT 5,
+    min_score_prefiltro INTEGER DEFAULT 3, -- Puntuación local (sin IA) mínima antes del análisis con IA
     num_fuentes_scraper INTEGER DEFAULT 10,
     num_resultados_scraper INTEGER DEFAULT 5,
     min_score_generador INTEGER DEFAULT 7,
@@ -82,14 +92,31 @@ CREATE TABLE IF NOT EXISTS generacion_tareas (
     fecha_solicitud TEXT DEFAULT CURRENT_TIMESTAMP,
     fecha_actualizacion TEXT DEFAULT CURRENT_TIMESTAMP, -- Para rastrear cuándo se actualizó el estado
     fecha_finalizacion TEXT,
+    parametros TEXT, -- JSON de la solicitud (GenerateRequestModel) que ejecutará el worker
+    intentos INTEGER DEFAULT 0, -- Veces que un worker ha reclamado la tarea
+    worker_id TEXT, -- Worker que la tiene reclamada
+    lease_hasta REAL, -- Epoch (segundos) hasta el que dura el lease; caducado = otro worker puede reclamarla
+    lote_id TEXT, -- Lote de POST /generate/batch al que pertenece (NULL si es una generación suelta)
     FOREIGN KEY (configuracion_id) REFERENCES configuracion(id),
     FOREIGN KEY (articulo_generado_id) REFERENCES articulos_generados(id)
 );
 
+-- Salida de cada etapa completada del pipeline de una tarea (JSON comprimido con zlib), para reanudarla
+CREATE TABLE IF NOT EXISTS tareas_checkpoints (
+    tarea_id INTEGER NOT NULL,
+    etapa TEXT NOT NULL, -- 'fuentes', 'generacion', 'imagenes', ...
+    datos BLOB NOT NULL,
+    fecha TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (tarea_id, etapa),
+    FOREIGN KEY (tarea_id) REFERENCES generacion_tareas(id)
+) WITHOUT ROWID;
+
 -- Nueva Tabla: Relación muchos a muchos entre articulos_generados y articulos (fuentes)
 CREATE TABLE IF NOT EXISTS articulos_generados_fuentes (
     articulo_generado_id INTEGER, -- FK al artículo generado
     articulo_fuente_id INTEGER, -- FK a la fuente (tabla articulos)
+    score INTEGER, -- Score de la fuente según el tema de este artículo (migración 6)
+    resumen TEXT, -- Resumen del análisis hecho para ese tema (migración 6)
     PRIMARY KEY (articulo_generado_id, articulo_fuente_id), -- Un par unico
     FOREIGN KEY (articulo_generado_id) REFERENCES articulos_generados(id),
     FOREIGN KEY (articulo_fuente_id) REFERENCES articulos(id)
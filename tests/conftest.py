@@ -0,0 +1,24 @@
+# conftest.py
+# Configuración común de las pruebas: los módulos del backend se importan "planos" desde back/
+# (igual que cuando se ejecuta la API desde esa carpeta) y cada prueba que lo pida usa una DB temporal.
+
+import os
+import sys
+
+import pytest
+
+DIRECTORIO_BACK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "back")
+if DIRECTORIO_BACK not in sys.path:
+    sys.path.insert(0, DIRECTORIO_BACK)
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db_temporal(tmp_path, monkeypatch):
+    """DB SQLite nueva (schema.sql + migraciones) en un directorio temporal. Retorna su ruta."""
+    ruta = str(tmp_path / "seo_autopilot_test.db")
+    monkeypatch.setattr(database, "DB_FILE_PATH", ruta)
+    database.inicializar_db()
+    yield ruta
+    database.close_connections()
@@ -0,0 +1,79 @@
+# test_checkpoints.py
+# Checkpoints por etapa: un reintento de la tarea retoma desde la última etapa completada.
+
+import asyncio
+
+import pytest
+
+import database
+import pipeline
+import task_queue
+from models import GenerateRequestModel
+
+FUENTES = [{'id': None, 'url': 'https://x.com/a', 'titulo': 'A', 'score': 8, 'full_content': 'texto', 'tags': ['ia']}]
+ARTICULO = {'title': 'T', 'meta_description': 'M', 'tags': ['ia'], 'body': 'Cuerpo'}
+
+
+@pytest.fixture
+def pipeline_sin_red(monkeypatch):
+    """Scraper y redacción sustituidos; devuelve los contadores de llamadas a cada uno."""
+    llamadas = {'scraper': 0, 'generacion': 0}
+    redaccion = {'falla': True}
+
+    def buscar_noticias(tema, **kwargs):
+        llamadas['scraper'] += 1
+        return [dict(fuente) for fuente in FUENTES]
+
+    def generar(tema, fuentes, **kwargs):
+        llamadas['generacion'] += 1
+        return None if redaccion['falla'] else dict(ARTICULO)
+
+    monkeypatch.setattr(pipeline.scraper, "buscar_noticias", buscar_noticias)
+    monkeypatch.setattr(pipeline.content_generator, "generate_seo_content", generar)
+    return llamadas, redaccion
+
+
+def test_reintento_retoma_desde_la_ultima_etapa(db_temporal, pipeline_sin_red):
+    llamadas, redaccion = pipeline_sin_red
+    request = GenerateRequestModel(tema='ia', num_imagenes_buscar=0)
+    tarea_id = database.crear_tarea_generacion('ia', request.model_dump())
+
+    # Primer intento: las fuentes se completan (checkpoint) y la redacción falla
+    assert asyncio.run(pipeline.run_full_generation_pipeline(request, tarea_id)) is None
+    assert set(database.cargar_checkpoints(tarea_id)) == {'fuentes', 'imagenes_especulativas'}
+
+    # Reintento: no se vuelve a scrapear
+    redaccion['falla'] = False
+    article_id = asyncio.run(pipeline.run_full_generation_pipeline(request, tarea_id))
+    assert article_id is not None
+    assert llamadas == {'scraper': 1, 'generacion': 2}
+    assert database.get_generated_article_by_id(article_id)['titulo'] == 'T'
+
+
+def test_reintentar_distingue_inexistente_de_no_fallida(db_temporal):
+    tarea_id = database.crear_tarea_generacion('ia', {'tema': 'ia'})
+    assert task_queue.reintentar_tarea(tarea_id + 1000) is None
+    assert task_queue.reintentar_tarea(tarea_id) is False # Pendiente, no en 'error'
+
+    database.reclamar_tarea('w1', 60, 3)
+    database.finalizar_tarea(tarea_id, 'w1', 'error', mensaje_error='fallo')
+    assert task_queue.reintentar_tarea(tarea_id) is True
+    tarea = database.get_tarea(tarea_id)
+    assert (tarea['estado'], tarea['intentos'], tarea['mensaje_error']) == ('pendiente', 0, None)
+
+
+def test_se_purgan_los_checkpoints_de_tareas_fallidas_antiguas(db_temporal):
+    antigua, reciente, pendiente = [database.crear_tarea_generacion('ia', {'tema': 'ia'}) for _ in range(3)]
+    for tarea_id in (antigua, reciente):
+        database.reclamar_tarea('w1', 60, 3)
+        database.finalizar_tarea(tarea_id, 'w1', 'error', mensaje_error='fallo')
+    for tarea_id in (antigua, reciente, pendiente):
+        database.guardar_checkpoint(tarea_id, 'fuentes', FUENTES)
+    with database.conexion() as conn:
+        conn.execute("UPDATE generacion_tareas SET fecha_finalizacion = datetime('now', '-10 days') WHERE id = ?", (antigua,))
+        conn.commit()
+
+    assert database.purgar_checkpoints_antiguos(7) == 1
+    assert database.cargar_checkpoints(antigua) == {}
+    assert set(database.cargar_checkpoints(reciente)) == {'fuentes'} # Aún puede reintentarse
+    assert set(database.cargar_checkpoints(pendiente)) == {'fuentes'}
@@ -0,0 +1,117 @@
+# test_database.py
+# Pool de conexiones SQLite: reutilización entre hilos de vida corta, llamadas anidadas y cierre completo.
+
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def conexiones_creadas(monkeypatch):
+    """Registra cada conexión que abre el pool."""
+    creadas = []
+    original = database._nueva_conexion
+
+    def _registrar():
+        conn = original()
+        creadas.append(conn)
+        return conn
+
+    monkeypatch.setattr(database, "_nueva_conexion", _registrar)
+    return creadas
+
+
+def test_hilos_de_vida_corta_reutilizan_conexiones(db_temporal, conexiones_creadas):
+    database.close_connections()
+    for _ in range(5):
+        # Un executor nuevo por llamada, como hace el scraper en cada búsqueda
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert not any(executor.map(database.url_existe, [f"https://x.com/{i}" for i in range(20)]))
+    assert 1 <= len(conexiones_creadas) <= 4
+
+
+def test_el_pool_esta_acotado(db_temporal, conexiones_creadas, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_POOL_SIZE", 2)
+    database.close_connections()
+    dentro = threading.Barrier(2)
+
+    def usar():
+        with database.conexion() as conn:
+            conn.execute("SELECT 1")
+            try:
+                dentro.wait(timeout=0.2)
+            except threading.BrokenBarrierError:
+                pass
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(lambda _: usar(), range(12)))
+    assert len(conexiones_creadas) <= 2
+
+
+def test_close_connections_cierra_las_de_todos_los_hilos(db_temporal, conexiones_creadas):
+    database.close_connections() # Partir sin la conexión que dejó inicializar_db en el pool
+    listos = threading.Barrier(3)
+
+    def usar():
+        with database.conexion() as conn:
+            conn.execute("SELECT 1")
+            listos.wait(timeout=5) # Las tres a la vez: tres conexiones distintas
+
+    hilos = [threading.Thread(target=usar) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(conexiones_creadas) == 3
+
+    database.close_connections()
+    for conn in conexiones_creadas:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def test_conexion_prestada_durante_el_cierre_se_cierra_al_devolverse(db_temporal, conexiones_creadas):
+    with database.conexion() as conn:
+        database.close_connections()
+        conn.execute("SELECT 1") # Sigue siendo usable hasta devolverla
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+def test_llamadas_anidadas_reutilizan_la_conexion_del_hilo(db_temporal, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_POOL_SIZE", 1)
+    monkeypatch.setattr(database, "SQLITE_POOL_ESPERA_SEG", 1)
+    database.close_connections()
+    fuente_id = database.guardar_articulo({'url': 'https://x.com/a', 'titulo': 'A', 'score': 8, 'full_content': 'texto'})
+    articulo_id = database.save_generation_result({'title': 'T', 'body': 'B', 'tema': 'ia'}, [fuente_id])
+
+    # get_sources_used_by_article llama a get_sources_content con su conexión ya prestada
+    fuentes = database.get_sources_used_by_article(articulo_id, incluir_contenido=True)
+    assert [fuente['full_content'] for fuente in fuentes] == ['texto']
+
+
+def test_transaccion_abierta_se_revierte_al_devolver(db_temporal):
+    with database.conexion() as conn:
+        conn.execute("INSERT INTO configuracion (tema) VALUES ('sin commit')")
+        assert conn.in_transaction
+    assert database.get_config('sin commit') == {}
+
+
+def test_cada_articulo_guarda_el_score_de_su_tema(db_temporal):
+    # Dos temas usan la misma URL: la fila de 'articulos' es una, pero cada análisis es de su tema
+    fuente_id = database.guardar_articulo({'url': 'https://x.com/a', 'titulo': 'A', 'score': 9, 'resumen': 'para ia'})
+    assert database.guardar_articulo({'url': 'https://x.com/a', 'titulo': 'A', 'score': 6, 'resumen': 'para medicina'}) == fuente_id
+
+    ids = {}
+    for tema, score in [('ia', 9), ('medicina', 6)]:
+        ids[tema] = database.save_generation_result({'title': tema, 'body': 'B', 'tema': tema}, [fuente_id],
+                                                    puntuaciones_fuentes={fuente_id: {'score': score, 'resumen': f"para {tema}"}})
+
+    for tema, score in [('ia', 9), ('medicina', 6)]:
+        fuente, = database.get_sources_used_by_article(ids[tema])
+        assert (fuente['score'], fuente['resumen']) == (score, f"para {tema}")
+        assert database.get_generated_article_by_id(ids[tema])['score_fuentes_promedio'] == score
@@ -0,0 +1,47 @@
+# test_driver_pool.py
+# Reciclaje de drivers por memoria: se mide el RSS del árbol de procesos del servicio (chromedriver + Chrome).
+
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import driver_pool
+
+psutil = pytest.importorskip("psutil")
+
+
+def _entrada_falsa(pid):
+    """Entrada del pool con un driver cuyo servicio tiene el PID indicado."""
+    driver = SimpleNamespace(service=SimpleNamespace(process=SimpleNamespace(pid=pid)))
+    return {'driver': driver, 'paginas': 0, 'creado': 0}
+
+
+def test_memoria_suma_el_rss_del_arbol_de_procesos():
+    hijo = subprocess.Popen([sys.executable, "-c", "import time; print('listo', flush=True); time.sleep(30)"],
+                            stdout=subprocess.PIPE, text=True)
+    try:
+        hijo.stdout.readline() # Esperar a que el intérprete hijo haya arrancado (su RSS ya no crece)
+        pool = driver_pool.SeleniumDriverPool(size=1, max_edad_seg=10 ** 9)
+        rss_propio = psutil.Process().memory_info().rss / (1024 * 1024)
+        rss_hijo = psutil.Process(hijo.pid).memory_info().rss / (1024 * 1024)
+        memoria = pool._memoria_mb(_entrada_falsa(os.getpid()))
+        assert memoria >= (rss_propio + rss_hijo) * 0.9
+    finally:
+        hijo.kill()
+        hijo.wait()
+
+
+def test_recicla_si_el_arbol_supera_el_limite():
+    pool = driver_pool.SeleniumDriverPool(size=1, max_memoria_mb=1, max_edad_seg=10 ** 9)
+    assert pool._motivo_reciclaje(_entrada_falsa(os.getpid())).startswith("memoria")
+
+    pool_holgado = driver_pool.SeleniumDriverPool(size=1, max_memoria_mb=10 ** 6, max_edad_seg=10 ** 9)
+    assert pool_holgado._motivo_reciclaje(_entrada_falsa(os.getpid())) is None
+
+
+def test_sin_pid_no_se_mide():
+    pool = driver_pool.SeleniumDriverPool(size=1)
+    assert pool._memoria_mb({'driver': SimpleNamespace(), 'paginas': 0, 'creado': 0}) is None
@@ -0,0 +1,50 @@
+# test_llm_cache.py
+# Caché en disco de respuestas del LLM: aciertos/fallos, TTL y expulsión LRU por tamaño.
+
+import os
+import time
+
+import pytest
+
+import llm_cache
+
+
+@pytest.fixture
+def cache_temporal(tmp_path, monkeypatch):
+    """Caché vacía en un archivo temporal, con contadores a cero."""
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DB_PATH", str(tmp_path / "llm_cache_test.db"))
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_HABILITADA", True)
+    monkeypatch.setattr(llm_cache, "_stats", {clave: 0 for clave in llm_cache._stats})
+    llm_cache._cache.cerrar() # La próxima operación abre el archivo temporal
+    yield
+    llm_cache._cache.cerrar()
+
+
+def test_acierto_y_fallo(cache_temporal):
+    assert llm_cache.obtener("modelo", "prompt") is None
+    llm_cache.guardar("modelo", "prompt", "respuesta")
+    assert llm_cache.obtener("modelo", "prompt") == "respuesta"
+    assert llm_cache.obtener("otro-modelo", "prompt") is None # La clave incluye el modelo
+
+    stats = llm_cache.estadisticas()
+    assert (stats['aciertos'], stats['fallos'], stats['guardadas']) == (1, 2, 1)
+    assert stats['caracteres_prompt_ahorrados'] == len("prompt")
+
+
+def test_respuestas_caducadas_no_se_sirven_y_se_expulsan(cache_temporal, monkeypatch):
+    llm_cache.guardar("modelo", "viejo", "respuesta")
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL_SEG", -1) # Todo lo guardado ya está caducado
+    assert llm_cache.obtener("modelo", "viejo") is None
+    llm_cache.expulsar()
+    assert llm_cache.estadisticas()['expulsadas'] == 1
+
+
+def test_expulsion_por_tamano_quita_las_menos_usadas(cache_temporal, monkeypatch):
+    for i in range(3):
+        llm_cache.guardar("modelo", f"p{i}", os.urandom(400 * 1024).hex()) # Hex de bytes aleatorios: ~400 KB comprimidos
+        time.sleep(0.01)
+    llm_cache.obtener("modelo", "p0") # p0 pasa a ser la más reciente
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_MB", 1)
+    llm_cache.expulsar()
+    assert llm_cache.obtener("modelo", "p0") is not None
+    assert llm_cache.obtener("modelo", "p1") is None
@@ -0,0 +1,111 @@
+# test_llm_limiter.py
+# Token bucket por modelo (RPM/TPM), ajuste con el uso real, esperas asíncronas y prioridades.
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm_limiter
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reloj controlable para la recarga de los cubos."""
+    ahora = [1000.0]
+    monkeypatch.setattr(llm_limiter.time, "monotonic", lambda: ahora[0])
+    return ahora
+
+
+def test_el_ajuste_usa_lo_descontado_y_no_la_estimacion(reloj):
+    limitador = llm_limiter.LimitadorModelo("m", rpm=0, tpm=10_000) # Capacidad del cubo: 1000 tokens
+    consumidos = limitador.adquirir(50_000)
+    assert consumidos == 1000 and limitador._tokens == 0
+    limitador.ajustar_tokens(consumidos, 1000) # Se usó justo lo descontado: nada que devolver
+    assert limitador._tokens == 0
+    limitador.ajustar_tokens(consumidos, 400) # Se usó menos: se devuelve la diferencia
+    assert limitador._tokens == 600
+
+
+def test_la_recarga_respeta_el_limite_por_minuto(reloj):
+    limitador = llm_limiter.LimitadorModelo("m", rpm=60, tpm=0) # Ráfaga de 6 y 0,9 peticiones/s
+    for _ in range(6):
+        assert limitador._consumir(0) == 0
+    espera = limitador._consumir(0)
+    assert espera == pytest.approx(1 / 0.9)
+    reloj[0] += espera + 1e-9
+    assert limitador._consumir(0) == 0
+
+
+def test_espera_asincrona_sin_sondeo():
+    limitador = llm_limiter.LimitadorModelo("m", rpm=600, tpm=0) # Ráfaga de 60 y 9 peticiones/s
+    intentos = []
+    original = limitador._consumir
+    limitador._consumir = lambda tokens: intentos.append(1) or original(tokens)
+
+    async def escenario():
+        for _ in range(60):
+            await limitador.aadquirir(0)
+        intentos.clear()
+        inicio = time.monotonic()
+        await limitador.aadquirir(0) # Sin cupo: duerme lo estimado (~0,11 s) en lugar de sondear
+        return time.monotonic() - inicio
+
+    espera = asyncio.run(escenario())
+    assert 0.05 < espera < 1
+    assert len(intentos) <= 3
+
+
+def test_liberar_el_semaforo_despierta_a_la_espera_asincrona():
+    semaforo = llm_limiter.SemaforoPrioridad(1)
+    semaforo.acquire()
+    intentos = []
+    original = semaforo._tomar
+    semaforo._tomar = lambda: intentos.append(1) or original()
+
+    async def escenario():
+        threading.Timer(0.3, semaforo.release).start() # Se libera desde otro hilo
+        inicio = time.monotonic()
+        await asyncio.wait_for(semaforo.aacquire(), timeout=5)
+        return time.monotonic() - inicio
+
+    espera = asyncio.run(escenario())
+    assert 0.2 < espera < 2
+    assert len(intentos) <= 3 # Un intento al llegar y otro al ser despertada
+    assert semaforo._esperas_async == {}
+
+
+def test_la_prioridad_interactiva_pasa_primero():
+    semaforo = llm_limiter.SemaforoPrioridad(1)
+    semaforo.acquire()
+    orden = []
+
+    def esperar(prioridad):
+        semaforo.acquire(prioridad)
+        orden.append(prioridad)
+        semaforo.release()
+
+    fondo = threading.Thread(target=esperar, args=(llm_limiter.PRIORIDAD_FONDO,))
+    fondo.start()
+    time.sleep(0.05) # La de fondo llega antes
+    interactiva = threading.Thread(target=esperar, args=(llm_limiter.PRIORIDAD_INTERACTIVA,))
+    interactiva.start()
+    time.sleep(0.05)
+    semaforo.release()
+    fondo.join(5)
+    interactiva.join(5)
+    assert orden == [llm_limiter.PRIORIDAD_INTERACTIVA, llm_limiter.PRIORIDAD_FONDO]
+
+
+def test_cancelar_una_espera_asincrona_la_saca_de_la_cola():
+    semaforo = llm_limiter.SemaforoPrioridad(0)
+
+    async def escenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(semaforo.aacquire(), timeout=0.1)
+
+    asyncio.run(escenario())
+    assert semaforo._cola == [] and semaforo._esperas_async == {}
+    semaforo.release()
+    semaforo.acquire() # La espera cancelada no se quedó el cupo
@@ -0,0 +1,122 @@
+# test_llm_resilience.py
+# Máquina de estados del circuit breaker y plan de intentos (reintentos + modelo de respaldo).
+
+import pytest
+
+import llm_resilience
+from llm_resilience import CircuitBreaker, LLMQuotaError, LLMSafetyError, LLMTransientError, PlanDeIntentos
+
+
+class _Reloj:
+    """Sustituto de time.monotonic controlable desde la prueba."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = _Reloj()
+    monkeypatch.setattr(llm_resilience.time, "monotonic", reloj)
+    monkeypatch.setattr(llm_resilience, "LLM_CIRCUITO_UMBRAL_FALLOS", 3)
+    monkeypatch.setattr(llm_resilience, "LLM_CIRCUITO_ENFRIAMIENTO_SEG", 30)
+    monkeypatch.setattr(llm_resilience, "_circuitos", {})
+    return reloj
+
+
+def test_circuito_abre_tras_fallos_seguidos_y_deja_pasar_una_prueba(reloj):
+    circuito = CircuitBreaker("m")
+    for _ in range(2):
+        assert circuito.permitir()
+        circuito.registrar_fallo()
+    assert circuito.estado == 'cerrado'
+    circuito.registrar_fallo()
+    assert circuito.estado == 'abierto'
+    assert not circuito.permitir()
+
+    reloj.ahora += 30
+    assert circuito.permitir() # Llamada de prueba
+    assert circuito.estado == 'semiabierto'
+    assert not circuito.permitir() # Solo una a la vez
+    circuito.registrar_exito()
+    assert circuito.estado == 'cerrado'
+    assert circuito.permitir()
+
+
+def test_prueba_fallida_reabre_el_circuito(reloj):
+    circuito = CircuitBreaker("m")
+    for _ in range(3):
+        circuito.registrar_fallo()
+    reloj.ahora += 30
+    assert circuito.permitir()
+    circuito.registrar_fallo()
+    assert circuito.estado == 'abierto'
+    reloj.ahora += 29
+    assert not circuito.permitir()
+
+
+def test_exito_reinicia_la_cuenta_de_fallos(reloj):
+    circuito = CircuitBreaker("m")
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    circuito.registrar_exito()
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    assert circuito.estado == 'cerrado'
+
+
+def _ejecutar(plan, respuestas):
+    """Recorre el plan consumiendo `respuestas` (excepción o texto) por intento. Retorna (texto, modelos, esperas)."""
+    modelos, esperas = [], []
+    for nombre in plan:
+        modelos.append(nombre)
+        respuesta = respuestas.pop(0)
+        if isinstance(respuesta, Exception):
+            esperas.append(plan.fallo(respuesta))
+            continue
+        plan.exito()
+        return respuesta, modelos, esperas
+    raise plan.error_final()
+
+
+def test_reintenta_y_conmuta_al_respaldo(reloj, monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_REINTENTOS", 1)
+    monkeypatch.setattr(llm_resilience, "LLM_CIRCUITO_UMBRAL_FALLOS", 10)
+    texto, modelos, esperas = _ejecutar(
+        PlanDeIntentos(["principal", "respaldo"]),
+        [LLMTransientError("503"), LLMQuotaError("429"), "ok"],
+    )
+    assert texto == "ok"
+    assert modelos == ["principal", "principal", "respaldo"]
+    assert 0 <= esperas[0] <= llm_resilience.LLM_BACKOFF_BASE_SEG # Backoff con jitter completo del primer reintento
+    assert esperas[1] == 0 # Agotados los reintentos: se pasa al respaldo sin esperar
+
+
+def test_retry_after_de_la_api_se_respeta(reloj, monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_CIRCUITO_UMBRAL_FALLOS", 10)
+    _, _, esperas = _ejecutar(PlanDeIntentos(["m"]), [LLMQuotaError("429", retry_after=5), "ok"])
+    assert 5 <= esperas[0] <= 5 + llm_resilience.LLM_BACKOFF_BASE_SEG
+
+
+def test_error_no_reintentable_se_relanza(reloj):
+    plan = PlanDeIntentos(["m", "respaldo"])
+    with pytest.raises(LLMSafetyError):
+        _ejecutar(plan, [LLMSafetyError("bloqueado")])
+
+
+def test_circuito_abierto_salta_al_respaldo(reloj):
+    for _ in range(3):
+        llm_resilience.obtener_circuito("principal").registrar_fallo()
+    _, modelos, _ = _ejecutar(PlanDeIntentos(["principal", "respaldo"]), ["ok"])
+    assert modelos == ["respaldo"]
+
+
+def test_clasificacion_de_errores_del_sdk():
+    from google.api_core import exceptions as google_exceptions
+    assert isinstance(llm_resilience.clasificar_error(google_exceptions.ResourceExhausted("cuota")), LLMQuotaError)
+    assert isinstance(llm_resilience.clasificar_error(google_exceptions.ServiceUnavailable("503")), LLMTransientError)
+    assert isinstance(llm_resilience.clasificar_error(google_exceptions.InvalidArgument("x")), llm_resilience.LLMInvalidRequestError)
+    assert llm_resilience._retry_after(Exception("Please retry in 12.5s")) == 12.5
@@ -0,0 +1,83 @@
+# test_migraciones.py
+# Migraciones gestionadas (PRAGMA user_version) y planes de las consultas calientes (EXPLAIN QUERY PLAN).
+
+import sqlite3
+
+import pytest
+
+import database
+
+VERSION_FINAL = database.MIGRATIONS[-1][0]
+
+
+def _columnas(conn, tabla):
+    return {fila[1] for fila in conn.execute(f"PRAGMA table_info({tabla})")}
+
+
+def test_db_nueva_queda_en_la_ultima_version(db_temporal):
+    with database.conexion() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == VERSION_FINAL
+        assert {'parametros', 'intentos', 'worker_id', 'lease_hasta', 'lote_id'} <= _columnas(conn, 'generacion_tareas')
+        assert 'min_score_prefiltro' in _columnas(conn, 'configuracion')
+
+
+def test_migraciones_idempotentes(db_temporal):
+    database.inicializar_db() # Segunda vez: no hay migraciones pendientes ni errores
+    with database.conexion() as conn:
+        assert database.aplicar_migraciones(conn) == VERSION_FINAL
+
+
+def test_migra_una_db_antigua(tmp_path):
+    # Tablas tal como estaban antes de las migraciones (sin columnas de la cola ni del prefiltro)
+    conn = sqlite3.connect(str(tmp_path / "antigua.db"))
+    conn.executescript('''
+        CREATE TABLE articulos_generados (id INTEGER PRIMARY KEY, tema TEXT, titulo TEXT, estado TEXT,
+                                          fecha_generacion TEXT, score_fuentes_promedio REAL);
+        CREATE TABLE imagenes_generadas (id INTEGER PRIMARY KEY, articulo_generado_id INTEGER);
+        CREATE TABLE configuracion (id INTEGER PRIMARY KEY, tema TEXT UNIQUE);
+        CREATE TABLE generacion_tareas (id INTEGER PRIMARY KEY, tema TEXT, estado TEXT);
+        CREATE TABLE articulos_generados_fuentes (articulo_generado_id INTEGER, articulo_fuente_id INTEGER);
+        INSERT INTO generacion_tareas (tema, estado) VALUES ('ia', 'pendiente');
+    ''')
+    assert database.aplicar_migraciones(conn) == VERSION_FINAL
+    assert {'parametros', 'intentos', 'lote_id'} <= _columnas(conn, 'generacion_tareas')
+    assert {'score', 'resumen'} <= _columnas(conn, 'articulos_generados_fuentes')
+    assert conn.execute("SELECT tema, intentos FROM generacion_tareas").fetchall() == [('ia', 0)]
+    conn.close()
+
+
+def test_migracion_fallida_se_revierte(tmp_path, monkeypatch):
+    conn = sqlite3.connect(str(tmp_path / "fallida.db"))
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    conn.commit()
+    monkeypatch.setattr(database, "MIGRATIONS", [
+        (1, "buena", ["ALTER TABLE t ADD COLUMN a TEXT"]),
+        (2, "a medias", ["ALTER TABLE t ADD COLUMN b TEXT", "ALTER TABLE no_existe ADD COLUMN c TEXT"]),
+    ])
+    with pytest.raises(sqlite3.OperationalError):
+        database.aplicar_migraciones(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+    assert _columnas(conn, 't') == {'id', 'a'} # La columna b de la migración fallida no queda
+    conn.close()
+
+
+# Consultas calientes y el índice que debe usar cada una
+CONSULTAS_CALIENTES = [
+    ("listado sin filtros", *database._consulta_articulos_generados(None, None, 100), "idx_ag_fecha"),
+    ("listado por tema", *database._consulta_articulos_generados('ia', None, 100), "idx_ag_tema_fecha"),
+    ("listado por estado", *database._consulta_articulos_generados(None, 'generado', 100), "idx_ag_estado_fecha"),
+    ("listado por tema y estado", *database._consulta_articulos_generados('ia', 'generado', 100), "idx_ag_tema_estado_fecha"),
+    ("imágenes de un artículo",
+     "SELECT id, articulo_generado_id, url, alt_text, caption, licencia, autor FROM imagenes_generadas WHERE articulo_generado_id = ?",
+     [1], "idx_imagenes_articulo"),
+    ("tareas de un lote",
+     f"SELECT {database._COLUMNAS_TAREA} FROM generacion_tareas WHERE lote_id = ? ORDER BY id", ['lote'], "idx_tareas_lote"),
+]
+
+
+@pytest.mark.parametrize("nombre, query, params, indice", CONSULTAS_CALIENTES, ids=[c[0] for c in CONSULTAS_CALIENTES])
+def test_consultas_calientes_usan_su_indice(db_temporal, nombre, query, params, indice):
+    with database.conexion() as conn:
+        plan = [fila[-1] for fila in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+    assert any(f"USING INDEX {indice}" in paso or f"USING COVERING INDEX {indice}" in paso for paso in plan), plan
+    assert not any("TEMP B-TREE" in paso for paso in plan), plan
@@ -0,0 +1,45 @@
+# test_prefilter.py
+# Pre-puntuación local de fuentes (BM25, idioma, recencia, boilerplate) y detección de casi-duplicados.
+
+from datetime import datetime
+
+import prefilter
+
+ANIO = datetime.now().year
+TEXTO_RELEVANTE = (
+    f"En {ANIO} la inteligencia artificial en medicina ayuda a los hospitales a detectar tumores antes. "
+    "Los médicos usan modelos de inteligencia artificial para revisar radiografías y priorizar pacientes. "
+) * 20
+TEXTO_AJENO = (
+    f"En {ANIO} el equipo local ganó el partido de fútbol por tres goles a uno ante su afición. "
+    "El entrenador destacó el trabajo de la defensa durante toda la segunda parte del encuentro. "
+) * 20
+
+
+def test_bm25_premia_los_terminos_del_tema():
+    tema = "inteligencia artificial medicina"
+    relevante = prefilter.relevancia_bm25(tema, prefilter.text_utils.tokenizar(TEXTO_RELEVANTE))
+    ajeno = prefilter.relevancia_bm25(tema, prefilter.text_utils.tokenizar(TEXTO_AJENO))
+    assert 0 < relevante <= 1
+    assert ajeno == 0
+
+
+def test_evaluar_rechaza_textos_sin_terminos_del_tema():
+    assert prefilter.evaluar("inteligencia artificial", TEXTO_AJENO)['motivo_rechazo']
+    evaluacion = prefilter.evaluar("inteligencia artificial", TEXTO_RELEVANTE)
+    assert evaluacion['motivo_rechazo'] is None
+    assert evaluacion['idioma'] == 'es'
+    assert evaluacion['puntuacion'] > prefilter.evaluar("inteligencia artificial", "inteligencia artificial.")['puntuacion']
+
+
+def test_recencia():
+    assert prefilter.recencia(f"Publicado en {ANIO}.") == 1.0
+    assert prefilter.recencia("Sin fechas.") == 0.5
+    assert prefilter.recencia(f"Publicado en {ANIO - 10}.") == 0.0
+
+
+def test_casi_duplicados():
+    huella = prefilter.calcular_huella(TEXTO_RELEVANTE)
+    casi_igual = prefilter.calcular_huella(TEXTO_RELEVANTE + " Fuente: agencia.")
+    assert prefilter.es_casi_duplicado(casi_igual, [huella])
+    assert not prefilter.es_casi_duplicado(prefilter.calcular_huella(TEXTO_AJENO), [huella])
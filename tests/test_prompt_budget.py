@@ -0,0 +1,41 @@
+# test_prompt_budget.py
+# Presupuesto de tokens de los prompts: reparto entre fuentes y recorte por frases informativas.
+
+import llm_client
+import prompt_budget
+
+
+def test_reparto_proporcional_al_peso_y_redistribuye_el_sobrante():
+    # La fuente corta cabe entera; lo que no usa se reparte entre las otras dos según su peso
+    assert prompt_budget.repartir_presupuesto([100, 1000, 1000], [5, 5, 5], 900) == [100, 400, 400]
+    cuotas = prompt_budget.repartir_presupuesto([1000, 1000], [9, 3], 800)
+    assert cuotas == [600, 200]
+    assert prompt_budget.repartir_presupuesto([50, 60], [1, 1], 1000) == [50, 60]
+
+
+def test_recortar_conserva_orden_y_frases_informativas():
+    relleno = [f"Frase de relleno numero {n} sin nada especial que decir aqui." for n in ("uno", "dos", "tres", "cuatro")]
+    frases = ["Entradilla sobre la noticia."] + relleno * 10 + ["El 45% de los hospitales usa inteligencia artificial en 2025."]
+    texto = " ".join(frases)
+    recortado = prompt_budget.recortar_texto(texto, "inteligencia artificial", 40)
+
+    assert llm_client.estimar_tokens(recortado) <= 40
+    assert recortado.startswith("Entradilla sobre la noticia.")
+    assert "El 45% de los hospitales" in recortado
+    assert prompt_budget.SEPARADOR_OMISION.strip() in recortado
+
+
+def test_texto_que_cabe_no_se_toca():
+    assert prompt_budget.recortar_texto("Texto corto.", "tema", 100) == "Texto corto."
+
+
+def test_ajustar_fuentes_respeta_el_presupuesto_total():
+    fuentes = [
+        {'full_content': "Inteligencia artificial en medicina. " * 200, 'score': 9},
+        {'full_content': "Otra fuente con datos de 2024. " * 200, 'score': 3},
+        {'full_content': None, 'score': 8},
+    ]
+    textos = prompt_budget.ajustar_fuentes(fuentes, "inteligencia artificial", 600)
+    assert textos[2] is None
+    assert sum(llm_client.estimar_tokens(t) for t in textos if t) <= 600
+    assert llm_client.estimar_tokens(textos[0]) > llm_client.estimar_tokens(textos[1])
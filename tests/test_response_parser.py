@@ -0,0 +1,41 @@
+# test_response_parser.py
+# Esquemas de salida estructurada (esquema_gemini) y extracción tolerante de JSON.
+
+import llm_backends
+import response_parser
+from models import BatchSourceAnalysisLLM, GeneratedArticleLLM, SourceAnalysisLLM
+
+
+def test_esquema_incluye_los_limites_del_score():
+    score = response_parser.esquema_gemini(SourceAnalysisLLM)['properties']['score']
+    assert (score['type'], score['minimum'], score['maximum']) == ('integer', 1, 10)
+    lote = response_parser.esquema_gemini(BatchSourceAnalysisLLM, lista=True)
+    assert lote['items']['properties']['score']['maximum'] == 10
+
+
+def test_esquema_cacheado_no_se_comparte_entre_llamadores():
+    esquema = response_parser.esquema_gemini(GeneratedArticleLLM)
+    esquema['properties'].pop('body')
+    esquema['required'].append('otro')
+    nuevo = response_parser.esquema_gemini(GeneratedArticleLLM)
+    assert 'body' in nuevo['properties']
+    assert 'otro' not in nuevo['required']
+
+
+def test_limites_no_soportados_por_el_sdk_pasan_a_la_descripcion():
+    esquema = response_parser.esquema_gemini(SourceAnalysisLLM)
+    campos_sdk_antiguo = frozenset({'type', 'format', 'description', 'nullable', 'enum', 'items', 'properties', 'required'})
+    adaptado = llm_backends._esquema_para_sdk(esquema, campos_sdk_antiguo)
+    score = adaptado['properties']['score']
+    assert 'minimum' not in score and 'maximum' not in score
+    assert score['description'].endswith("(mínimo 1, máximo 10)")
+    # Con un SDK que los admite, se envían tal cual
+    adaptado = llm_backends._esquema_para_sdk(esquema, campos_sdk_antiguo | {'minimum', 'maximum'})
+    assert adaptado['properties']['score']['minimum'] == 1
+
+
+def test_cargar_json_tolera_texto_alrededor_y_json5():
+    assert response_parser.cargar_json('Aquí va:\n```json\n{"a": 1}\n```') == {'a': 1}
+    assert response_parser.cargar_json("{'a': 1, 'b': [1, 2,],}") == {'a': 1, 'b': [1, 2]}
+    assert response_parser.cargar_json('[{"indice": 1}] y más', apertura='[') == [{'indice': 1}]
+    assert response_parser.cargar_json('sin json') is None
@@ -0,0 +1,140 @@
+# test_scraper.py
+# Pruebas del motor de fuentes (scraper.buscar_noticias) sin red ni LLM: DDG, la descarga y el
+# analizador se sustituyen por funciones locales. Incluye las descargas compartidas entre búsquedas en curso.
+
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import scraper
+
+TEXTO_FUENTE = "La inteligencia artificial en medicina mejora el diagnóstico precoz. " * 40
+
+
+class _RespuestaDDG:
+    def __init__(self, urls):
+        self.text = "".join(f'<a class="result__url" href="{url}">{url}</a>' for url in urls)
+
+    def raise_for_status(self):
+        pass
+
+
+def _preparar_red(monkeypatch, urls, descargas, analisis):
+    """Sustituye DDG, la resolución de redirecciones, la descarga y el analizador por funciones locales."""
+    monkeypatch.setattr(scraper.http_client, "get", lambda *args, **kwargs: _RespuestaDDG(urls))
+    monkeypatch.setattr(scraper.web_tools, "resolve_redirect_url", lambda url: url)
+    monkeypatch.setattr(scraper.web_tools, "fetch_and_extract_content", descargas)
+    monkeypatch.setattr(scraper.analyzer, "analyze_with_gemini", analisis)
+
+
+def test_parada_temprana_no_cuenta_cancelados_como_llamadas_ahorradas(db_temporal, monkeypatch):
+    urls = [f"https://medio{i}.com/noticia-ia-{i}" for i in range(6)]
+    # Solo la primera URL tiene contenido: el resto nunca habría llegado al LLM. Sus descargas
+    # tardan, así que la parada temprana llega con candidatos aún en cola.
+    def descargas(url):
+        if url == urls[0]:
+            return TEXTO_FUENTE
+        time.sleep(0.1)
+        return None
+
+    _preparar_red(
+        monkeypatch, urls,
+        descargas=descargas,
+        analisis=lambda tema, texto: {'score': 9, 'resumen': 'ok', 'tags': [], 'titulo': 'IA'},
+    )
+    monkeypatch.setattr(scraper, "MAX_WORKERS_SCRAPER", 1)
+
+    estadisticas = {}
+    fuentes = scraper.buscar_noticias("ia medicina", 6, 5, 1, parada_temprana=True, analisis_en_lote=False,
+                                      estadisticas=estadisticas)
+
+    assert [fuente['url'] for fuente in fuentes] == [urls[0]]
+    assert estadisticas['parada_temprana_activada']
+    assert estadisticas['llamadas_llm'] == 1
+    assert estadisticas['llamadas_llm_ahorradas'] == 0
+    assert estadisticas['candidatos_cancelados'] >= 1
+
+
+SCORE_POR_TEMA = {'ia': 9, 'medicina': 6}
+
+
+@pytest.mark.parametrize("analisis_en_lote", [False, True], ids=["individual", "lote"])
+def test_url_compartida_se_descarga_una_vez_y_se_analiza_por_tema(db_temporal, monkeypatch, analisis_en_lote):
+    compartida = "https://medio.com/ia-y-medicina"
+    urls_por_tema = {'ia': [compartida, "https://otro.com/solo-ia"], 'medicina': [compartida, "https://otro.com/solo-medicina"]}
+    descargas, analisis = Counter(), Counter()
+    lock = threading.Lock()
+
+    def buscar_en_ddg(url, **kwargs):
+        tema = next(tema for tema in urls_por_tema if f"q={tema}+" in url)
+        return _RespuestaDDG(urls_por_tema[tema])
+
+    def descargar(url):
+        with lock:
+            descargas[url] += 1
+        time.sleep(0.3) # Las dos búsquedas coinciden mientras se descarga la compartida
+        return f"{url}\n{TEXTO_FUENTE}"
+
+    def analizar(tema, texto):
+        with lock:
+            analisis[(tema, texto.split("\n", 1)[0])] += 1
+        return {'score': SCORE_POR_TEMA[tema], 'resumen': f"para {tema}", 'tags': [], 'titulo': 'IA'}
+
+    def analizar_lote(tema, textos, estadisticas=None):
+        if estadisticas is not None:
+            estadisticas['llamadas_llm'] = estadisticas.get('llamadas_llm', 0) + 1
+        return [analizar(tema, texto) for texto in textos]
+
+    _preparar_red(monkeypatch, [], descargar, analizar)
+    monkeypatch.setattr(scraper.http_client, "get", buscar_en_ddg)
+    monkeypatch.setattr(scraper.analyzer, "analyze_batch_with_gemini", analizar_lote)
+
+    resultados, estadisticas = {}, {tema: {} for tema in urls_por_tema}
+
+    def buscar(tema):
+        resultados[tema] = scraper.buscar_noticias(tema, 5, 5, 5, parada_temprana=False, analisis_en_lote=analisis_en_lote,
+                                                   estadisticas=estadisticas[tema])
+
+    hilos = [threading.Thread(target=buscar, args=(tema,)) for tema in urls_por_tema]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(10)
+
+    assert descargas[compartida] == 1 # Una sola descarga...
+    assert analisis[('ia', compartida)] == 1 and analisis[('medicina', compartida)] == 1 # ...y un análisis por tema
+    for tema, urls in urls_por_tema.items():
+        fuentes = {fuente['url']: fuente for fuente in resultados[tema]}
+        assert sorted(fuentes) == sorted(urls)
+        assert fuentes[compartida]['score'] == SCORE_POR_TEMA[tema]
+        assert fuentes[compartida]['resumen'] == f"para {tema}"
+    assert sum(e['compartidas_otro_tema'] for e in estadisticas.values()) == 1
+    assert scraper._urls_en_proceso == {}
+
+
+def _ejecucion():
+    return {'lock': threading.Lock(), 'urls_reclamadas': {}, 'parada': threading.Event(),
+            'candidatos_cancelados': 0, 'compartidas_otro_tema': 0}
+
+
+def test_url_abandonada_sin_descargar_la_retoma_quien_la_espera(db_temporal, monkeypatch):
+    url = "https://medio.com/noticia"
+    monkeypatch.setattr(scraper.web_tools, "fetch_and_extract_content", lambda u: TEXTO_FUENTE)
+    propietaria, en_espera = _ejecucion(), _ejecucion()
+    assert scraper._reclamar_url(url, propietaria) is None
+
+    resultado = {}
+    hilo = threading.Thread(target=lambda: resultado.update(texto=scraper._descargar(url, 'otro', en_espera)))
+    hilo.start()
+    time.sleep(0.1)
+    assert hilo.is_alive() # Espera al Future de la propietaria
+    scraper._publicar_url(url, None, propietaria) # Parada temprana antes de descargarla
+    hilo.join(5)
+
+    assert resultado['texto'] == TEXTO_FUENTE
+    assert url in en_espera['urls_reclamadas'] and url not in propietaria['urls_reclamadas']
+    assert en_espera['urls_reclamadas'][url].result() == TEXTO_FUENTE # Publicado para las siguientes
+    scraper._liberar_urls(en_espera)
+    assert scraper._urls_en_proceso == {}
@@ -0,0 +1,58 @@
+# test_sqlite_cache.py
+# Plumbing común de las cachés SQLite: tabla creada al conectar, expulsión cada N escrituras y reapertura tras cerrar.
+
+import time
+
+import pytest
+
+import fetch_cache
+from sqlite_cache import CacheSQLite
+
+DDL = '''
+    CREATE TABLE IF NOT EXISTS entradas (
+        clave TEXT PRIMARY KEY,
+        tamano INTEGER NOT NULL DEFAULT 0,
+        fecha REAL NOT NULL,
+        ultimo_acceso REAL NOT NULL
+    )
+'''
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CacheSQLite("Test", lambda: str(tmp_path / "cache.db"), "entradas", DDL, columna_ttl="fecha", expulsar_cada=3)
+    yield cache
+    cache.cerrar()
+
+
+def _insertar(cache, clave, tamano, fecha):
+    with cache.lock:
+        conn = cache.conexion()
+        conn.execute('INSERT INTO entradas VALUES (?, ?, ?, ?)', (clave, tamano, fecha, fecha))
+        conn.commit()
+        return cache.registrar_escritura()
+
+
+def test_expulsa_caducadas_y_las_menos_usadas(cache):
+    ahora = time.time()
+    assert [_insertar(cache, c, 512 * 1024, ahora + i) for i, c in enumerate(["a", "b", "c"])] == [False, False, True]
+    _insertar(cache, "vieja", 10, ahora - 3600)
+    assert cache.expulsar(ttl_seg=60, max_mb=1) == 2 # "vieja" por TTL y "a" por tamaño (LRU)
+    with cache.lock:
+        claves = {c for c, in cache.conexion().execute('SELECT clave FROM entradas')}
+    assert claves == {"b", "c"}
+    assert _insertar(cache, "d", 1, ahora) is False # La expulsión reinicia el contador de escrituras
+
+
+def test_fetch_cache_usa_el_helper(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch_cache, "FETCH_CACHE_DB_PATH", str(tmp_path / "fetch.db"))
+    monkeypatch.setattr(fetch_cache, "FETCH_CACHE_HABILITADA", True)
+    fetch_cache._cache.cerrar()
+    try:
+        fetch_cache.guardar("https://x.com/a", "<p>hola</p>", "hola", etag='"1"')
+        assert fetch_cache.obtener("https://x.com/a")['texto'] == "hola"
+        monkeypatch.setattr(fetch_cache, "FETCH_CACHE_TTL_SEG", -1)
+        fetch_cache.expulsar()
+        assert fetch_cache.obtener("https://x.com/a") is None
+    finally:
+        fetch_cache._cache.cerrar()
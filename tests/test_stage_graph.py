@@ -0,0 +1,115 @@
+# test_stage_graph.py
+# Ejecutor de etapas en grafo: solapamiento, etapas opcionales, cancelación, reanudación y validación.
+
+import asyncio
+
+import pytest
+
+import stage_graph
+from stage_graph import Etapa, EtapaFallida
+
+
+def _ejecutar(etapas, contexto=None, **kwargs):
+    return asyncio.run(stage_graph.ejecutar(etapas, contexto if contexto is not None else {}, **kwargs))
+
+
+def test_etapas_independientes_se_solapan():
+    async def dormir(**_):
+        await asyncio.sleep(0.2)
+        return True
+
+    tiempos = {}
+    etapas = [Etapa('a', dormir), Etapa('b', dormir), Etapa('c', dormir, entradas=['a', 'b'])]
+    contexto = _ejecutar(etapas, tiempos=tiempos)
+    assert contexto == {'a': True, 'b': True, 'c': True}
+    assert tiempos['b']['inicio'] < 0.1 # b no espera a a
+    assert tiempos['c']['inicio'] >= 0.19 # c espera a las dos
+    assert tiempos['c']['inicio'] < 0.35
+
+
+def test_las_entradas_llegan_por_nombre():
+    async def sumar(x, y):
+        return x + y
+
+    contexto = _ejecutar([Etapa('suma', sumar, entradas=['x', 'y'], salida='total')], {'x': 2, 'y': 3})
+    assert contexto['total'] == 5
+
+
+def test_etapa_opcional_fallida_deja_none_y_se_continua():
+    async def romper():
+        raise RuntimeError("sin imágenes")
+
+    async def usar(imagenes):
+        return imagenes is None
+
+    etapas = [Etapa('imagenes', romper, opcional=True), Etapa('final', usar, entradas=['imagenes'])]
+    assert _ejecutar(etapas) == {'imagenes': None, 'final': True}
+
+
+def test_etapa_obligatoria_fallida_cancela_las_demas():
+    cancelada = asyncio.Event()
+    terminadas = []
+
+    async def lenta():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelada.set()
+            raise
+
+    async def romper():
+        await asyncio.sleep(0.05)
+        raise EtapaFallida("sin fuentes útiles")
+
+    etapas = [Etapa('lenta', lenta), Etapa('fuentes', romper)]
+    with pytest.raises(EtapaFallida) as error:
+        _ejecutar(etapas, al_terminar=lambda nombre, salida: terminadas.append(nombre))
+    assert error.value.etapa == 'fuentes'
+    assert cancelada.is_set()
+    assert terminadas == []
+
+
+def test_restauradas_no_se_ejecutan():
+    ejecutadas = []
+
+    async def etapa(nombre, **_):
+        ejecutadas.append(nombre)
+        return nombre.upper()
+
+    def crear(nombre, entradas=()):
+        return Etapa(nombre, lambda **kw: etapa(nombre, **kw), entradas=entradas)
+
+    tiempos = {}
+    guardadas = []
+    etapas = [crear('fuentes'), crear('articulo', ['fuentes']), crear('imagenes', ['articulo'])]
+    contexto = _ejecutar(etapas, restauradas={'fuentes': 'DE CHECKPOINT'}, tiempos=tiempos,
+                         al_terminar=lambda nombre, salida: guardadas.append(nombre))
+    assert ejecutadas == ['articulo', 'imagenes']
+    assert contexto['fuentes'] == 'DE CHECKPOINT'
+    assert guardadas == ['articulo', 'imagenes'] # Lo restaurado no se vuelve a guardar
+    assert tiempos['fuentes']['restaurada']
+    assert "fuentes (checkpoint)" in stage_graph.resumen_tiempos(tiempos)
+
+
+def test_al_terminar_asincrono_se_espera():
+    guardados = []
+
+    async def guardar(nombre, salida):
+        await asyncio.sleep(0.01)
+        guardados.append((nombre, salida))
+
+    async def uno():
+        return 1
+
+    _ejecutar([Etapa('uno', uno)], al_terminar=guardar)
+    assert guardados == [('uno', 1)]
+
+
+@pytest.mark.parametrize("etapas, mensaje", [
+    ([Etapa('a', None, entradas=['b']), Etapa('b', None, entradas=['a'])], "Ciclo"),
+    ([Etapa('a', None, entradas=['no_existe'])], "no la produce"),
+    ([Etapa('a', None), Etapa('b', None, salida='a')], "más de una vez"),
+], ids=["ciclo", "entrada_sin_productor", "salida_duplicada"])
+def test_grafos_invalidos_se_rechazan_antes_de_empezar(etapas, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        _ejecutar(etapas)
@@ -0,0 +1,51 @@
+# test_streaming_parser.py
+# Parser incremental de la respuesta en streaming (StreamingJSONParser).
+
+import json
+
+from response_parser import StreamingJSONParser
+
+ARTICULO = {
+    'title': 'IA en "medicina" éxito \U0001F600',
+    'meta_description': 'Línea 1\nLínea 2',
+    'tags': ['ia', 'salud'],
+    'puntos': 7.5,
+    'extra': {'a': [1, 2], 'b': '}'},
+    'body': '## Intro\n\nTexto con \\ barra y comillas "dobles".',
+}
+
+
+def _procesar(texto: str, tamano_trozo: int):
+    parser = StreamingJSONParser()
+    eventos = []
+    for inicio in range(0, len(texto), tamano_trozo):
+        eventos.extend(parser.feed(texto[inicio:inicio + tamano_trozo]))
+    return parser, eventos
+
+
+def test_resultado_igual_a_json_loads_con_cualquier_troceado():
+    texto = "```json\n" + json.dumps(ARTICULO) + "\n```" # Con escapes \uXXXX y pares sustitutos
+    for tamano in (1, 2, 3, 7, 64, len(texto)):
+        parser, _ = _procesar(texto, tamano)
+        assert parser.terminado
+        assert parser.resultado == ARTICULO, tamano
+
+
+def test_eventos_delta_item_y_valor():
+    texto = json.dumps(ARTICULO, ensure_ascii=False)
+    _, eventos = _procesar(texto, 5)
+    body = ''.join(e['delta'] for e in eventos if e.get('campo') == 'body' and 'delta' in e)
+    assert body == ARTICULO['body']
+    assert [e['item'] for e in eventos if 'item' in e] == ['ia', 'salud']
+    assert [e['campo'] for e in eventos if 'valor' in e] == list(ARTICULO)
+    # Los deltas del body llegan antes de que el objeto termine
+    primer_delta = next(i for i, e in enumerate(eventos) if 'delta' in e and e['campo'] == 'body')
+    assert primer_delta < len(eventos) - 1
+
+
+def test_respuesta_truncada_conserva_los_campos_completos():
+    texto = json.dumps(ARTICULO)
+    parser, _ = _procesar(texto[:texto.index('"body"') + 20], 4)
+    assert not parser.terminado
+    assert parser.resultado['tags'] == ['ia', 'salud']
+    assert 'body' not in parser.resultado
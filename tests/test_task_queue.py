@@ -0,0 +1,90 @@
+# test_task_queue.py
+# Cola de generación sobre generacion_tareas: reclamación con lease, caducidad, renovación y cierre,
+# y el reparto de la cuota del LLM entre la API y el worker multiproceso.
+
+import threading
+
+import database
+import llm_limiter
+import task_queue
+
+PARAMETROS = {'tema': 'ia', 'num_resultados': 3}
+
+
+def _encolar(n=1):
+    return [database.crear_tarea_generacion('ia', PARAMETROS) for _ in range(n)]
+
+
+def test_reclama_la_mas_antigua_con_sus_parametros(db_temporal):
+    primera, segunda = _encolar(2)
+    tarea = database.reclamar_tarea('w1', lease_seg=60, max_intentos=3)
+    assert (tarea['id'], tarea['parametros'], tarea['intentos']) == (primera, PARAMETROS, 1)
+    assert database.get_tarea(primera)['estado'] == 'en_progreso'
+    assert database.reclamar_tarea('w2', 60, 3)['id'] == segunda
+    assert database.reclamar_tarea('w3', 60, 3) is None # Las dos tienen un lease vigente
+
+
+def test_workers_concurrentes_no_reclaman_la_misma_tarea(db_temporal):
+    ids = _encolar(20)
+    reclamadas = []
+    lock = threading.Lock()
+
+    def worker(nombre):
+        while (tarea := database.reclamar_tarea(nombre, 60, 3)) is not None:
+            with lock:
+                reclamadas.append(tarea['id'])
+
+    hilos = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert sorted(reclamadas) == ids
+
+
+def test_lease_caducado_la_reclama_otro_worker(db_temporal):
+    tarea_id, = _encolar()
+    database.reclamar_tarea('w1', lease_seg=-1, max_intentos=3) # Lease ya caducado: w1 "murió"
+    tarea = database.reclamar_tarea('w2', 60, 3)
+    assert (tarea['id'], tarea['intentos']) == (tarea_id, 2)
+    # w1 ya no puede renovar ni cerrar la tarea; w2 sí
+    assert not database.renovar_lease(tarea_id, 'w1', 60)
+    assert not database.finalizar_tarea(tarea_id, 'w1', 'completado', 1)
+    assert database.renovar_lease(tarea_id, 'w2', 60)
+    assert database.finalizar_tarea(tarea_id, 'w2', 'error', mensaje_error='fallo')
+    tarea = database.get_tarea(tarea_id)
+    assert (tarea['estado'], tarea['mensaje_error']) == ('error', 'fallo')
+
+
+def test_agotar_los_intentos_marca_error(db_temporal):
+    tarea_id, = _encolar()
+    for worker in ('w1', 'w2'):
+        assert database.reclamar_tarea(worker, lease_seg=-1, max_intentos=2)['id'] == tarea_id
+    assert database.reclamar_tarea('w3', 60, max_intentos=2) is None
+    tarea = database.get_tarea(tarea_id)
+    assert tarea['estado'] == 'error' and '2 veces' in tarea['mensaje_error']
+
+
+def test_liberar_devuelve_la_tarea_sin_gastar_el_intento(db_temporal):
+    tarea_id, = _encolar()
+    database.reclamar_tarea('w1', 60, 3)
+    assert not database.liberar_tarea(tarea_id, 'otro')
+    assert database.liberar_tarea(tarea_id, 'w1')
+    tarea = database.get_tarea(tarea_id)
+    assert (tarea['estado'], tarea['intentos']) == ('pendiente', 0)
+    assert database.reclamar_tarea('w2', 60, 3)['intentos'] == 1
+
+
+def test_la_api_y_el_worker_se_reparten_toda_la_cuota(monkeypatch):
+    monkeypatch.setattr(llm_limiter, "_LIMITES_MODELOS", {})
+    monkeypatch.setattr(llm_limiter, "_limitadores", {})
+    procesos, workers_api = 4, 2
+    partes = task_queue._partes_cuota(procesos, workers_api)
+    rpm_por_proceso = {}
+    for nombre, propias in [('hijo', 1), ('api', workers_api)]:
+        monkeypatch.setattr(llm_limiter, "LLM_LIMITE_RPM", 60)
+        monkeypatch.setattr(llm_limiter, "LLM_LIMITE_TPM", 0)
+        llm_limiter.repartir_limites(partes, propias)
+        rpm_por_proceso[nombre] = llm_limiter.limitador('m').rpm
+    assert rpm_por_proceso == {'hijo': 10, 'api': 20}
+    assert procesos * rpm_por_proceso['hijo'] + rpm_por_proceso['api'] == 60